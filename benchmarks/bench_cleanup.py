@@ -0,0 +1,95 @@
+"""
+Memory benchmark of the OFX 1.x (SGML) to XML cleanup, on a large generated QFX file (the
+transactions of data/OfxDownload.qfx repeated).
+
+"before" is the cleanup() that fidelity_ofx.py and prettyprint.py used to have (the whole file
+read into a string, split into a token list, written token by token to a StringIO). "after" is
+ofx_cleanup.cleanup_file() over the memory-mapped file, writing to a temporary file.
+
+Usage: PYTHONPATH=src python benchmarks/bench_cleanup.py [megabytes]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from ofx_cleanup import cleanup_file
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QFX_FILENAME = os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+
+
+def create_large_qfx(filename, megabytes):
+    with open(QFX_FILENAME, "rb") as f:
+        content = f.read()
+    start = content.index(b"<INVTRANLIST>")
+    start = content.index(b"<", start + len(b"<INVTRANLIST>") + 1)
+    end = content.index(b"</INVTRANLIST>")
+    with open(filename, "wb") as f:
+        f.write(content[:start])
+        for _ in range(megabytes * 1024 * 1024 // (end - start) + 1):
+            f.write(content[start:end])
+        f.write(content[end:])
+
+
+def before(filename):
+    with open(filename) as f:
+        ofx_string = f.read()
+    closing_tags = [
+        t.upper() for t in re.findall(r"(?i)</([a-z0-9_\.]+)>", ofx_string)
+    ]
+    tags = 0
+    header = StringIO()
+    xml_body = StringIO()
+    tokens = re.split(r"(?i)(</?[a-z0-9_\.]+>)", ofx_string)
+    last_open_tag = None
+    for token in tokens:
+        is_closing_tag = token.startswith("</")
+        is_processing_tag = token.startswith("<?")
+        is_cdata = token.startswith("<!")
+        is_tag = token.startswith("<") and not is_cdata
+        is_open_tag = is_tag and not is_closing_tag and not is_processing_tag
+        if is_tag:
+            tags = tags + 1
+            if last_open_tag is not None:
+                xml_body.write("</%s>" % last_open_tag)
+                last_open_tag = None
+        if is_open_tag:
+            tag_name = re.findall(r"(?i)<([a-z0-9_\.]+)>", token)[0]
+            if tag_name.upper() not in closing_tags:
+                last_open_tag = tag_name
+        if tags > 0:
+            xml_body.write(token)
+        else:
+            header.write(token)
+    return [header, xml_body]
+
+
+def after(filename):
+    with tempfile.TemporaryFile() as xml_body:
+        cleanup_file(filename, xml_body)
+        return xml_body.tell()
+
+
+def measure(name, function, filename):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(filename)
+    elapsed = time.perf_counter() - start
+    [_, peak] = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-6s %6.2fs  peak Python memory %8.1f MB" % (name, elapsed, peak / 1e6))
+
+
+if __name__ == "__main__":
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "large.qfx")
+        create_large_qfx(filename, megabytes)
+        print("# file=%.1f MB" % (os.path.getsize(filename) / 1e6))
+        measure("before", before, filename)
+        measure("after", after, filename)
@@ -0,0 +1,122 @@
+"""
+Memory benchmark: bytes per transaction for the rows read by invtranlist.py.
+
+"before" keeps what the reader used to keep for each row (a dict of stripped column values
+plus a plain InvestmentTransaction with a __dict__). "after" keeps a TransactionRow plus the
+__slots__ InvestmentTransaction.
+
+Usage: PYTHONPATH=src python benchmarks/bench_memory.py [rows]
+"""
+import csv
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from decimal import Decimal
+
+import invtranlist
+from invtranlist import InvestmentTransaction, convert_to_datetime
+
+SYMBOLS = ["FXAIX", "SPAXX", "VTI", "VOO", "AAPL", "TSLA", "FBALX", "FFNOX"]
+TXN_TYPES = ["BUYSTOCK", "SELLSTOCK", "BUYMF", "SELLMF", "REINVEST", "INCOME"]
+
+
+class LegacyInvestmentTransaction:
+    # Same attributes as InvestmentTransaction, but without __slots__
+    def __init__(self, trade_date, symbol, units, unitprice, total, txn_type, memo):
+        self.trade_date = trade_date
+        self.memo = memo
+        self.symbol = symbol
+        self.units = units
+        self.unitprice = unitprice
+        self.total = total
+        self.fitid = None
+        self.txn_type = txn_type
+        self.symbol_type = invtranlist.DEFAULT_TXN_SYMBOL_TYPE
+        self.uniqueidtype = invtranlist.DEFAULT_UNIQUE_ID_TYPE
+        self.subacctsec = invtranlist.DEFAULT_SUB_ACCT_SEC
+        self.subacctfund = invtranlist.DEFAULT_SUB_ACCT_FUND
+
+
+def write_csv(filename, rows):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["txn_type", "trade_date", "symbol", "units", "unitprice", "total", "memo"]
+        )
+        for i in range(rows):
+            writer.writerow(
+                [
+                    TXN_TYPES[i % len(TXN_TYPES)],
+                    "2022/%02d/%02d" % (i % 12 + 1, i % 28 + 1),
+                    SYMBOLS[i % len(SYMBOLS)],
+                    "%d.%03d" % (i % 100, i % 1000),
+                    "131.15",
+                    "-50.00",
+                    "memo %d" % i,
+                ]
+            )
+
+
+def read_before(filename):
+    with open(filename, "r") as file:
+        dict_reader = csv.DictReader(file)
+        rows = [{k.strip(): v.strip() for k, v in row.items()} for row in dict_reader]
+    txns = []
+    for cols in rows:
+        txns.append(
+            LegacyInvestmentTransaction(
+                trade_date=convert_to_datetime(cols["trade_date"]),
+                symbol=cols["symbol"],
+                units=Decimal(cols["units"]),
+                unitprice=Decimal(cols["unitprice"]),
+                total=Decimal(cols["total"]),
+                txn_type=cols["txn_type"],
+                memo=cols["memo"],
+            )
+        )
+    return [rows, txns]
+
+
+def read_after(filename):
+    with open(filename, "r") as file:
+        rows = list(invtranlist.iter_data_csv_rows(file))
+    txns = []
+    for cols in rows:
+        txns.append(
+            InvestmentTransaction(
+                trade_date=convert_to_datetime(cols.trade_date),
+                symbol=cols.symbol,
+                units=Decimal(cols.units),
+                unitprice=Decimal(cols.unitprice),
+                total=Decimal(cols.total),
+                fitid=cols.row_hash,
+                txn_type=cols.txn_type,
+                memo=cols.memo,
+            )
+        )
+    return [rows, txns]
+
+
+def measure(read, filename):
+    gc.collect()
+    tracemalloc.start()
+    result = read(filename)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "bench.csv")
+        write_csv(filename, rows)
+        before = measure(read_before, filename)
+        after = measure(read_after, filename)
+    print("rows=%d" % rows)
+    print("before: %d bytes/transaction" % (before // rows))
+    print("after:  %d bytes/transaction" % (after // rows))
+    print("saved:  %.1f%%" % (100.0 * (before - after) / before))
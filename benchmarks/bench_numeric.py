@@ -0,0 +1,81 @@
+"""
+Throughput benchmark: converting the units, unitprice and total columns, per row (like
+create_transactions used to) versus in batch with convert_numeric_columns().
+
+Usage: PYTHONPATH=src python benchmarks/bench_numeric.py [rows]
+"""
+import random
+import sys
+import time
+
+from invtranlist import ensure_sign, to_decimal
+from numeric_columns import convert_numeric_columns
+
+TXN_TYPES = ["BUYSTOCK", "SELLSTOCK", "BUYMF", "SELLMF", "REINVEST", "INCOME"]
+
+
+def create_columns(rows, distinct_values):
+    random.seed(0)
+    txn_types = []
+    units = []
+    unitprices = []
+    totals = []
+    for i in range(rows):
+        txn_type = TXN_TYPES[i % len(TXN_TYPES)]
+        txn_types.append(txn_type)
+        if txn_type == "INCOME":
+            units.append("")
+            unitprices.append("")
+        else:
+            units.append("%d.%03d" % (random.randrange(1000), random.randrange(1000)))
+            unitprices.append("%d.%02d" % divmod(random.randrange(distinct_values), 100))
+        totals.append("-%d.%02d" % divmod(random.randrange(distinct_values), 100))
+    return [txn_types, units, unitprices, totals]
+
+
+def convert_per_row(txn_types, units, unitprices, totals):
+    results = [[], [], []]
+    for txn_type, units_value, unitprice, total in zip(
+        txn_types, units, unitprices, totals
+    ):
+        match txn_type:
+            case "BUYSTOCK":
+                units_value = ensure_sign(to_decimal(units_value))
+                total = ensure_sign(to_decimal(total), False)
+            case "BUYMF":
+                units_value = ensure_sign(to_decimal(units_value))
+                total = ensure_sign(to_decimal(total), False)
+            case "SELLSTOCK":
+                units_value = ensure_sign(to_decimal(units_value), False)
+                total = ensure_sign(to_decimal(total))
+            case "SELLMF":
+                units_value = ensure_sign(to_decimal(units_value), False)
+                total = ensure_sign(to_decimal(total))
+            case "REINVEST":
+                units_value = to_decimal(units_value)
+                total = to_decimal(total)
+            case "INCOME":
+                units_value = to_decimal(units_value)
+                total = to_decimal(total)
+        results[0].append(units_value)
+        results[1].append(to_decimal(unitprice))
+        results[2].append(total)
+    return results
+
+
+def timed(name, function, rows):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print("%-10s %.3fs  %.0f rows/sec" % (name, elapsed, rows / elapsed))
+    return result
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for distinct_values in [rows, 1000]:
+        columns = create_columns(rows, distinct_values)
+        print("rows=%d, distinct unitprice/total values=%d" % (rows, distinct_values))
+        expected = timed("per-row", lambda: convert_per_row(*columns), rows)
+        result = timed("batch", lambda: convert_numeric_columns(*columns), rows)
+        assert result == expected
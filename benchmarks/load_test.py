@@ -0,0 +1,127 @@
+"""
+Load test for ofx_server.py: POST a CSV file to /csv2ofx from many concurrent clients and
+report throughput and latency.
+
+Usage:
+    PYTHONPATH=src python src/ofx_server.py --port 8080 &
+    PYTHONPATH=src python benchmarks/load_test.py --port 8080 --requests 500 --concurrency 32
+
+With --start_server, the server is started (and stopped) by the load test itself.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_INPUT = os.path.join(THIS_DIR, os.pardir, "data", "example1.csv")
+
+
+async def post(host, port, path, body):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            (
+                "POST %s HTTP/1.1\r\n"
+                "Host: %s:%d\r\n"
+                "Content-Type: text/csv\r\n"
+                "Content-Length: %d\r\n"
+                "Connection: close\r\n"
+                "\r\n" % (path, host, port, len(body))
+            ).encode()
+        )
+        writer.write(body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status_line = response.split(b"\r\n", 1)[0]
+    return int(status_line.split()[1])
+
+
+async def run(host, port, path, body, requests, concurrency):
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status = await post(host, port, path, body)
+            except OSError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return [elapsed, sorted(latencies), statuses]
+
+
+def wait_for_server(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("server did not start on %s:%d" % (host, port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", "-p", type=int, default=8080)
+    parser.add_argument("--input", "-i", default=DEFAULT_INPUT, help="CSV file to post")
+    parser.add_argument("--path", default="/csv2ofx?acctid=123456789&trnuid=1")
+    parser.add_argument("--requests", "-n", type=int, default=200)
+    parser.add_argument("--concurrency", "-c", type=int, default=16)
+    parser.add_argument(
+        "--start_server",
+        default=False,
+        action="store_true",
+        help="Start ofx_server.py before the test",
+    )
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(THIS_DIR, os.pardir, "src", "ofx_server.py"),
+                "--host",
+                args.host,
+                "--port",
+                str(args.port),
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+    try:
+        wait_for_server(args.host, args.port)
+        with open(args.input, "rb") as f:
+            body = f.read()
+        [elapsed, latencies, statuses] = asyncio.run(
+            run(args.host, args.port, args.path, body, args.requests, args.concurrency)
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print("requests=%d concurrency=%d" % (args.requests, args.concurrency))
+    print("statuses=%s" % statuses)
+    print("elapsed=%.2fs  %.1f requests/sec" % (elapsed, args.requests / elapsed))
+    for percentile in [50, 90, 99]:
+        index = min(len(latencies) - 1, len(latencies) * percentile // 100)
+        print("p%d=%.1fms" % (percentile, latencies[index] * 1000))
@@ -0,0 +1,27 @@
+import configparser
+
+
+def config_to_args(config, section):
+    """
+    Convert the options of a config file section to command line arguments, so they can be
+    parsed (and overridden) together with sys.argv.
+
+    Kept in its own module, with no heavy imports, so that every script can use it without
+    importing the conversion code.
+
+    :param config: configparser.ConfigParser
+    :param section:
+    :return: list of arguments
+    """
+    my_args = []
+    try:
+        options = config.options(section)
+        for option in options:
+            my_args.append("--" + option)
+            value = config.get(section, option)
+            if value and len(value) > 0:
+                my_args.append(value)
+    except configparser.NoSectionError:
+        pass
+
+    return my_args
@@ -0,0 +1,88 @@
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+# The diagnostics used to be printed as "# ..." lines, keep the look
+LOG_FORMAT = "# %(message)s"
+
+# Libraries logging at INFO level per record or element (ofxtools logs each element it
+# converts): only their warnings are shown, unless --verbose
+QUIET_LOGGERS = ["ofxtools"]
+
+
+class RunStats:
+    def __init__(self):
+        """
+        Counters and timers of a run, reported in one summary line (see summary()), so the
+        output does not grow with the input.
+        """
+        self.start = time.perf_counter()
+        # name: value, in the order they are first used
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name):
+        """Add the time spent in the context to the timer name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self):
+        """
+        :return: e.g. "rows=4 transactions=4 read=0.001s convert=0.120s total=0.130s"
+        """
+        values = ["%s=%d" % (name, value) for name, value in self.counters.items()]
+        values.extend("%s=%.3fs" % (name, value) for name, value in self.timers.items())
+        values.append("total=%.3fs" % (time.perf_counter() - self.start))
+        return " ".join(values)
+
+    def __str__(self):
+        # Formatted by logging only if the record is emitted
+        return self.summary()
+
+
+def configure_logging(args):
+    """
+    Send the log records to stdout: INFO and above by default (a few lines per run),
+    DEBUG with --verbose, only WARNING and above with --quiet. The QUIET_LOGGERS only log
+    their warnings, unless --verbose.
+
+    :param args: parsed arguments, see add_arguments()
+    """
+    if getattr(args, "quiet", False):
+        level = logging.WARNING
+    elif getattr(args, "verbose", False):
+        level = logging.DEBUG
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level, format=LOG_FORMAT, stream=sys.stdout, force=True)
+    for name in QUIET_LOGGERS:
+        # NOTSET: the level of the root logger
+        logging.getLogger(name).setLevel(
+            logging.NOTSET if level == logging.DEBUG else logging.WARNING
+        )
+
+
+def add_arguments(parser):
+    """Add the --verbose and --quiet arguments to parser."""
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        default=False,
+        action="store_true",
+        help="Log debugging details",
+    )
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        default=False,
+        action="store_true",
+        help="Only log warnings and errors",
+    )
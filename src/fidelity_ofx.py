@@ -1,105 +1,324 @@
 import argparse
+import functools
+import io
 import json
-import re
+import logging
+import tempfile
 import xml.dom.minidom
-from io import StringIO
 
 import xmltodict
 
+from diagnostics import add_arguments as add_logging_arguments, configure_logging
 
-def cleanup(filename):
-    with open(filename) as f:
-        ofx_string = f.read()
-    closing_tags = [
-        t.upper() for t in re.findall(r"(?i)</([a-z0-9_\.]+)>", ofx_string)
-    ]
-    # for closing_tag in closing_tags:
-    #     print(closing_tag)
-    tags = 0
-    header = StringIO()
-    xml_body = StringIO()
-    tokens = re.split(r"(?i)(</?[a-z0-9_\.]+>)", ofx_string)
-    last_open_tag = None
-    for token in tokens:
-        # print(token)
-        is_closing_tag = token.startswith("</")
-        is_processing_tag = token.startswith("<?")
-        is_cdata = token.startswith("<!")
-        is_tag = token.startswith("<") and not is_cdata
-        is_open_tag = is_tag and not is_closing_tag and not is_processing_tag
-        if is_tag:
-            tags = tags + 1
-            if last_open_tag is not None:
-                if tags > 0:
-                    xml_body.write("</%s>" % last_open_tag)
-                else:
-                    header.write("</%s>" % last_open_tag)
-                # print("</%s>" % last_open_tag, end="")
-                last_open_tag = None
-        if is_open_tag:
-            tag_name = re.findall(r"(?i)<([a-z0-9_\.]+)>", token)[0]
-            if tag_name.upper() not in closing_tags:
-                last_open_tag = tag_name
-
-        if tags > 0:
-            xml_body.write(token)
+# cleanup() is re-exported, it used to live here
+from ofx_cleanup import OFX_VERSION_2, cleanup, cleanup_file, detect_ofx_version
+from ofx_records import OfxRecord, ValueCache, parse_ofx_datetime
+from profiling import add_arguments as add_profiling_arguments, profile_run
+
+logger = logging.getLogger(__name__)
+
+# Cleaned up XML bodies larger than this are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# Children of INVTRANLIST that are not transactions
+INVTRANLIST_DATES = {"DTSTART", "DTEND"}
+
+
+def as_list(value):
+    """
+    xmltodict gives a dictionary for an element that appears once, a list if it repeats, None
+    if it is empty.
+
+    :param value:
+    :return: value as a list
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def find_secid(aggregate):
+    """
+    :param aggregate: a transaction, position or security (SECID directly in it, or in its
+        INVBUY, INVSELL, INVPOS or SECINFO)
+    :return: the SECID dictionary, None if there is none (e.g. INVBANKTRAN)
+    """
+    secid = aggregate.get("SECID")
+    if secid is not None:
+        return secid
+    for name in ("INVBUY", "INVSELL", "INVPOS", "SECINFO"):
+        child = aggregate.get(name)
+        if isinstance(child, dict):
+            return child.get("SECID")
+    return None
+
+
+def find_uniqueid(aggregate):
+    secid = find_secid(aggregate)
+    if secid is None:
+        return None
+    return secid.get("UNIQUEID")
+
+
+def merge_lists(aggregates, dates=()):
+    """
+    Merge the INVTRANLIST (or INVPOSLIST) of several statements into one.
+
+    :param aggregates: xmltodict dictionaries
+    :param dates: names of the dates of the lists, the earliest DTSTART and latest DTEND
+        are kept
+    :return: dictionary of aggregate name: list
+    """
+    merged = {}
+    for aggregate in aggregates:
+        for name, value in aggregate.items():
+            if name in dates:
+                continue
+            merged.setdefault(name, []).extend(as_list(value))
+    for name, pick in (("DTSTART", min), ("DTEND", max)):
+        values = [aggregate[name] for aggregate in aggregates if aggregate.get(name)]
+        if name in dates and values:
+            merged[name] = pick(values, key=parse_ofx_datetime)
+    return merged
+
+
+class StatementIndex:
+    def __init__(self, ofx_dict):
+        """
+        Indexed view of the investment statements, built in one walk of the xmltodict
+        dictionary: transactions by type, positions and securities by UNIQUEID. A file can
+        have the statements of several accounts (one INVSTMTTRNRS each), the transactions
+        and positions of all of them are indexed.
+
+        :param ofx_dict: xmltodict dictionary of the OFX file
+        """
+        ofx = ofx_dict.get("OFX") or {}
+        # INVSTMTRS of each account
+        self.statements = [
+            trnrs.get("INVSTMTRS") or {}
+            for trnrs in as_list((ofx.get("INVSTMTMSGSRSV1") or {}).get("INVSTMTTRNRS"))
+        ]
+        self.accounts = [
+            (statement.get("INVACCTFROM") or {}).get("ACCTID")
+            for statement in self.statements
+        ]
+        invtranlists = [
+            statement.get("INVTRANLIST") or {} for statement in self.statements
+        ]
+        invposlists = [statement.get("INVPOSLIST") or {} for statement in self.statements]
+        if len(self.statements) > 1:
+            self.response = None
+            self.invtranlist = merge_lists(invtranlists, INVTRANLIST_DATES)
+            self.invposlist = merge_lists(invposlists)
         else:
-            header.write(token)
-            # print(token, end="")
+            self.response = self.statements[0] if self.statements else {}
+            self.invtranlist = invtranlists[0] if invtranlists else {}
+            self.invposlist = invposlists[0] if invposlists else {}
+        self.seclist = (ofx.get("SECLISTMSGSRSV1") or {}).get("SECLIST") or {}
+
+        # aggregate name (BUYMF, ...): list of transactions
+        self.transactions = {}
+        # uniqueid: list of (aggregate name, transaction)
+        self.transactions_by_uniqueid = {}
+        for invtranlist in invtranlists:
+            for name, value in invtranlist.items():
+                if name in INVTRANLIST_DATES:
+                    continue
+                transactions = as_list(value)
+                self.transactions.setdefault(name, []).extend(transactions)
+                for transaction in transactions:
+                    uniqueid = find_uniqueid(transaction)
+                    if uniqueid is not None:
+                        self.transactions_by_uniqueid.setdefault(uniqueid, []).append(
+                            (name, transaction)
+                        )
+
+        # uniqueid: list of (aggregate name, position)
+        self.positions = {}
+        for invposlist in invposlists:
+            for name, value in invposlist.items():
+                for position in as_list(value):
+                    self.positions.setdefault(find_uniqueid(position), []).append(
+                        (name, position)
+                    )
+
+        # uniqueid: (aggregate name, security), ticker: uniqueid
+        self.securities = {}
+        self.tickers = {}
+        for name, value in self.seclist.items():
+            for security in as_list(value):
+                uniqueid = find_uniqueid(security)
+                self.securities[uniqueid] = (name, security)
+                ticker = (security.get("SECINFO") or {}).get("TICKER")
+                if ticker is not None:
+                    self.tickers[ticker] = uniqueid
+
+    def security_for(self, uniqueid):
+        """
+        :param uniqueid:
+        :return: the security (MFINFO, STOCKINFO, ...) of uniqueid, None if unknown
+        """
+        entry = self.securities.get(uniqueid)
+        if entry is None:
+            return None
+        return entry[1]
 
-    return [header, xml_body]
+    def transactions_for(self, symbol):
+        """
+        :param symbol: ticker or UNIQUEID of a security
+        :return: list of (aggregate name, transaction) of the security
+        """
+        uniqueid = self.tickers.get(symbol, symbol)
+        return self.transactions_by_uniqueid.get(uniqueid, [])
+
+    def positions_for(self, symbol):
+        """
+        :param symbol: ticker or UNIQUEID of a security
+        :return: list of (aggregate name, position) of the security
+        """
+        uniqueid = self.tickers.get(symbol, symbol)
+        return self.positions.get(uniqueid, [])
 
 
 class FidelityOfx:
     def __init__(self, filename):
-        [header, xml_body] = cleanup(filename)
+        """
+        Parse an OFX file, e.g. a Fidelity QFX download. An OFX 1.x (SGML) file is
+        memory-mapped and its XML conversion is spooled (see ofx_cleanup.py), then parsed from
+        the spool. An OFX 2.x file is already XML and is parsed straight from the file. Either
+        way the content is never held in a Python string.
+
+        The file is parsed into a dictionary (see dict) on first use: write_jsonl() does not
+        need it.
+
+        :param filename:
+        """
+        self.filename = filename
+        # Also fails early if the file cannot be read
+        self.version = detect_ofx_version(filename)
+
+    @functools.cached_property
+    def dict(self):
+        with self.open_xml_body() as xml_body:
+            return xmltodict.parse(xml_body)
+
+    @functools.cached_property
+    def index(self):
+        """StatementIndex of the file, built once."""
+        return StatementIndex(self.dict)
+
+    @functools.cached_property
+    def values(self):
+        """ValueCache shared by the records of the file."""
+        return ValueCache()
+
+    def transaction_records(self):
+        """
+        :return: list of OfxRecord, the transactions of all types
+        """
+        return [
+            OfxRecord(name, transaction, self.values)
+            for name, transactions in self.index.transactions.items()
+            for transaction in transactions
+        ]
+
+    def position_records(self):
+        """
+        :return: list of OfxRecord, the positions
+        """
+        return [
+            OfxRecord(name, position, self.values)
+            for positions in self.index.positions.values()
+            for name, position in positions
+        ]
+
+    def security_for(self, uniqueid):
+        return self.index.security_for(uniqueid)
+
+    def transactions_for(self, symbol):
+        return self.index.transactions_for(symbol)
+
+    def open_xml_body(self):
+        """
+        :return: the XML of the file as a binary file (at the start): the file itself for
+            OFX 2.x, otherwise a temporary file with its XML conversion
+        """
+        if self.version == OFX_VERSION_2:
+            return open(self.filename, "rb")
+        xml_body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        cleanup_file(self.filename, xml_body)
         xml_body.seek(0)
-        self.xml_string = xml_body.read()
-        self.dict = xmltodict.parse(self.xml_string)
+        return xml_body
+
+    @property
+    def xml_string(self):
+        with self.open_xml_body() as xml_body:
+            return io.TextIOWrapper(xml_body).read()
 
     def to_xml_str(self):
-        return xml.dom.minidom.parseString(self.xml_string).toprettyxml()
+        with self.open_xml_body() as xml_body:
+            return xml.dom.minidom.parse(xml_body).toprettyxml()
 
     def to_json_str(self):
         return json.dumps(self.dict, indent=4)
 
+    def write_json(self, output):
+        """
+        Write the same nested JSON as to_json_str(), in chunks, without building the string.
+
+        :param output: text stream
+        """
+        json.dump(self.dict, output, indent=4)
+        output.write("\n")
+
+    def write_jsonl(self, output):
+        """
+        Write JSON Lines, one record per transaction, position and security, while parsing
+        the file (see ofx_jsonl.py).
+
+        :param output: binary stream
+        :return: number of records written
+        """
+        from ofx_jsonl import write_jsonl
+
+        with self.open_xml_body() as xml_body:
+            return write_jsonl(xml_body, output)
+
     def to_csv(self):
         return ""
 
     # 13.9.2.2 Investment Statement Response <INVSTMTRS>
     def get_investment_statement_response(self):
-        response = self.dict.get("OFX", {}).get("INVSTMTMSGSRSV1", {}).get("INVSTMTTRNRS", {}).get("INVSTMTRS",
-                                                                                                   {})
-        return response
+        """
+        :raises ValueError: if the file has the statements of several accounts, see
+            index.statements
+        """
+        if self.index.response is None:
+            raise ValueError(
+                "file=%s has the statements of several accounts=%s"
+                % (self.filename, self.index.accounts)
+            )
+        return self.index.response
 
-    # return a list of transactions
+    # return a list of transactions (of all the accounts)
     def get_transactions(self):
         # INVSTMTMSGSRSV1.INVSTMTTRNRS.INVSTMTRS.INVTRANLIST.BUYMF(s)
         # ...BUYSTOCK(s)
         # ...INCOME(s)
-        transactions = self.get_investment_statement_response().get(
-            "INVTRANLIST", {})
-        return transactions
+        return self.index.invtranlist
 
     def get_positions(self):
         # OFX.INVSTMTMSGSRSV1.INVSTMTTRNRS.INVSTMTRS.INVPOSLIST
-        positions = self.get_investment_statement_response().get(
-            "INVPOSLIST", {})
-        return positions
+        return self.index.invposlist
 
     def get_securities(self):
         # OFX.SECLISTMSGSRSV1.SECLIST
-        securities = self.dict.get("OFX", {}).get("SECLISTMSGSRSV1", {}).get(
-            "SECLIST", {})
-        return securities
+        return self.index.seclist
 
     def get_aggregate_as_list(self, dict, name):
-        aggregate = dict.get(name, {})
-        if not hasattr(aggregate, "__len__"):
-            a_list = [aggregate]
-            aggregate = a_list
-
-        return aggregate
+        return as_list(dict.get(name))
 
     # Buy mutual fund
     def get_buymf(self, transactions):
@@ -133,22 +352,42 @@ class FidelityOfx:
         return self.get_aggregate_as_list(securities, "STOCKINFO")
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--input", type=str, required=True)
-    parser.add_argument("--output", type=str, required=True)
-    args = parser.parse_args()
+def main(args):
+    """
+    Convert an OFX file to XML, JSON or JSON Lines, by output file extension.
 
+    :param args:
+    """
     fidelity_ofx = FidelityOfx(args.input)
 
     output = None
-    if args.output.endswith(".xml"):
-        output = fidelity_ofx.to_xml_str()
+    if args.output.endswith(".jsonl"):
+        # Streamed while parsing
+        with open(args.output, "wb") as f:
+            count = fidelity_ofx.write_jsonl(f)
+        logger.info("Wrote %d records to file=%s", count, args.output)
     elif args.output.endswith(".json"):
-        output = fidelity_ofx.to_json_str()
-    elif args.output.endswith(".csv"):
-        output = fidelity_ofx.to_csv()
+        with open(args.output, "w") as f:
+            fidelity_ofx.write_json(f)
     else:
-        output = fidelity_ofx.to_xml_str()
+        if args.output.endswith(".xml"):
+            output = fidelity_ofx.to_xml_str()
+        elif args.output.endswith(".csv"):
+            output = fidelity_ofx.to_csv()
+        else:
+            output = fidelity_ofx.to_xml_str()
+
+        print(output, file=open(args.output, "w"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    add_profiling_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
 
-    print(output, file=open(args.output, "w"))
+    with profile_run(args):
+        main(args)
@@ -3,6 +3,8 @@ import csv
 
 from ofxtools import OFXTree
 
+from profiling import add_arguments as add_profiling_arguments, profile_run
+
 FIELD_NAMES = [
     "uniqueid",
     "uniqueidtype",
@@ -61,7 +63,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", type=str, required=True)
     parser.add_argument("--output", type=str, required=True)
+    add_profiling_arguments(parser)
     args = parser.parse_args()
 
-    # writing to csv file
-    write_csv_file(create_rows(args.input), args.output)
+    with profile_run(args):
+        # writing to csv file
+        write_csv_file(create_rows(args.input), args.output)
@@ -3,6 +3,8 @@ import csv
 
 from ofxtools import OFXTree
 
+from profiling import add_arguments as add_profiling_arguments, profile_run
+
 FIELD_NAMES = [
     "type",
     "fitid",
@@ -58,21 +60,27 @@ def create_rows_from_transactions(transactions):
 
 def write_csv_file(rows, output):
     with open(output, "w") as csvfile:
-        # creating a csv dict writer object
-        writer = csv.DictWriter(csvfile, fieldnames=FIELD_NAMES)
+        write_csv_rows(rows, csvfile)
+
+
+def write_csv_rows(rows, csvfile):
+    # creating a csv dict writer object
+    writer = csv.DictWriter(csvfile, fieldnames=FIELD_NAMES)
 
-        # writing headers (field names)
-        writer.writeheader()
+    # writing headers (field names)
+    writer.writeheader()
 
-        # writing data rows
-        writer.writerows(rows)
+    # writing data rows
+    writer.writerows(rows)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", type=str, required=True)
     parser.add_argument("--output", type=str, required=True)
+    add_profiling_arguments(parser)
     args = parser.parse_args()
 
-    # writing to csv file
-    write_csv_file(create_rows(args.input), args.output)
+    with profile_run(args):
+        # writing to csv file
+        write_csv_file(create_rows(args.input), args.output)
@@ -1,24 +1,58 @@
 import argparse
+import codecs
 import configparser
+import copy
 import csv
+import functools
 import glob
-import hashlib
-import json
+import io
+import logging
 import os
 import sys
-import uuid
-import xml.dom.minidom
-import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple
 
 # local imports
-from ofxtools import models
-from ofxtools.header import make_header
+# ofxtools (see ofx_models()), xml and the hashing modules are imported where they are
+# used: importing ofxtools.models alone takes longer than converting a small file
+from cli_config import config_to_args
+from diagnostics import (
+    RunStats,
+    add_arguments as add_logging_arguments,
+    configure_logging,
+)
+from numeric_columns import convert_numeric_columns
+from positions import PositionAccumulator
+from profiling import add_arguments as add_profiling_arguments, profile_run
+from row_filter import RowFilter, add_arguments as add_filter_arguments
+from up_to_date import (
+    Manifest,
+    add_arguments as add_incremental_arguments,
+    args_settings,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@functools.cache
+def ofx_models():
+    """:return: the ofxtools.models module, imported on first use"""
+    from ofxtools import models
+
+    return models
 
 
+@functools.cache
+def hash_modules():
+    """:return: [hashlib, json], imported on first use, once and not per dict_hash() call"""
+    import hashlib
+    import json
+
+    return [hashlib, json]
+
 DEFAULT_CONFIG_SECTION = "invtranlist"
 
 DEFAULT_CONFIG_FILENAME = os.environ.get(
@@ -31,14 +65,116 @@ DEFAULT_BROKER_ID = "123456789"
 
 DEFAULT_CURRENCY = "USD"
 
+DEFAULT_DATE_STRING_FORMAT = "%Y/%m/%d"
+
 LOCAL_TZINFO = datetime.now().astimezone().tzinfo
 
 
-def create_data_csv_rows_from_file(filename):
+DEFAULT_TXN_TYPE = "BUYSTOCK"
+DEFAULT_TXN_SYMBOL_TYPE = "STOCK"
+DEFAULT_UNIQUE_ID_TYPE = "TICKER"
+DEFAULT_SUB_ACCT_SEC = "CASH"
+DEFAULT_SUB_ACCT_FUND = "CASH"
+
+# How to create a fitid (transaction id) for each row:
+# - hash: MD5 hash of the row's column values (default)
+# - sequence: the row number
+# - source: the value of the row's fitid column (falls back to hash if that is empty)
+FITID_STRATEGY_HASH = "hash"
+FITID_STRATEGY_SEQUENCE = "sequence"
+FITID_STRATEGY_SOURCE = "source"
+FITID_STRATEGIES = [FITID_STRATEGY_HASH, FITID_STRATEGY_SEQUENCE, FITID_STRATEGY_SOURCE]
+DEFAULT_FITID_STRATEGY = FITID_STRATEGY_HASH
+
+# Number of rows converted at once by create_transactions
+DEFAULT_CHUNK_SIZE = 65536
+
+# Optional columns of input with the transactions of several accounts
+ACCOUNT_COLUMNS = {"acctid", "brokerid"}
+
+# dtserver and dtasof of a deterministic output without transactions
+DETERMINISTIC_DATE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TransactionRow(NamedTuple):
+    """
+    A normalized (stripped) input row. A tuple has no per-instance __dict__, so a
+    large history costs a fraction of the memory of one dict per row.
+
+    row_hash is the dict_hash() of the original row columns, computed once when reading,
+    so the column dictionary itself does not need to be kept around to create a fitid.
+    """
+
+    txn_type: str
+    trade_date: str
+    symbol: str
+    units: str
+    unitprice: str
+    total: str
+    memo: str
+    symbol_type: str
+    row_hash: str
+    fitid: str = ""
+    # Optional account columns, for input with the transactions of several accounts
+    acctid: str = ""
+    brokerid: str = ""
+
+
+def create_transaction_row(cols):
+    """
+    Create a TransactionRow from a row (dictionary of stripped column's values).
+    Repeated values (txn_type, symbol, ...) are interned so that all rows share them.
+
+    :param cols:
+    :return:
+    """
+    memo = cols.get("memo")
+    if memo is None or len(memo) <= 0:
+        memo = ""
+    return TransactionRow(
+        txn_type=sys.intern(cols["txn_type"]),
+        trade_date=sys.intern(cols["trade_date"]),
+        symbol=sys.intern(cols["symbol"]),
+        units=cols["units"],
+        unitprice=cols["unitprice"],
+        total=cols["total"],
+        memo=memo,
+        symbol_type=sys.intern(cols.get("symbol_type", DEFAULT_TXN_SYMBOL_TYPE)),
+        row_hash=dict_hash(cols),
+        fitid=cols.get("fitid", ""),
+        acctid=sys.intern(cols.get("acctid", "")),
+        brokerid=sys.intern(cols.get("brokerid", "")),
+    )
+
+
+def iter_data_csv_rows(file, row_filter=None):
     """
-    Parse CSV filename and return a list of rows (each is dictionary of column's values)
+    Parse CSV rows from an open file and yield a TransactionRow for each of them.
+
+    :param file:
+    :param row_filter: optional RowFilter, checked before anything else is done with a row
+    :return:
+    """
+    dict_reader = csv.DictReader(file)
+    if dict_reader.fieldnames is None:
+        return
+    dict_reader.fieldnames = [name.strip() for name in dict_reader.fieldnames]
+    for row in dict_reader:
+        if row_filter is not None:
+            match row_filter.check(row["trade_date"], row["symbol"]):
+                case "skip":
+                    continue
+                case "stop":
+                    return
+        yield create_transaction_row({k: v.strip() for k, v in row.items()})
+
+
+def create_data_csv_rows_from_file(filename, row_filter=None):
+    """
+    Parse CSV filename and return a list of rows (each is a TransactionRow)
 
     :param filename:
+    :param row_filter: optional RowFilter
     :return:
     """
 
@@ -46,25 +182,102 @@ def create_data_csv_rows_from_file(filename):
     if filename is None:
         return [data_csv_rows, filename]
 
-    print("# Reading input from file=%s" % filename)
-
     with open(filename, "r") as file:
-        dict_reader = csv.DictReader(file)
-        rows = [{k.strip(): v.strip() for k, v in row.items()} for row in dict_reader]
-        for row in rows:
-            # print(dict(row))
-            data_csv_rows.append(dict(row))
+        data_csv_rows.extend(iter_data_csv_rows(file, row_filter))
     return data_csv_rows
 
 
-DEFAULT_TXN_TYPE = "BUYSTOCK"
-DEFAULT_TXN_SYMBOL_TYPE = "STOCK"
-DEFAULT_UNIQUE_ID_TYPE = "TICKER"
-DEFAULT_SUB_ACCT_SEC = "CASH"
-DEFAULT_SUB_ACCT_FUND = "CASH"
+@functools.cache
+def shared_aggregate_class(aggregate_class):
+    """
+    Subclass of an ofxtools aggregate class, for an aggregate shared by many parents: it is
+    serialized once, each parent gets a copy of that Element. It has the name of
+    aggregate_class, which is its OFX tag. The aggregate must not be modified once
+    serialized.
+
+    :param aggregate_class: e.g. SECID
+    :return:
+    """
+
+    def to_etree(self):
+        if self.element is None:
+            self.element = aggregate_class.to_etree(self)
+        return copy.deepcopy(self.element)
+
+    return type(
+        aggregate_class.__name__,
+        (aggregate_class,),
+        {"element": None, "to_etree": to_etree, "__module__": __name__},
+    )
+
+
+class SecurityTable:
+    def __init__(self):
+        """
+        Per-run intern table of the security aggregates, keyed by (symbol, uniqueidtype).
+        All transactions of a security share one SECID (serialized once, see shared_aggregate_class),
+        and the SECLIST reuses the same SECINFO/STOCKINFO/MFINFO.
+        """
+        self.secids = {}
+        self.secinfos = {}
+        self.stockinfos = {}
+        self.mfinfos = {}
+
+    def secid(self, symbol, uniqueidtype=DEFAULT_UNIQUE_ID_TYPE):
+        key = (symbol, uniqueidtype)
+        secid = self.secids.get(key)
+        if secid is None:
+            secid = shared_aggregate_class(ofx_models().SECID)(
+                uniqueid=symbol, uniqueidtype=uniqueidtype
+            )
+            self.secids[key] = secid
+        return secid
+
+    def secinfo(self, symbol, uniqueidtype=DEFAULT_UNIQUE_ID_TYPE):
+        key = (symbol, uniqueidtype)
+        secinfo = self.secinfos.get(key)
+        if secinfo is None:
+            secinfo = shared_aggregate_class(ofx_models().SECINFO)(
+                secid=self.secid(symbol, uniqueidtype),
+                secname=symbol,
+                ticker=symbol,
+            )
+            self.secinfos[key] = secinfo
+        return secinfo
+
+    def stockinfo(self, symbol, uniqueidtype=DEFAULT_UNIQUE_ID_TYPE):
+        key = (symbol, uniqueidtype)
+        stockinfo = self.stockinfos.get(key)
+        if stockinfo is None:
+            stockinfo = ofx_models().STOCKINFO(secinfo=self.secinfo(symbol, uniqueidtype))
+            self.stockinfos[key] = stockinfo
+        return stockinfo
+
+    def mfinfo(self, symbol, uniqueidtype=DEFAULT_UNIQUE_ID_TYPE):
+        key = (symbol, uniqueidtype)
+        mfinfo = self.mfinfos.get(key)
+        if mfinfo is None:
+            mfinfo = ofx_models().MFINFO(secinfo=self.secinfo(symbol, uniqueidtype))
+            self.mfinfos[key] = mfinfo
+        return mfinfo
 
 
 class InvestmentTransaction:
+    __slots__ = (
+        "trade_date",
+        "memo",
+        "symbol",
+        "units",
+        "unitprice",
+        "total",
+        "fitid",
+        "txn_type",
+        "symbol_type",
+        "uniqueidtype",
+        "subacctsec",
+        "subacctfund",
+    )
+
     def __init__(
         self,
         trade_date,
@@ -101,7 +314,7 @@ class InvestmentTransaction:
         self.units = units
         self.unitprice = unitprice
         self.total = total
-        if not fitid:
+        if fitid is None:
             fitid = self.generate_fitid()
         self.fitid = fitid
         # BUYSTOCK, SELLSTOCK, BUYMF, SELLMF
@@ -118,36 +331,117 @@ class InvestmentTransaction:
 
         :return:
         """
+        import uuid
+
         return str(uuid.uuid4())
 
-    def ofx(self):
+    @classmethod
+    def from_columns(
+        cls,
+        trade_dates,
+        symbols,
+        units,
+        unitprices,
+        totals,
+        fitids=None,
+        txn_types=None,
+        symbol_types=None,
+        memos=None,
+    ):
         """
-        Generate the OFX object from the model.
+        Bulk constructor: create a list of transactions from column arrays (one value per
+        transaction in each array). If fitids is None, the row numbers (starting at 1) are used.
 
+        :param trade_dates:
+        :param symbols:
+        :param units:
+        :param unitprices:
+        :param totals:
+        :param fitids:
+        :param txn_types:
+        :param symbol_types:
+        :param memos:
+        :return:
+        """
+        count = len(trade_dates)
+        if fitids is None:
+            fitids = [str(row_number) for row_number in range(1, count + 1)]
+        if txn_types is None:
+            txn_types = [DEFAULT_TXN_TYPE] * count
+        if symbol_types is None:
+            symbol_types = [DEFAULT_TXN_SYMBOL_TYPE] * count
+        if memos is None:
+            memos = [""] * count
+
+        return [
+            cls(
+                trade_date=trade_date,
+                symbol=symbol,
+                units=units_value,
+                unitprice=unitprice,
+                total=total,
+                fitid=fitid,
+                txn_type=txn_type,
+                symbol_type=symbol_type,
+                memo=memo,
+            )
+            for (
+                trade_date,
+                symbol,
+                units_value,
+                unitprice,
+                total,
+                fitid,
+                txn_type,
+                symbol_type,
+                memo,
+            ) in zip(
+                trade_dates,
+                symbols,
+                units,
+                unitprices,
+                totals,
+                fitids,
+                txn_types,
+                symbol_types,
+                memos,
+                strict=True,
+            )
+        ]
+
+    def ofx(self, securities=None):
+        """
+        Generate the OFX object from the model. If securities (a SecurityTable) is given, the
+        SECID is shared with the other transactions of the same security.
+
+        :param securities:
         :return:
         """
         match self.txn_type:
             case "BUYSTOCK":
-                return self.create_buystock()
+                return self.create_buystock(securities)
             case "SELLSTOCK":
-                return self.create_sellstock()
+                return self.create_sellstock(securities)
             case "BUYMF":
-                return self.create_buymf()
+                return self.create_buymf(securities)
             case "SELLMF":
-                return self.create_sellmf()
+                return self.create_sellmf(securities)
             case "REINVEST":
-                return self.create_reinvest()
+                return self.create_reinvest(securities)
             case "INCOME":
-                return self.create_income()
+                return self.create_income(securities)
 
         return None
 
-    def create_secid(self):
+    def create_secid(self, securities=None):
         """
         Create a SECID object which basically identify a security with symbol and type (such as TICKER)
+        :param securities:
         :return:
         """
-        return models.SECID(
+        if securities is not None:
+            return securities.secid(self.symbol, self.uniqueidtype)
+        return ofx_models().SECID(
             # Unique identifier for the security. CUSIP for US FIs. A-32
             # uniqueid="123456789",
             uniqueid=self.symbol,
@@ -164,7 +458,7 @@ class InvestmentTransaction:
 
         :return:
         """
-        return models.INVTRAN(
+        return ofx_models().INVTRAN(
             # fitid="23321",
             fitid=self.fitid,
             # dttrade=datetime(2005, 8, 25, tzinfo=UTC),
@@ -173,13 +467,15 @@ class InvestmentTransaction:
             memo=self.memo,
         )
 
-    def create_buystock(self):
+    def create_buystock(self, securities=None):
+        models = ofx_models()
+
         return models.BUYSTOCK(
             invbuy=models.INVBUY(
                 invtran=self.create_invtran(),
                 # Security identifier
                 # 13.8.1 Security Identification <SECID>
-                secid=self.create_secid(),
+                secid=self.create_secid(securities),
                 # units=Decimal("100"),
                 units=self.units,
                 # unitprice=Decimal("50.00"),
@@ -195,14 +491,16 @@ class InvestmentTransaction:
             buytype="BUY",
         )
 
-    def create_sellstock(self):
+    def create_sellstock(self, securities=None):
+        models = ofx_models()
+
         return models.SELLSTOCK(
             # 13.9.2.4.3 Investment Buy/Sell Aggregates <INVBUY>/<INVSELL>
             invsell=models.INVSELL(
                 invtran=self.create_invtran(),
                 # Security identifier
                 # 13.8.1 Security Identification <SECID>
-                secid=self.create_secid(),
+                secid=self.create_secid(securities),
                 # units=Decimal("100"),
                 units=self.units,
                 # unitprice=Decimal("50.00"),
@@ -218,13 +516,15 @@ class InvestmentTransaction:
             selltype="SELL",
         )
 
-    def create_buymf(self):
+    def create_buymf(self, securities=None):
+        models = ofx_models()
+
         return models.BUYMF(
             invbuy=models.INVBUY(
                 invtran=self.create_invtran(),
                 # Security identifier
                 # 13.8.1 Security Identification <SECID>
-                secid=self.create_secid(),
+                secid=self.create_secid(securities),
                 # units=Decimal("100"),
                 units=self.units,
                 # unitprice=Decimal("50.00"),
@@ -246,7 +546,7 @@ class InvestmentTransaction:
             buytype="BUY",
         )
 
-    def create_income(self):
+    def create_income(self, securities=None):
         #                     <INCOME>
         #                         <INVTRAN>
         #                             <FITID>154991799</FITID>
@@ -263,9 +563,9 @@ class InvestmentTransaction:
         #                         <SUBACCTSEC>CASH</SUBACCTSEC>
         #                         <SUBACCTFUND>CASH</SUBACCTFUND>
         #                     </INCOME>
-        return models.INCOME(
+        return ofx_models().INCOME(
             invtran=self.create_invtran(),
-            secid=self.create_secid(),
+            secid=self.create_secid(securities),
             incometype="DIV",
             total=self.total,
             # subacctsec="CASH",
@@ -274,7 +574,7 @@ class InvestmentTransaction:
             subacctfund=self.subacctfund,
         )
 
-    def create_reinvest(self):
+    def create_reinvest(self, securities=None):
         #                     <REINVEST>
         #                         <INVTRAN>
         #                             <FITID>22631701</FITID>
@@ -292,9 +592,9 @@ class InvestmentTransaction:
         #                         <UNITS>10.568</UNITS>
         #                         <UNITPRICE>9.48</UNITPRICE>
         #                     </REINVEST>
-        return models.REINVEST(
+        return ofx_models().REINVEST(
             invtran=self.create_invtran(),
-            secid=self.create_secid(),
+            secid=self.create_secid(securities),
             incometype="DIV",
             total=self.total,
             # subacctsec="CASH",
@@ -304,13 +604,15 @@ class InvestmentTransaction:
             unitprice=self.unitprice,
         )
 
-    def create_sellmf(self):
+    def create_sellmf(self, securities=None):
+        models = ofx_models()
+
         return models.SELLMF(
             invsell=models.INVSELL(
                 invtran=self.create_invtran(),
                 # Security identifier
                 # 13.8.1 Security Identification <SECID>
-                secid=self.create_secid(),
+                secid=self.create_secid(securities),
                 # units=Decimal("100"),
                 units=self.units,
                 # unitprice=Decimal("50.00"),
@@ -333,7 +635,7 @@ class InvestmentTransaction:
         )
 
 
-def convert_to_datetime(date_string, date_string_format="%Y/%m/%d"):
+def convert_to_datetime(date_string, date_string_format=DEFAULT_DATE_STRING_FORMAT):
     """
     Convert a date string using date_string_format.
 
@@ -350,6 +652,7 @@ def convert_to_datetime(date_string, date_string_format="%Y/%m/%d"):
 
 def dict_hash(dictionary: Dict[str, Any]) -> str:
     """MD5 hash of a dictionary."""
+    [hashlib, json] = hash_modules()
     dhash = hashlib.md5()
     # We need to sort arguments so {'a': 1, 'b': 2} is
     # the same as {'b': 2, 'a': 1}
@@ -358,20 +661,31 @@ def dict_hash(dictionary: Dict[str, Any]) -> str:
     return dhash.hexdigest()
 
 
-def create_fitid(cols, row_number, fitids):
+def create_fitid(cols, row_number, fitids, strategy=DEFAULT_FITID_STRATEGY):
     """
-    Create a fitid (transaction id) from the input (a row: or dictionary if column values).
-    If there is a collision (we keep track of existing values in fitids), use row_number to resolve
-    the conflict.
+    Create a fitid (transaction id) from the input (a TransactionRow or dictionary of column
+    values) using strategy (see FITID_STRATEGIES). If there is a collision (we keep track of
+    existing values in fitids), use row_number to resolve the conflict.
 
     :param cols:
     :param row_number:
     :param fitids:
+    :param strategy:
     :return:
     """
-    fitid = dict_hash(cols)
+    fitid = None
+    match strategy:
+        case "sequence":
+            fitid = str(row_number)
+        case "source":
+            fitid = cols.fitid if isinstance(cols, TransactionRow) else cols.get("fitid")
+    if not fitid:
+        if isinstance(cols, TransactionRow):
+            fitid = cols.row_hash
+        else:
+            fitid = dict_hash(cols)
     if fitid in fitids:
-        fitid = fitid + "_" + row_number
+        fitid = fitid + "_" + str(row_number)
 
     fitids.add(fitid)
 
@@ -407,85 +721,102 @@ def to_decimal(val):
     return Decimal(val)
 
 
-def create_transactions(data_csv_rows, date_string_format):
+def iter_row_chunks(data_csv_rows, chunk_size=DEFAULT_CHUNK_SIZE):
     """
-    Create a list of transactions from info in the list of data_csv_rows.
+    Split data_csv_rows into lists of (at most) chunk_size TransactionRow.
 
     :param data_csv_rows:
-    :param date_string_format:
+    :param chunk_size:
     :return:
     """
-    dtstart = None
-    dtend = None
-    memo = None
+    iterator = iter(data_csv_rows)
+    while True:
+        rows = [
+            cols if isinstance(cols, TransactionRow) else create_transaction_row(cols)
+            for cols in islice(iterator, chunk_size)
+        ]
+        if not rows:
+            return
+        yield rows
+
+
+def iter_transactions(
+    data_csv_rows,
+    date_string_format,
+    fitid_strategy=DEFAULT_FITID_STRATEGY,
+):
+    """
+    Create the InvestmentTransaction of each row of data_csv_rows (TransactionRow, or
+    dictionaries of column values), one chunk of rows at a time.
 
+    :param data_csv_rows:
+    :param date_string_format:
+    :param fitid_strategy:
+    :return: iterator of InvestmentTransaction, in the order of the rows
+    """
     row_number = 0
-    txns = {}
-    transactions = []
     fitids = set()
-    for cols in data_csv_rows:
-        row_number = row_number + 1
-
-        txn_type = cols["txn_type"]
-        symbol_type = DEFAULT_TXN_SYMBOL_TYPE
-        if "symbol_type" in cols:
-            symbol_type = cols["symbol_type"]
-        # Ensure sign correctness
-        units = 0.00
-        total = 0.00
-        match txn_type:
-            case "BUYSTOCK":
-                # BUY units is POSITIVE
-                units = ensure_sign(to_decimal(cols["units"]))
-                # BUY total is NEGATIVE
-                total = ensure_sign(to_decimal(cols["total"]), False)
-            case "BUYMF":
-                # BUY units is POSITIVE
-                units = ensure_sign(to_decimal(cols["units"]))
-                # BUY total is NEGATIVE
-                total = ensure_sign(to_decimal(cols["total"]), False)
-            case "SELLSTOCK":
-                # SELL units is NEGATIVE
-                units = ensure_sign(to_decimal(cols["units"]), False)
-                # SELL total is POSITIVE
-                total = ensure_sign(to_decimal(cols["total"]))
-            case "SELLMF":
-                # SELL units is NEGATIVE
-                units = ensure_sign(to_decimal(cols["units"]), False)
-                # SELL total is POSITIVE
-                total = ensure_sign(to_decimal(cols["total"]))
-            case "REINVEST":
-                units = to_decimal(cols["units"])
-                total = to_decimal(cols["total"])
-            case "INCOME":
-                units = to_decimal(cols["units"])
-                total = to_decimal(cols["total"])
-
-        symbol = cols["symbol"]
-        if "memo" in cols:
-            memo = cols["memo"]
-            if memo is None or len(memo) <= 0:
-                memo = ""
-        else:
-            memo = ""
-
-        unitprice = to_decimal(cols["unitprice"])
-        txn = InvestmentTransaction(
-            txn_type=txn_type,
-            symbol_type=symbol_type,
-            trade_date=convert_to_datetime(cols["trade_date"], date_string_format),
-            symbol=symbol,
-            # BUY units is POSITIVE
-            # SELL units is NEGATIVE
+    for rows in iter_row_chunks(data_csv_rows):
+        columns = TransactionRow(*zip(*rows))
+        # Ensure sign correctness, for the whole chunk at once
+        # BUY units is POSITIVE, BUY total is NEGATIVE
+        # SELL units is NEGATIVE, SELL total is POSITIVE
+        [units, unitprices, totals] = convert_numeric_columns(
+            columns.txn_type,
+            columns.units,
+            columns.unitprice,
+            columns.total,
+            first_row_number=row_number + 1,
+        )
+        # Dates repeat a lot, convert each distinct one once
+        trade_dates = {
+            trade_date: convert_to_datetime(trade_date, date_string_format)
+            for trade_date in set(columns.trade_date)
+        }
+        chunk_fitids = []
+        for cols in rows:
+            row_number = row_number + 1
+            chunk_fitids.append(create_fitid(cols, row_number, fitids, fitid_strategy))
+
+        yield from InvestmentTransaction.from_columns(
+            trade_dates=list(map(trade_dates.__getitem__, columns.trade_date)),
+            symbols=columns.symbol,
             units=units,
-            unitprice=unitprice,
-            # BUY total is NEGATIVE
-            # SELL total is POSITIVE
-            total=total,
-            memo=memo,
+            unitprices=unitprices,
+            totals=totals,
+            fitids=chunk_fitids,
+            txn_types=columns.txn_type,
+            symbol_types=columns.symbol_type,
+            memos=columns.memo,
         )
-        txn.fitid = create_fitid(cols, row_number, fitids)
 
+
+def create_transactions(
+    data_csv_rows,
+    date_string_format,
+    fitid_strategy=DEFAULT_FITID_STRATEGY,
+    securities=None,
+    positions=None,
+):
+    """
+    Create a list of transactions from info in the list of data_csv_rows (TransactionRow, or
+    dictionaries of column values).
+
+    :param data_csv_rows:
+    :param date_string_format:
+    :param fitid_strategy:
+    :param securities: SecurityTable for the run, a new one if None
+    :param positions: optional PositionAccumulator, each transaction is added to it
+    :return:
+    """
+    if securities is None:
+        securities = SecurityTable()
+    dtstart = None
+    dtend = None
+
+    txns = {}
+    transactions = []
+    for txn in iter_transactions(data_csv_rows, date_string_format, fitid_strategy):
         trade_date = txn.trade_date
         if dtstart is None:
             dtstart = trade_date
@@ -496,19 +827,22 @@ def create_transactions(data_csv_rows, date_string_format):
 
         if txn.symbol not in txns:
             txns[txn.symbol] = txn
+        if positions is not None:
+            positions.add(txn)
 
-        transactions.append(txn.ofx())
+        transactions.append(txn.ofx(securities))
 
-    secinfo = create_secinfo(txns)
+    secinfo = create_secinfo(txns, securities)
 
     return [transactions, secinfo, dtstart, dtend]
 
 
-def create_secinfo(txns):
+def create_secinfo(txns, securities=None):
     """
     Create list of secinfo (such as STOCKINFO, MFINFO ...) from the list of transactions.
 
     :param txns:
+    :param securities:
     :return:
     """
     secinfo = []
@@ -516,17 +850,17 @@ def create_secinfo(txns):
         txn = txns[symbol]
         match txn.txn_type:
             case "BUYSTOCK":
-                secinfo.append(create_STOCKINFO(txn))
+                secinfo.append(create_STOCKINFO(txn, securities))
             case "SELLSTOCK":
-                secinfo.append(create_STOCKINFO(txn))
+                secinfo.append(create_STOCKINFO(txn, securities))
             case "BUYMF":
-                secinfo.append(create_MFINFO(txn))
+                secinfo.append(create_MFINFO(txn, securities))
             case "SELLMF":
-                secinfo.append(create_MFINFO(txn))
+                secinfo.append(create_MFINFO(txn, securities))
             case "REINVEST":
-                secinfo.append(create_secinfo_REINVEST(txn))
+                secinfo.append(create_secinfo_REINVEST(txn, securities))
             case "INCOME":
-                secinfo.append(create_secinfo_INCOME(txn))
+                secinfo.append(create_secinfo_INCOME(txn, securities))
 
     return secinfo
 
@@ -545,34 +879,38 @@ def is_STOCKINFO(txn):
         return txn.symbol_type == "STOCK"
 
 
-def create_secinfo_REINVEST(txn):
+def create_secinfo_REINVEST(txn, securities=None):
     if is_MFINFO(txn):
-        return create_MFINFO(txn)
+        return create_MFINFO(txn, securities)
     elif is_STOCKINFO(txn):
-        return create_STOCKINFO(txn)
+        return create_STOCKINFO(txn, securities)
     else:
         return None
 
 
-def create_secinfo_INCOME(txn):
+def create_secinfo_INCOME(txn, securities=None):
     if is_MFINFO(txn):
-        return create_MFINFO(txn)
+        return create_MFINFO(txn, securities)
     elif is_STOCKINFO(txn):
-        return create_STOCKINFO(txn)
+        return create_STOCKINFO(txn, securities)
     else:
         return None
 
 
-def create_MFINFO(txn):
-    return models.MFINFO(
+def create_MFINFO(txn, securities=None):
+    if securities is not None:
+        return securities.mfinfo(txn.symbol)
+    return ofx_models().MFINFO(
         secinfo=create_SECINFO(txn),
         # yld=Decimal("10"),
         # assetclass="SMALLSTOCK",
     )
 
 
-def create_STOCKINFO(txn):
-    return models.STOCKINFO(
+def create_STOCKINFO(txn, securities=None):
+    if securities is not None:
+        return securities.stockinfo(txn.symbol)
+    return ofx_models().STOCKINFO(
         secinfo=create_SECINFO(txn),
         # yld=Decimal("10"),
         # assetclass="SMALLSTOCK",
@@ -580,6 +918,8 @@ def create_STOCKINFO(txn):
 
 
 def create_SECINFO(txn):
+    models = ofx_models()
+
     return models.SECINFO(
         secid=models.SECID(uniqueid=txn.symbol, uniqueidtype=DEFAULT_UNIQUE_ID_TYPE),
         secname=txn.symbol,
@@ -588,18 +928,36 @@ def create_SECINFO(txn):
     )
 
 
-# 2.5.1.6 Signon Response <SONRS>
-STATUS = models.STATUS(code=0, severity="INFO")
-SONRS = models.SONRS(
-    status=STATUS,
-    # dtserver=datetime(2005, 10, 29, 10, 10, 3, tzinfo=UTC),
-    dtserver=datetime.now(LOCAL_TZINFO),
-    language="ENG",
-    # dtprofup=datetime(2004, 10, 29, 10, 10, 3, tzinfo=UTC),
-    # dtacctup=datetime(2004, 10, 29, 10, 10, 3, tzinfo=UTC),
-    # fi=models.FI(org="NCH", fid="1001"),
-)
-SIGNONMSGSRSV1 = models.SIGNONMSGSRSV1(sonrs=SONRS)
+def create_status():
+    """
+    Create the STATUS object of a successful response (2.5.1.6 Signon Response <SONRS>).
+
+    :return:
+    """
+    return ofx_models().STATUS(code=0, severity="INFO")
+
+
+def create_signon(dtserver=None):
+    """
+    Create the SIGNONMSGSRSV1 object. dtserver is the current time if not given.
+
+    :param dtserver:
+    :return:
+    """
+    models = ofx_models()
+
+    if dtserver is None:
+        dtserver = datetime.now(LOCAL_TZINFO)
+    sonrs = models.SONRS(
+        status=create_status(),
+        # dtserver=datetime(2005, 10, 29, 10, 10, 3, tzinfo=UTC),
+        dtserver=dtserver,
+        language="ENG",
+        # dtprofup=datetime(2004, 10, 29, 10, 10, 3, tzinfo=UTC),
+        # dtacctup=datetime(2004, 10, 29, 10, 10, 3, tzinfo=UTC),
+        # fi=models.FI(org="NCH", fid="1001"),
+    )
+    return models.SIGNONMSGSRSV1(sonrs=sonrs)
 
 
 class InvestmentAccount:
@@ -609,7 +967,7 @@ class InvestmentAccount:
 
     def ofx(self):
         # 13.6.1 Specifying the Investment Account <INVACCTFROM>
-        return models.INVACCTFROM(
+        return ofx_models().INVACCTFROM(
             # Unique identifier for the FI, A-22
             # brokerid="121099999",
             brokerid=self.brokerid,
@@ -619,29 +977,32 @@ class InvestmentAccount:
         )
 
 
-def create_ofx_object(
+def create_invstmttrnrs(
     trnuid,
     transactions,
-    secinfo,
     dtstart,
     dtend,
     dtasof,
     brokerid,
     acctid,
+    invposlist=None,
 ):
     """
-    Create an OFX object (our model).
+    Create the statement of one account, 13.9.2.1 Investment Statement Transaction Response
+    <INVSTMTTRNRS>.
 
     :param trnuid:
     :param transactions:
-    :param secinfo:
     :param dtstart:
     :param dtend:
     :param dtasof:
     :param brokerid:
     :param acctid:
+    :param invposlist: optional INVPOSLIST
     :return:
     """
+    models = ofx_models()
+
     # Begin transaction list (at most one)
     invtranlist = models.INVTRANLIST(
         *transactions,
@@ -660,21 +1021,61 @@ def create_ofx_object(
         # Which account at FI, see 13.6.1
         invacctfrom=InvestmentAccount(brokerid, acctid).ofx(),
         invtranlist=invtranlist,
+        invposlist=invposlist,
+    )
+    return models.INVSTMTTRNRS(
+        # Client-assigned globally unique ID for this transaction, trnuid
+        # trnuid="1002",
+        trnuid=trnuid,
+        status=create_status(),
+        # 13.9.2.2 Investment Statement Response <INVSTMTRS>
+        invstmtrs=invstmtrs,
     )
 
+
+def create_ofx_object(
+    trnuid,
+    transactions,
+    secinfo,
+    dtstart,
+    dtend,
+    dtasof,
+    brokerid,
+    acctid,
+    dtserver=None,
+    invposlist=None,
+):
+    """
+    Create an OFX object (our model).
+
+    :param trnuid:
+    :param transactions:
+    :param secinfo:
+    :param dtstart:
+    :param dtend:
+    :param dtasof:
+    :param brokerid:
+    :param acctid:
+    :param dtserver: current time if None
+    :param invposlist: optional INVPOSLIST
+    :return:
+    """
+    models = ofx_models()
+
     seclistmsgsrsv1 = models.SECLISTMSGSRSV1(models.SECLIST(*secinfo))
 
     ofx = models.OFX(
-        signonmsgsrsv1=SIGNONMSGSRSV1,
+        signonmsgsrsv1=create_signon(dtserver),
         invstmtmsgsrsv1=models.INVSTMTMSGSRSV1(
-            # 13.9.2.1 Investment Statement Transaction Response <INVSTMTTRNRS>
-            models.INVSTMTTRNRS(
-                # Client-assigned globally unique ID for this transaction, trnuid
-                # trnuid="1002",
-                trnuid=trnuid,
-                status=STATUS,
-                # 13.9.2.2 Investment Statement Response <INVSTMTRS>
-                invstmtrs=invstmtrs,
+            create_invstmttrnrs(
+                trnuid,
+                transactions,
+                dtstart,
+                dtend,
+                dtasof,
+                brokerid,
+                acctid,
+                invposlist=invposlist,
             )
         ),
         seclistmsgsrsv1=seclistmsgsrsv1,
@@ -691,7 +1092,19 @@ def create_ofx_string(ofx, pretty_print):
     :param pretty_print:
     :return:
     """
-    root = ofx.to_etree()
+    return etree_to_ofx_string(ofx.to_etree(), pretty_print)
+
+
+def etree_to_ofx_string(root, pretty_print):
+    """
+    :param root: OFX element
+    :param pretty_print:
+    :return: the OFX output, header and message
+    """
+    import xml.dom.minidom
+    import xml.etree.ElementTree as ET
+    from ofxtools.header import make_header
+
     message = ET.tostring(root).decode()
     header = str(make_header(version=DEFAULT_OFX_VERSION))
     response = header + message
@@ -700,6 +1113,494 @@ def create_ofx_string(ofx, pretty_print):
     return response
 
 
+class ConversionOptions:
+    def __init__(
+        self,
+        acctid,
+        brokerid=None,
+        trnuid=None,
+        date_string_format=DEFAULT_DATE_STRING_FORMAT,
+        fitid_strategy=DEFAULT_FITID_STRATEGY,
+        pretty_print=False,
+        dtserver=None,
+        dtasof=None,
+        row_filter=None,
+        positions=False,
+        positions_filename=None,
+        jobs=1,
+        deterministic=False,
+    ):
+        """
+        Options of a conversion (same as the command line arguments).
+
+        :param acctid: Account number at FI, A-22
+        :param brokerid: Unique identifier for the FI, A-22 (DEFAULT_BROKER_ID if None)
+        :param trnuid: Client-assigned globally unique ID for this transaction (random if None)
+        :param date_string_format:
+        :param fitid_strategy:
+        :param pretty_print:
+        :param dtserver: current time if None
+        :param dtasof: current time if None
+        :param row_filter: optional RowFilter of the CSV rows
+        :param positions: add an INVPOSLIST computed from the transactions
+        :param positions_filename: optional JSON file the positions are loaded from and saved
+            to, so a run only needs the new transactions (implies positions)
+        :param jobs: number of worker processes building the statements of a multi-account
+            input (see create_accounts_response()), os.cpu_count() if None
+        :param deterministic: derive trnuid, dtserver and dtasof (those not given) from the
+            input, so the same input always gives the same output (see for_rows())
+        """
+        self.acctid = acctid
+        self.brokerid = brokerid
+        self.trnuid = trnuid
+        self.date_string_format = date_string_format
+        self.fitid_strategy = fitid_strategy
+        self.pretty_print = pretty_print
+        self.dtserver = dtserver
+        self.dtasof = dtasof
+        self.row_filter = row_filter
+        self.positions = positions or positions_filename is not None
+        self.positions_filename = positions_filename
+        self.jobs = jobs
+        self.deterministic = deterministic
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            acctid=args.acctid,
+            brokerid=args.brokerid,
+            trnuid=args.trnuid,
+            date_string_format=args.date_string_format,
+            fitid_strategy=args.fitid_strategy,
+            pretty_print=args.pretty_print,
+            row_filter=RowFilter.from_args(args, args.date_string_format),
+            positions=args.positions,
+            positions_filename=args.positions_file,
+            jobs=args.jobs,
+            deterministic=args.deterministic,
+        )
+
+    def for_rows(self, rows):
+        """
+        The options to convert rows with. If deterministic, a copy with:
+
+        - trnuid: a UUID made of create_statement_hash() of the rows and options
+        - dtserver and dtasof: the latest trade date of the rows (DETERMINISTIC_DATE if
+          there are none), a date the statement is actually as of
+
+        :param rows: list of TransactionRow
+        :return: self if not deterministic or nothing is left to derive
+        """
+        import uuid
+
+        if not self.deterministic or None not in (
+            self.trnuid,
+            self.dtserver,
+            self.dtasof,
+        ):
+            return self
+        options = copy.copy(self)
+        if options.trnuid is None:
+            options.trnuid = str(uuid.UUID(create_statement_hash(rows, self)[:32]))
+        if options.dtserver is None or options.dtasof is None:
+            trade_dates = {row.trade_date for row in rows}
+            if trade_dates:
+                date = max(
+                    convert_to_datetime(trade_date, self.date_string_format)
+                    for trade_date in trade_dates
+                )
+            else:
+                date = DETERMINISTIC_DATE
+            if options.dtserver is None:
+                options.dtserver = date
+            if options.dtasof is None:
+                options.dtasof = date
+        return options
+
+    def create_positions(self):
+        """
+        :return: the PositionAccumulator of the run, None if positions are not wanted
+        """
+        if not self.positions:
+            return None
+        if self.positions_filename is None:
+            return PositionAccumulator()
+        return PositionAccumulator.load(self.positions_filename)
+
+    def save_positions(self, positions):
+        if positions is not None and self.positions_filename is not None:
+            positions.save(self.positions_filename)
+
+
+def create_statement_hash(rows, options):
+    """
+    SHA-256 of rows (their row_hash, which covers every column) and of the options that
+    change the output. Used for the deterministic trnuid, and as a cache key of the output.
+
+    :param rows: list of TransactionRow
+    :param options: ConversionOptions
+    :return: hex digest
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    for value in (
+        options.acctid,
+        options.brokerid,
+        options.date_string_format,
+        options.fitid_strategy,
+        options.pretty_print,
+        options.positions,
+    ):
+        digest.update(str(value).encode())
+        digest.update(b"\0")
+    for row in rows:
+        digest.update(row.row_hash.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def resolve_statement_ids(options):
+    """
+    :param options: ConversionOptions
+    :return: [trnuid, dtasof, brokerid] of options, with their defaults
+    """
+    import uuid
+
+    # Client-assigned globally unique ID for this transaction, trnuid
+    if options.trnuid is None:
+        trnuid = str(uuid.uuid4())
+    else:
+        trnuid = options.trnuid
+
+    # As of date & time for the statement download, datetime
+    # dtasof = datetime(2023, 1, 31, 21, 26, 5, tzinfo=UTC)
+    if options.dtasof is None:
+        dtasof = datetime.now(LOCAL_TZINFO)
+    else:
+        dtasof = options.dtasof
+
+    # Unique identifier for the FI, A-22
+    if options.brokerid is None:
+        brokerid = DEFAULT_BROKER_ID
+    else:
+        brokerid = options.brokerid
+    return [trnuid, dtasof, brokerid]
+
+
+def create_response(
+    transactions, secinfo, dtstart, dtend, options, positions=None, securities=None
+):
+    """
+    Create the OFX output (a string) from the result of create_transactions().
+
+    :param transactions:
+    :param secinfo:
+    :param dtstart:
+    :param dtend:
+    :param options: ConversionOptions
+    :param positions: optional PositionAccumulator, for the INVPOSLIST
+    :param securities: SecurityTable of the run, a new one if None
+    :return:
+    """
+    [trnuid, dtasof, brokerid] = resolve_statement_ids(options)
+
+    # Account number at FI, A-22
+    acctid = options.acctid
+
+    invposlist = None
+    if positions is not None:
+        if securities is None:
+            securities = SecurityTable()
+        # Held securities without transactions in this run
+        secinfo = secinfo + positions.create_secinfo(secinfo, securities)
+        invposlist = positions.create_invposlist(securities)
+
+    ofx = create_ofx_object(
+        trnuid,
+        transactions,
+        secinfo,
+        dtstart,
+        dtend,
+        dtasof,
+        brokerid,
+        acctid,
+        dtserver=options.dtserver,
+        invposlist=invposlist,
+    )
+    return create_ofx_string(ofx, options.pretty_print)
+
+
+def partition_accounts(data_csv_rows, options):
+    """
+    Group the rows by account, in one pass. Rows without acctid (brokerid) columns, or with
+    empty ones, belong to the account of options.
+
+    :param data_csv_rows: TransactionRow, or dictionaries of column values
+    :param options: ConversionOptions
+    :return: dictionary (brokerid, acctid): list of TransactionRow, in the order of the
+        first row of each account
+    """
+    accounts = {}
+    for cols in data_csv_rows:
+        row = cols if isinstance(cols, TransactionRow) else create_transaction_row(cols)
+        key = (row.brokerid or options.brokerid, row.acctid or options.acctid)
+        rows = accounts.get(key)
+        if rows is None:
+            rows = []
+            accounts[key] = rows
+        rows.append(row)
+    return accounts
+
+
+def read_csv_rows(file, options):
+    """
+    Read the CSV rows of an open text file. Only input with account columns (see
+    ACCOUNT_COLUMNS) is grouped by account, so read at once. Other input is read while it is
+    converted, a chunk at a time (see iter_row_chunks()).
+
+    :param file: open text file, at the header row
+    :param options: ConversionOptions
+    :return: [rows, accounts]: an iterator of TransactionRow and None without account
+        columns, otherwise None and the accounts (see partition_accounts())
+    """
+    header = file.readline()
+    names = {name.strip() for name in next(csv.reader([header]), [])}
+    rows = iter_data_csv_rows(chain([header], file), options.row_filter)
+    if ACCOUNT_COLUMNS.isdisjoint(names):
+        return [rows, None]
+    return [None, partition_accounts(rows, options)]
+
+
+def create_account_options(options, brokerid, acctid, trnuid, dtasof):
+    """
+    :return: copy of options for the statement of one account of an input with account
+        columns
+    """
+    account_options = copy.copy(options)
+    account_options.brokerid = brokerid
+    account_options.acctid = acctid
+    account_options.trnuid = trnuid
+    account_options.dtasof = dtasof
+    if options.positions_filename is not None:
+        account_options.positions_filename = account_positions_filename(
+            options.positions_filename, acctid
+        )
+    return account_options
+
+
+def account_positions_filename(positions_filename, acctid):
+    """One position file per account: <root>-<acctid><ext>."""
+    [root, ext] = os.path.splitext(positions_filename)
+    return "%s-%s%s" % (root, acctid, ext)
+
+
+def create_account_statement(rows, options):
+    """
+    Create the statement of one account (runs in a worker process, see
+    create_accounts_response()). The ofxtools objects cannot be pickled, they are returned
+    serialized.
+
+    :param rows: list of TransactionRow of the account
+    :param options: ConversionOptions of the account
+    :return: [INVSTMTTRNRS as XML, list of (uniqueid, uniqueidtype, SECINFO as XML)]
+    """
+    import xml.etree.ElementTree as ET
+
+    securities = SecurityTable()
+    positions = options.create_positions()
+    [transactions, secinfo, dtstart, dtend] = create_transactions(
+        rows,
+        options.date_string_format,
+        options.fitid_strategy,
+        securities,
+        positions,
+    )
+    invposlist = None
+    if positions is not None:
+        secinfo = secinfo + positions.create_secinfo(secinfo, securities)
+        invposlist = positions.create_invposlist(securities)
+    options.save_positions(positions)
+
+    invstmttrnrs = create_invstmttrnrs(
+        options.trnuid,
+        transactions,
+        dtstart,
+        dtend,
+        options.dtasof,
+        options.brokerid,
+        options.acctid,
+        invposlist=invposlist,
+    )
+    return [
+        ET.tostring(invstmttrnrs.to_etree()).decode(),
+        [
+            (
+                info.secinfo.secid.uniqueid,
+                info.secinfo.secid.uniqueidtype,
+                ET.tostring(info.to_etree()).decode(),
+            )
+            for info in secinfo
+        ],
+    ]
+
+
+def create_accounts_response(accounts, options):
+    """
+    Create one OFX response with an INVSTMTTRNRS per account, and the SECLIST of all of
+    them. The statements are built concurrently, in a process pool of options.jobs workers.
+
+    :param accounts: see partition_accounts()
+    :param options: ConversionOptions
+    :return: the OFX output (a string)
+    """
+    import xml.etree.ElementTree as ET
+    from concurrent.futures import ProcessPoolExecutor
+    models = ofx_models()
+
+    # The same dates for all the statements
+    dates = options.for_rows([row for rows in accounts.values() for row in rows])
+    dtasof = resolve_statement_ids(dates)[1]
+    account_options = []
+    for (brokerid, acctid), rows in accounts.items():
+        [trnuid, _, default_brokerid] = resolve_statement_ids(options)
+        if options.trnuid is not None:
+            # Unique per statement
+            trnuid = "%s-%s" % (options.trnuid, acctid)
+        elif options.deterministic:
+            # Derived from the rows of the account
+            trnuid = None
+        account_option = create_account_options(
+            options, brokerid or default_brokerid, acctid, trnuid, dtasof
+        )
+        account_options.append(account_option.for_rows(rows))
+
+    rows_list = list(accounts.values())
+    if options.jobs == 1:
+        statements = list(map(create_account_statement, rows_list, account_options))
+    else:
+        with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+            statements = list(
+                executor.map(create_account_statement, rows_list, account_options)
+            )
+
+    ofx = models.OFX(
+        signonmsgsrsv1=create_signon(dates.dtserver),
+        invstmtmsgsrsv1=models.INVSTMTMSGSRSV1(),
+        seclistmsgsrsv1=models.SECLISTMSGSRSV1(models.SECLIST()),
+    )
+    root = ofx.to_etree()
+    invstmtmsgsrsv1 = root.find("INVSTMTMSGSRSV1")
+    seclist = root.find("SECLISTMSGSRSV1/SECLIST")
+    # Securities held in several accounts are listed once
+    seen = set()
+    for invstmttrnrs, secinfo in statements:
+        invstmtmsgsrsv1.append(ET.fromstring(invstmttrnrs))
+        for uniqueid, uniqueidtype, info in secinfo:
+            if (uniqueid, uniqueidtype) not in seen:
+                seen.add((uniqueid, uniqueidtype))
+                seclist.append(ET.fromstring(info))
+    return etree_to_ofx_string(root, options.pretty_print)
+
+
+def convert(source, options, output=None):
+    """
+    Convert CSV input to OFX, in process: no config file, no printing, no global state, so it
+    is safe to call from many threads at once.
+
+    :param source: CSV filename, CSV content (bytes), an open (text or binary) file,
+        or an iterable of rows (TransactionRow or dictionary of column values). With rows of
+        several accounts (acctid column), there is a statement per account
+    :param options: ConversionOptions
+    :param output: optional binary stream to write the OFX output to
+    :return: the OFX output (bytes), or output if given
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r") as file:
+            return convert(file, options, output)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.StringIO(source.decode())
+    if hasattr(source, "read"):
+        if not isinstance(source, io.TextIOBase):
+            source = codecs.getreader("utf-8")(source)
+        [rows, accounts] = read_csv_rows(source, options)
+    else:
+        [rows, accounts] = [None, partition_accounts(source, options)]
+
+    [response, _] = create_csv_response(rows, accounts, options)
+    response = response.encode()
+    if output is None:
+        return response
+    output.write(response)
+    return output
+
+
+def create_csv_response(rows, accounts, options, stats=None):
+    """
+    Create the OFX output of the rows read by read_csv_rows(): one statement, or one per
+    account. The positions files are saved.
+
+    :param rows: iterator of TransactionRow, None if accounts is given
+    :param accounts: see partition_accounts(), None if rows is given
+    :param options: ConversionOptions
+    :param stats: optional RunStats, the rows, accounts, transactions and securities are
+        counted
+    :return: [the OFX output (a string), list of the positions files saved]
+    """
+    if accounts is not None:
+        if stats is not None:
+            stats.count("rows", sum(len(rows) for rows in accounts.values()))
+            stats.count("accounts", len(accounts))
+        if len(accounts) > 1:
+            response = create_accounts_response(accounts, options)
+            positions_filenames = []
+            if options.positions_filename is not None:
+                positions_filenames = [
+                    account_positions_filename(options.positions_filename, acctid)
+                    for _, acctid in accounts
+                ]
+            return [response, positions_filenames]
+        if accounts:
+            [[(brokerid, acctid), rows]] = accounts.items()
+            options = create_account_options(
+                options, brokerid, acctid, options.trnuid, options.dtasof
+            )
+        else:
+            rows = []
+
+    if options.deterministic:
+        # Hashed before they are converted
+        rows = list(rows)
+    options = options.for_rows(rows)
+    securities = SecurityTable()
+    positions = options.create_positions()
+    [transactions, secinfo, dtstart, dtend] = create_transactions(
+        rows,
+        options.date_string_format,
+        options.fitid_strategy,
+        securities,
+        positions,
+    )
+    if stats is not None:
+        if accounts is None:
+            # One transaction per row
+            stats.count("rows", len(transactions))
+            stats.count("accounts", 1)
+        stats.count("transactions", len(transactions))
+        stats.count("securities", len(secinfo))
+    # Formatted only if debugging: a SECLIST can be large
+    logger.debug("secinfo=%s", secinfo)
+
+    response = create_response(
+        transactions, secinfo, dtstart, dtend, options, positions, securities
+    )
+    options.save_positions(positions)
+    positions_filenames = []
+    if options.positions_filename is not None:
+        positions_filenames = [options.positions_filename]
+    return [response, positions_filenames]
+
+
 def main(args):
     """
     Read CSV file input and generate an OFX file
@@ -726,47 +1627,59 @@ def main(args):
         # print("# Will use input file=%s" % filename)
 
     if input_filename is None:
-        print("# ERROR, input_file is None.")
+        logger.error("input_file is None.")
         return
 
-    [transactions, secinfo, dtstart, dtend] = create_transactions(
-        create_data_csv_rows_from_file(input_filename), args.date_string_format
-    )
-
-    # Client-assigned globally unique ID for this transaction, trnuid
-    if args.trnuid is None:
-        trnuid = str(uuid.uuid4())
-    else:
-        trnuid = args.trnuid
-
-    # As of date & time for the statement download, datetime
-    # dtasof = datetime(2023, 1, 31, 21, 26, 5, tzinfo=UTC)
-    dtasof = datetime.now(LOCAL_TZINFO)
-
-    # Unique identifier for the FI, A-22
-    brokerid = DEFAULT_BROKER_ID
-    if args.brokerid is None:
-        brokerid = DEFAULT_BROKER_ID
-    else:
-        brokerid = args.brokerid
-
-    # Account number at FI, A-22
-    acctid = args.acctid
-
-    pretty_print = args.pretty_print
-
-    print(secinfo)
-
-    ofx = create_ofx_object(
-        trnuid, transactions, secinfo, dtstart, dtend, dtasof, brokerid, acctid
-    )
-    response = create_ofx_string(ofx, pretty_print)
-    output_filename = args.output
-    write_response(output_filename, input_filename, response)
-
+    logger.info("Reading input from file=%s", input_filename)
+    options = ConversionOptions.from_args(args)
+    if args.split_by is not None or args.max_transactions is not None:
+        from split_output import write_partitions
+
+        if args.incremental:
+            logger.warning("--incremental is ignored when splitting the output")
+        if options.positions:
+            # Each file would need the positions as of its last transaction
+            logger.warning(
+                "--positions and --positions_file are ignored when splitting the output"
+            )
+        write_partitions(
+            input_filename,
+            args.output,
+            options,
+            split_by=args.split_by or "none",
+            max_transactions=args.max_transactions,
+            jobs=args.jobs,
+        )
+        return
+    manifest = None
+    if args.incremental:
+        manifest = Manifest(
+            get_output_filename(args.output, input_filename),
+            [input_filename],
+            args_settings(args),
+        )
+        if manifest.is_up_to_date():
+            logger.info("Up to date, file=%s", manifest.output_filename)
+            return
+
+    stats = RunStats()
+    with open(input_filename, "r") as file:
+        with stats.timer("read"):
+            # Without account columns, the rows are read while they are converted
+            [rows, accounts] = read_csv_rows(file, options)
+        with stats.timer("convert"):
+            [response, positions_filenames] = create_csv_response(
+                rows, accounts, options, stats
+            )
+    with stats.timer("write"):
+        write_response(args.output, input_filename, response)
+    if manifest is not None:
+        manifest.state_filenames = positions_filenames
+        manifest.save()
+    logger.info("Done, %s", stats)
 
-def write_response(output_filename, input_filename, response):
 
+def get_output_filename(output_filename, input_filename):
     # if user specified an output directory then use the input_filename as template for
     # output filename
     # input_filename: abc.csv
@@ -775,36 +1688,27 @@ def write_response(output_filename, input_filename, response):
         output_dir = os.path.abspath(output_filename)
         prefix = Path(os.path.abspath(input_filename)).stem
         output_filename = os.path.join(output_dir, prefix + ".ofx")
+    return output_filename
+
+
+def write_response(output_filename, input_filename, response):
+    output_filename = get_output_filename(output_filename, input_filename)
 
     # Write out the OFX output
     with open(output_filename, "w") as f:
-        print("# Writing output to file=%s" % output_filename)
+        logger.info("Writing output to file=%s", output_filename)
         print(response, file=f)
 
 
-# Press the green button in the gutter to run the script.
-def config_to_args(config, section):
-    my_args = []
-    try:
-        # section = DEFAULT_CONFIG_SECTION
-        options = config.options(section)
-        for option in options:
-            my_args.append("--" + option)
-            value = config.get(section, option)
-            if value and len(value) > 0:
-                my_args.append(value)
-    except configparser.NoSectionError:
-        pass
-
-    return my_args
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", "-i", required=True, help="Input file")
     parser.add_argument("--output", "-o", required=True, help="Output file")
     parser.add_argument(
-        "--date_string_format", "-d", default="%Y/%m/%d", help="Date string format"
+        "--date_string_format",
+        "-d",
+        default=DEFAULT_DATE_STRING_FORMAT,
+        help="Date string format",
     )
     parser.add_argument(
         "--trnuid",
@@ -824,6 +1728,13 @@ if __name__ == "__main__":
         required=True,
         help="Account number at FI, A-22",
     )
+    parser.add_argument(
+        "--fitid_strategy",
+        "-f",
+        default=DEFAULT_FITID_STRATEGY,
+        choices=FITID_STRATEGIES,
+        help="How to create a transaction id: hash of the row, row number or the fitid column",
+    )
     parser.add_argument(
         "--pretty_print",
         "-p",
@@ -831,19 +1742,86 @@ if __name__ == "__main__":
         action="store_true",
         help="Pretty print the output",
     )
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "--positions",
+        default=False,
+        action="store_true",
+        help="Add the positions (INVPOSLIST) computed from the transactions",
+    )
+    parser.add_argument(
+        "--positions_file",
+        default=None,
+        help="JSON file to load and save the positions, for incremental runs",
+    )
+    parser.add_argument(
+        "--split_by",
+        choices=["month", "account", "none"],
+        default=None,
+        help="Write one OFX file per calendar month, or per account (acctid column)",
+    )
+    parser.add_argument(
+        "--max_transactions",
+        type=int,
+        default=None,
+        help="Most transactions per OFX file, more are split in several files",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Worker processes for split files or account statements (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--watch",
+        "-w",
+        default=False,
+        action="store_true",
+        help="Keep running, convert new or changed files of the input directory",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=5.0,
+        help="With --watch, seconds between scans if inotify is not available",
+    )
+    parser.add_argument(
+        "--settle_time",
+        type=float,
+        default=2.0,
+        help="With --watch, seconds a file must stay unchanged before it is converted",
+    )
+    parser.add_argument(
+        "--deterministic",
+        default=False,
+        action="store_true",
+        help="Derive TRNUID, DTSERVER and DTASOF from the input: same input, same output",
+    )
+    add_incremental_arguments(parser)
+    add_profiling_arguments(parser)
+    add_logging_arguments(parser)
 
     config = configparser.ConfigParser()
     config_filename = DEFAULT_CONFIG_FILENAME
     if os.access(config_filename, os.R_OK):
-        print("# Reading config file=%s" % config_filename)
         config.read(config_filename)
         config_args = config_to_args(config, DEFAULT_CONFIG_SECTION)
-        print("# sys.argv=%s" % sys.argv[1:])
         config_args = config_args + sys.argv[1:]
-        print("# config_args=%s" % config_args)
         args = parser.parse_args(args=config_args)
+        configure_logging(args)
+        logger.info("Read config file=%s", config_filename)
+        logger.debug("sys.argv=%s", sys.argv[1:])
+        logger.debug("config_args=%s", config_args)
     else:
-        print("# sys.argv=%s" % sys.argv)
         args = parser.parse_args()
+        configure_logging(args)
+        logger.debug("sys.argv=%s", sys.argv)
 
-    main(args)
+    with profile_run(args):
+        if args.watch:
+            from watch_folder import watch
+
+            watch(args)
+        else:
+            main(args)
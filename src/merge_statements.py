@@ -0,0 +1,395 @@
+import argparse
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from operator import itemgetter
+
+from diagnostics import add_arguments as add_logging_arguments, configure_logging
+from invtranlist import (
+    DEFAULT_DATE_STRING_FORMAT,
+    DEFAULT_FITID_STRATEGY,
+    FITID_STRATEGIES,
+    LOCAL_TZINFO,
+    ConversionOptions,
+    SecurityTable,
+    convert_to_datetime,
+    create_response,
+    create_secinfo,
+    dict_hash,
+    iter_data_csv_rows,
+    iter_transactions,
+)
+
+logger = logging.getLogger(__name__)
+
+# Two transactions are duplicates if they have the same FITID
+DEDUP_FITID = "fitid"
+# Two transactions are duplicates if they have the same type, trade date, security, units,
+# unit price and total (FITIDs differ between a CSV export and an OFX download)
+DEDUP_CONTENT = "content"
+DEDUP_NONE = "none"
+DEDUP_MODES = [DEDUP_FITID, DEDUP_CONTENT, DEDUP_NONE]
+DEFAULT_DEDUP = DEDUP_FITID
+
+# Duplicates are looked for among the transactions of the last DEFAULT_DEDUP_WINDOW_DAYS
+# days (of the merged, date ordered, transactions), so memory does not grow with the inputs
+DEFAULT_DEDUP_WINDOW_DAYS = 1
+
+FINGERPRINT_FIELDS = ["uniqueid", "units", "unitprice", "total"]
+
+
+def transaction_date(transaction):
+    """Trade date of an investment transaction, posted date of a bank transaction."""
+    dttrade = getattr(transaction, "dttrade", None)
+    if dttrade is None:
+        return getattr(transaction, "dtposted", None)
+    return dttrade
+
+
+def fingerprint(transaction, tickers=None):
+    """
+    Hash of the content of a transaction (not its FITID).
+
+    :param transaction: ofxtools transaction
+    :param tickers: optional uniqueid: ticker of the securities of its statement. The CSV
+        transactions are identified by ticker, OFX downloads by CUSIP: with the ticker in
+        place of the CUSIP, the same trade has the same fingerprint in both
+    :return:
+    """
+    columns = {
+        "type": transaction.__class__.__name__,
+        # The same day is at a different time of day in CSV (midnight) and OFX files
+        "date": transaction_date(transaction).astimezone(LOCAL_TZINFO).date().isoformat(),
+    }
+    for name in FINGERPRINT_FIELDS:
+        value = getattr(transaction, name, None)
+        if isinstance(value, Decimal):
+            value = value.normalize()
+        elif name == "uniqueid" and tickers:
+            value = tickers.get(value, value)
+        if value is not None:
+            columns[name] = str(value)
+    return dict_hash(columns)
+
+
+def security_key(secinfo):
+    return (secinfo.uniqueid, secinfo.uniqueidtype)
+
+
+class CsvStatement:
+    def __init__(self, filename, date_string_format, fitid_strategy, securities):
+        """
+        Transactions of an invtranlist.py CSV file. If the rows are sorted by trade date,
+        they are streamed, otherwise they are all read and sorted.
+
+        :param filename:
+        :param date_string_format:
+        :param fitid_strategy:
+        :param securities: SecurityTable shared by the CSV inputs
+        """
+        self.filename = filename
+        self.date_string_format = date_string_format
+        self.fitid_strategy = fitid_strategy
+        self.securities = securities
+        # symbol: first transaction, to create the SECINFO (see create_secinfo())
+        self.txns = {}
+
+    def is_sorted(self):
+        """
+        Check the order of the trade dates, without creating the transactions.
+
+        :raises ValueError: if the rows are of several accounts (acctid column)
+        """
+        previous = None
+        previous_trade_date = None
+        accounts = set()
+        with open(self.filename, "r") as file:
+            for row in iter_data_csv_rows(file):
+                accounts.add(row.acctid)
+                if len(accounts) > 1:
+                    raise ValueError(
+                        "Cannot merge file=%s, it has several accounts=%s"
+                        % (self.filename, sorted(accounts))
+                    )
+                if row.trade_date == previous_trade_date:
+                    continue
+                date = convert_to_datetime(row.trade_date, self.date_string_format)
+                if previous is not None and date < previous:
+                    return False
+                previous = date
+                previous_trade_date = row.trade_date
+        return True
+
+    def iter_unsorted(self):
+        with open(self.filename, "r") as file:
+            for txn in iter_transactions(
+                iter_data_csv_rows(file), self.date_string_format, self.fitid_strategy
+            ):
+                if txn.symbol not in self.txns:
+                    self.txns[txn.symbol] = txn
+                yield (txn.trade_date, txn.ofx(self.securities))
+
+    def __iter__(self):
+        if self.is_sorted():
+            return self.iter_unsorted()
+        return iter(sorted(self.iter_unsorted(), key=itemgetter(0)))
+
+    def secinfo(self):
+        """SECINFO of the securities of the transactions read so far."""
+        return create_secinfo(self.txns, self.securities)
+
+
+class OfxStatement:
+    def __init__(self, filename):
+        """
+        Transactions of the statements of an OFX (QFX) file. ofxtools parses the whole file,
+        so these are kept in memory, sorted by trade date.
+
+        :param filename:
+        """
+        from ofxtools import OFXTree
+
+        ofx_tree = OFXTree()
+        with open(filename, "rb") as f:
+            ofx_tree.parse(f)
+        ofx = ofx_tree.convert()
+        if len(ofx.statements) > 1:
+            raise ValueError(
+                "Cannot merge file=%s, it has several accounts=%s"
+                % (filename, [stmt.account.acctid for stmt in ofx.statements])
+            )
+        self.filename = filename
+        self.transactions = []
+        for stmt in ofx.statements:
+            for transaction in stmt.transactions:
+                self.transactions.append((transaction_date(transaction), transaction))
+        self.transactions.sort(key=itemgetter(0))
+        self.securities = list(ofx.securities) if ofx.securities is not None else []
+        # uniqueid (CUSIP): ticker, see fingerprint()
+        self.tickers = {
+            info.uniqueid: info.ticker for info in self.securities if info.ticker
+        }
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+    def secinfo(self):
+        return self.securities
+
+
+def open_statements(filenames, date_string_format, fitid_strategy):
+    """
+    :param filenames: CSV (by the .csv extension) and OFX files
+    :param date_string_format: of the CSV files
+    :param fitid_strategy: of the CSV files
+    :return: list of CsvStatement and OfxStatement
+    """
+    securities = SecurityTable()
+    statements = []
+    for filename in filenames:
+        logger.info("Reading input from file=%s", filename)
+        if os.path.splitext(filename)[1].lower() == ".csv":
+            statements.append(
+                CsvStatement(filename, date_string_format, fitid_strategy, securities)
+            )
+        else:
+            statements.append(OfxStatement(filename))
+    return statements
+
+
+class DedupWindow:
+    def __init__(self, window_days=DEFAULT_DEDUP_WINDOW_DAYS):
+        """
+        Keys of the transactions of the last window_days days, with the input they came from.
+        Transactions must be added in date order.
+
+        :param window_days:
+        """
+        self.window = timedelta(days=window_days)
+        # key: index of the input
+        self.keys = {}
+        self.queue = deque()
+
+    def seen(self, date, key, source):
+        """
+        :return: True if key was added from another input within the window. Two identical
+            transactions of the same input are both kept (e.g. two equal buys on one day).
+        """
+        queue = self.queue
+        while queue and queue[0][0] < date - self.window:
+            del self.keys[queue.popleft()[1]]
+        owner = self.keys.get(key)
+        if owner is None:
+            self.keys[key] = source
+            queue.append((date, key))
+            return False
+        return owner != source
+
+
+def iter_source(statement, source):
+    for date, transaction in statement:
+        yield (date, source, transaction)
+
+
+def merge_transactions(statements, dedup=DEFAULT_DEDUP, window_days=DEFAULT_DEDUP_WINDOW_DAYS):
+    """
+    k-way merge the transactions of statements by trade date, marking duplicates.
+
+    :param statements: iterables of (date, transaction), each sorted by date, with an
+        optional tickers attribute (see OfxStatement)
+    :param dedup: see DEDUP_MODES
+    :param window_days: see DEFAULT_DEDUP_WINDOW_DAYS
+    :return: iterator of (date, transaction, is_duplicate)
+    """
+    tickers = [getattr(statement, "tickers", None) for statement in statements]
+    match dedup:
+        case "fitid":
+            get_key = lambda transaction, source: transaction.fitid
+        case "content":
+            get_key = lambda transaction, source: fingerprint(transaction, tickers[source])
+        case _:
+            get_key = None
+    window = DedupWindow(window_days)
+    sources = [iter_source(statement, i) for i, statement in enumerate(statements)]
+    for date, source, transaction in heapq.merge(*sources, key=itemgetter(0)):
+        is_duplicate = get_key is not None and window.seen(
+            date, get_key(transaction, source), source
+        )
+        yield (date, transaction, is_duplicate)
+
+
+def union_secinfo(statements):
+    """SECINFO of all statements, once per security (the first one wins)."""
+    secinfo = {}
+    for statement in statements:
+        for info in statement.secinfo():
+            secinfo.setdefault(security_key(info), info)
+    return list(secinfo.values())
+
+
+def write_merged(
+    statements,
+    output,
+    options,
+    dedup=DEFAULT_DEDUP,
+    window_days=DEFAULT_DEDUP_WINDOW_DAYS,
+):
+    """
+    Write one OFX file (one INVSTMTRS) with the transactions of all statements. The inputs
+    must be of one account each.
+
+    The transactions are serialized one at a time to a temporary file as they come out of
+    the merge, then copied between the head and tail of the document (which need the date
+    range and securities, only known at the end).
+
+    :param statements: see open_statements()
+    :param output: binary stream
+    :param options: ConversionOptions (pretty_print is not supported)
+    :param dedup:
+    :param window_days:
+    :return: [number of transactions written, number of duplicates dropped]
+    """
+    import xml.etree.ElementTree as ET
+
+    dtstart = None
+    dtend = None
+    count = 0
+    duplicates = 0
+    with tempfile.TemporaryFile() as spool:
+        for date, transaction, is_duplicate in merge_transactions(
+            statements, dedup, window_days
+        ):
+            if is_duplicate:
+                duplicates = duplicates + 1
+                continue
+            if dtstart is None:
+                dtstart = date
+            dtend = date
+            spool.write(ET.tostring(transaction.to_etree()))
+            count = count + 1
+
+        if dtstart is None:
+            dtstart = dtend = datetime.now(LOCAL_TZINFO)
+        response = create_response(
+            [], union_secinfo(statements), dtstart, dtend, options
+        )
+        [head, tail] = response.split("</INVTRANLIST>")
+        output.write(head.encode())
+        spool.seek(0)
+        shutil.copyfileobj(spool, output)
+        output.write(("</INVTRANLIST>" + tail).encode())
+    return [count, duplicates]
+
+
+def main(args):
+    statements = open_statements(
+        args.input, args.date_string_format, args.fitid_strategy
+    )
+    options = ConversionOptions(
+        acctid=args.acctid,
+        brokerid=args.brokerid,
+        trnuid=args.trnuid,
+        date_string_format=args.date_string_format,
+        fitid_strategy=args.fitid_strategy,
+    )
+    with open(args.output, "wb") as f:
+        logger.info("Writing output to file=%s", args.output)
+        [count, duplicates] = write_merged(
+            statements, f, options, args.dedup, args.dedup_window_days
+        )
+    logger.info("Merged %d transactions, dropped %d duplicates", count, duplicates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input", "-i", required=True, nargs="+", help="Input CSV and OFX files"
+    )
+    parser.add_argument("--output", "-o", required=True, help="Output file")
+    parser.add_argument(
+        "--acctid", "-a", required=True, help="Account number at FI, A-22"
+    )
+    parser.add_argument(
+        "--brokerid", "-b", required=False, help="Unique identifier for the FI, A-22"
+    )
+    parser.add_argument(
+        "--trnuid",
+        "-t",
+        required=False,
+        help="Client-assigned globally unique ID for this transaction",
+    )
+    parser.add_argument(
+        "--date_string_format",
+        "-d",
+        default=DEFAULT_DATE_STRING_FORMAT,
+        help="Date string format of the CSV files",
+    )
+    parser.add_argument(
+        "--fitid_strategy",
+        "-f",
+        default=DEFAULT_FITID_STRATEGY,
+        choices=FITID_STRATEGIES,
+        help="How to create a transaction id for the CSV files",
+    )
+    parser.add_argument(
+        "--dedup",
+        default=DEFAULT_DEDUP,
+        choices=DEDUP_MODES,
+        help="How to recognize duplicate transactions: same FITID or same content",
+    )
+    parser.add_argument(
+        "--dedup_window_days",
+        type=int,
+        default=DEFAULT_DEDUP_WINDOW_DAYS,
+        help="Days apart duplicates can be",
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging(args)
+
+    main(args)
@@ -0,0 +1,195 @@
+import operator
+from decimal import Decimal, InvalidOperation
+from itertools import repeat
+
+UNITS_COLUMN = "units"
+UNITPRICE_COLUMN = "unitprice"
+TOTAL_COLUMN = "total"
+
+POSITIVE = 1
+NEGATIVE = -1
+
+# Sign rules for (units, total) of each txn_type. None keeps the value as is.
+SIGN_RULES = {
+    # BUY units is POSITIVE, BUY total is NEGATIVE
+    "BUYSTOCK": (POSITIVE, NEGATIVE),
+    "BUYMF": (POSITIVE, NEGATIVE),
+    # SELL units is NEGATIVE, SELL total is POSITIVE
+    "SELLSTOCK": (NEGATIVE, POSITIVE),
+    "SELLMF": (NEGATIVE, POSITIVE),
+    "REINVEST": (None, None),
+    "INCOME": (None, None),
+}
+
+UNITS_SIGNS = {
+    txn_type: rule[0] for txn_type, rule in SIGN_RULES.items() if rule[0] is not None
+}
+TOTAL_SIGNS = {
+    txn_type: rule[1] for txn_type, rule in SIGN_RULES.items() if rule[1] is not None
+}
+
+# Number of values looked at to guess if a column has many repeated values
+DISTINCT_SAMPLE_SIZE = 4096
+
+_ZERO = Decimal(0)
+_SIGN_OPERANDS = {POSITIVE: Decimal(1), NEGATIVE: Decimal(-1)}
+_EMPTY_AS_ZERO = {"": "0"}
+
+
+class MalformedValueError(ValueError):
+    def __init__(self, errors):
+        """
+        Raised when numeric values cannot be converted.
+
+        :param errors: list of (row_number, column, value)
+        """
+        self.errors = errors
+        details = ", ".join(
+            "row %s %s=%r" % (row_number, column, value)
+            for row_number, column, value in errors[:10]
+        )
+        if len(errors) > 10:
+            details = details + ", ... (%d more)" % (len(errors) - 10)
+        super().__init__("Malformed numeric value(s): %s" % details)
+
+
+def _find_empty(values):
+    if "" not in values:
+        return []
+    return [i for i, value in enumerate(values) if not value]
+
+
+def _is_repetitive(values):
+    sample = values[:DISTINCT_SAMPLE_SIZE]
+    return len(set(sample)) * 2 <= len(sample)
+
+
+def _convert_repetitive(values, signs, txn_types):
+    """
+    Convert (and apply the signs to) each distinct value once, then look the rows up. Decimal
+    is immutable so the rows can share them.
+    """
+    distinct = list(dict.fromkeys(values))
+    converted = dict(
+        zip(distinct, map(Decimal, map(_EMPTY_AS_ZERO.get, distinct, distinct)))
+    )
+    if signs is None:
+        return list(map(converted.__getitem__, values))
+
+    # Same as ensure_sign() in invtranlist.py
+    tables = {
+        POSITIVE: {value: +abs(d) for value, d in converted.items()},
+        NEGATIVE: {value: -abs(d) for value, d in converted.items()},
+    }
+    row_tables = map(tables.get, map(signs.get, txn_types), repeat(converted))
+    return list(map(operator.getitem, row_tables, values))
+
+
+def _convert_distinct(values, empty, signs, txn_types):
+    """
+    Convert each value, then apply the signs with copy_sign().
+    """
+    if empty:
+        decimals = list(map(Decimal, map(_EMPTY_AS_ZERO.get, values, values)))
+    else:
+        decimals = list(map(Decimal, values))
+    if signs is None:
+        return decimals
+
+    # The value itself is the operand for txn_types without a rule, so it keeps its sign
+    operands = list(
+        map(_SIGN_OPERANDS.get, map(signs.get, txn_types), decimals)
+    )
+    decimals = list(map(Decimal.copy_sign, decimals, operands))
+    if _ZERO in decimals:
+        # ensure_sign() gives 0 (not -0) for -abs(0), do the same
+        negative = _SIGN_OPERANDS[NEGATIVE]
+        decimals = [
+            _ZERO if (not d and operand is negative) else d
+            for d, operand in zip(decimals, operands)
+        ]
+    return decimals
+
+
+def _convert_values_slow(values, empty, signs, txn_types, column, first_row_number, errors):
+    """
+    Convert each value to Decimal, one at a time. Blank values are converted to 0 (and added to
+    empty). Values that are not a number are added to errors.
+    """
+    decimals = []
+    empty.clear()
+    for i, value in enumerate(values):
+        if value is None or not value.strip():
+            empty.append(i)
+            decimals.append(_ZERO)
+            continue
+        try:
+            decimals.append(Decimal(value))
+        except (InvalidOperation, ValueError, TypeError):
+            errors.append((first_row_number + i, column, value))
+            decimals.append(_ZERO)
+            continue
+        if signs is not None:
+            match signs.get(txn_types[i]):
+                case 1:
+                    decimals[i] = +abs(decimals[i])
+                case -1:
+                    decimals[i] = -abs(decimals[i])
+    return decimals
+
+
+def _convert_column(values, txn_types, signs, column, first_row_number, errors):
+    """
+    Convert one column. Nothing runs Python code per row (only map() and C-level callables),
+    unless the column has malformed or blank values.
+    """
+    empty = _find_empty(values)
+    try:
+        if _is_repetitive(values):
+            decimals = _convert_repetitive(values, signs, txn_types)
+        else:
+            decimals = _convert_distinct(values, empty, signs, txn_types)
+    except (InvalidOperation, ValueError, TypeError):
+        decimals = _convert_values_slow(
+            values, empty, signs, txn_types, column, first_row_number, errors
+        )
+
+    for i in empty:
+        if signs is not None and txn_types[i] in signs:
+            # Value is required to apply the sign
+            errors.append((first_row_number + i, column, values[i]))
+        decimals[i] = None
+    return decimals
+
+
+def convert_numeric_columns(txn_types, units, unitprices, totals, first_row_number=1):
+    """
+    Convert the units, unitprice and total columns (sequences of stripped strings, one per row)
+    to Decimal, and ensure the sign of units and total according to SIGN_RULES for each row's
+    txn_type. Empty values become None.
+
+    :param txn_types:
+    :param units:
+    :param unitprices:
+    :param totals:
+    :param first_row_number: row number of the first value, for error messages
+    :return: [units, unitprices, totals]
+    :raises MalformedValueError: if any value is not a number, or a signed value is empty
+    """
+    errors = []
+    columns = [
+        (units, UNITS_SIGNS, UNITS_COLUMN),
+        (unitprices, None, UNITPRICE_COLUMN),
+        (totals, TOTAL_SIGNS, TOTAL_COLUMN),
+    ]
+    results = []
+    for values, signs, column in columns:
+        results.append(
+            _convert_column(values, txn_types, signs, column, first_row_number, errors)
+        )
+
+    if errors:
+        errors.sort(key=operator.itemgetter(0))
+        raise MalformedValueError(errors)
+
+    return results
@@ -0,0 +1,168 @@
+import io
+import mmap
+import re
+from contextlib import contextmanager
+
+# group 1 is "/" for a closing tag, group 2 the tag name
+TAG_PATTERN = re.compile(rb"(?i)<(/?)([a-z0-9_\.]+)>")
+CLOSING_TAG_PATTERN = re.compile(rb"(?i)</([a-z0-9_\.]+)>")
+
+OFX_VERSION_1 = 1
+OFX_VERSION_2 = 2
+
+# OFX 1.x starts with "OFXHEADER:100", OFX 2.x with <?OFX OFXHEADER="200" VERSION="202"?>
+XML_VERSION_PATTERN = re.compile(rb"<\?OFX\b[^>]*\bVERSION=\"(\d)")
+UTF8_BOM = b"\xef\xbb\xbf"
+# The headers of both versions fit in this
+HEADER_SIZE = 4096
+
+
+@contextmanager
+def map_file(filename):
+    """
+    Memory-map filename read-only. The content is paged in by the OS as it is scanned, it is
+    never copied into a Python string.
+
+    :param filename:
+    :return: context manager of the mmap (bytes-like)
+    """
+    with open(filename, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file, cannot be mapped
+            yield b""
+            return
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def detect_ofx_version(filename):
+    """
+    Read the header of an OFX file for its major version. An OFX 2.x file is XML, with all its
+    closing tags: it can be parsed as is, without cleanup().
+
+    :param filename:
+    :return: OFX_VERSION_2 if the file is XML (starts with <?xml or <?OFX), otherwise
+        OFX_VERSION_1
+    """
+    with open(filename, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header.startswith(UTF8_BOM):
+        header = header[len(UTF8_BOM) :]
+    if not header.startswith(b"<?"):
+        # OFXHEADER:100, or something that needs cleaning up anyway
+        return OFX_VERSION_1
+    match = XML_VERSION_PATTERN.search(header)
+    if match is not None and match.group(1) == b"1":
+        return OFX_VERSION_1
+    return OFX_VERSION_2
+
+
+def find_closing_tags(data):
+    """
+    :param data: bytes-like OFX content
+    :return: set of the (upper case) names of the tags that are explicitly closed
+    """
+    return {match.group(1).upper() for match in CLOSING_TAG_PATTERN.finditer(data)}
+
+
+def _is_tag_like(data, position):
+    """
+    True if a text token starting at position starts like a tag (e.g. <?xml ...?>): the
+    original token loop handled it as a tag that opens no element.
+    """
+    return data[position : position + 1] == b"<" and data[position : position + 2] != b"<!"
+
+
+def cleanup_data(data, body_output):
+    """
+    Convert OFX 1.x (SGML) to XML: close the elements that have no closing tag. The body
+    (from the first tag on) is written to body_output: the text between two inserted
+    closing tags is written at once, as a slice of data.
+
+    :param data: bytes-like OFX content, e.g. a mmap (see map_file())
+    :param body_output: binary stream
+    :return: the header (bytes), what comes before the first tag
+    """
+    closing_tags = find_closing_tags(data)
+    # open tag name: True if the element has no closing tag
+    unclosed = {}
+    view = memoryview(data)
+    write = body_output.write
+    header_end = None
+    # body_output has data up to here
+    written = None
+    last_open_tag = None
+    # end of the previous tag
+    position = 0
+    try:
+        for match in TAG_PATTERN.finditer(data):
+            start = match.start()
+            if start > position and _is_tag_like(data, position):
+                # Closing tags go before the tag-like text token
+                start = position
+            if header_end is None:
+                header_end = written = start
+            elif last_open_tag is not None:
+                write(view[written:start])
+                write(b"</%s>" % last_open_tag)
+                written = start
+                last_open_tag = None
+            if not match.group(1):
+                name = match.group(2)
+                is_unclosed = unclosed.get(name)
+                if is_unclosed is None:
+                    is_unclosed = name.upper() not in closing_tags
+                    unclosed[name] = is_unclosed
+                if is_unclosed:
+                    last_open_tag = name
+            position = match.end()
+
+        if position < len(data) and _is_tag_like(data, position):
+            if header_end is None:
+                header_end = written = position
+            elif last_open_tag is not None:
+                write(view[written:position])
+                write(b"</%s>" % last_open_tag)
+                written = position
+        if header_end is not None:
+            write(view[written:])
+    finally:
+        # The mmap cannot be closed while a view of it is alive
+        view.release()
+
+    if header_end is None:
+        return bytes(data)
+    return bytes(data[:header_end])
+
+
+def cleanup_file(filename, body_output):
+    """
+    cleanup_data() of a memory-mapped file.
+
+    :param filename:
+    :param body_output: binary stream
+    :return: the header (bytes)
+    """
+    with map_file(filename) as data:
+        return cleanup_data(data, body_output)
+
+
+def cleanup(filename):
+    """
+    Convert an OFX 1.x file to XML.
+
+    :param filename:
+    :return: [header, xml_body], as StringIO
+    """
+    body = io.BytesIO()
+    header = cleanup_file(filename, body)
+    body.seek(0)
+    # Decoded as open(filename) would (locale encoding, universal newlines)
+    return [
+        io.StringIO(io.TextIOWrapper(io.BytesIO(header)).read()),
+        io.StringIO(io.TextIOWrapper(body).read()),
+    ]
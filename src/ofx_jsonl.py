@@ -0,0 +1,99 @@
+import json
+import xml.etree.ElementTree as ET
+
+try:
+    import orjson
+except ImportError:
+    # Optional, faster encoder
+    orjson = None
+
+RECORD_TRANSACTION = "transaction"
+RECORD_POSITION = "position"
+RECORD_SECURITY = "security"
+
+# aggregate: type of the records of its children
+RECORD_PARENTS = {
+    "INVTRANLIST": RECORD_TRANSACTION,
+    "INVPOSLIST": RECORD_POSITION,
+    "SECLIST": RECORD_SECURITY,
+}
+
+# Children of the parents above that are not records
+NOT_RECORDS = {"DTSTART", "DTEND"}
+
+
+def element_to_dict(element):
+    """
+    Convert an element the way xmltodict does: the stripped text of a leaf (None if empty),
+    otherwise a dictionary of the children, a list for a repeated child.
+
+    :param element:
+    :return:
+    """
+    if len(element) == 0:
+        text = element.text.strip() if element.text is not None else ""
+        return text if text else None
+    result = {}
+    for child in element:
+        value = element_to_dict(child)
+        if child.tag not in result:
+            result[child.tag] = value
+        elif isinstance(result[child.tag], list):
+            result[child.tag].append(value)
+        else:
+            result[child.tag] = [result[child.tag], value]
+    return result
+
+
+def iter_records(xml_body):
+    """
+    Incrementally parse OFX XML and yield each transaction, position and security as soon as
+    its element is complete. Yielded elements are dropped from the tree, so memory stays
+    bounded by the largest record, not the statement.
+
+    :param xml_body: binary file of OFX XML (see FidelityOfx.open_xml_body())
+    :return: iterator of {"record": ..., "aggregate": ..., "data": {...}}
+    """
+    stack = []
+    for event, element in ET.iterparse(xml_body, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            continue
+        stack.pop()
+        if not stack:
+            continue
+        parent = stack[-1]
+        record = RECORD_PARENTS.get(parent.tag)
+        if record is None or element.tag in NOT_RECORDS:
+            continue
+        yield {
+            "record": record,
+            "aggregate": element.tag,
+            "data": element_to_dict(element),
+        }
+        parent.remove(element)
+
+
+def dumps_line(record):
+    """
+    :param record:
+    :return: record as one line of JSON (bytes), with orjson if installed
+    """
+    if orjson is not None:
+        return orjson.dumps(record) + b"\n"
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def write_jsonl(xml_body, output):
+    """
+    Write the records of iter_records() as JSON Lines, while parsing.
+
+    :param xml_body: binary file of OFX XML
+    :param output: binary stream
+    :return: number of records written
+    """
+    count = 0
+    for record in iter_records(xml_body):
+        output.write(dumps_line(record))
+        count = count + 1
+    return count
@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# Aggregates whose content holds the fields of a record
+BODY_AGGREGATES = ("INVBUY", "INVSELL", "INVPOS", "SECINFO", "STMTTRN")
+
+
+def parse_ofx_timezone(value):
+    """
+    :param value: content of the brackets of an OFX datetime, e.g. "-5:EST", "+5.30", "0"
+    :return: timezone
+    """
+    offset = value.partition(":")[0].strip()
+    if not offset:
+        return timezone.utc
+    sign = -1 if offset[0] == "-" else 1
+    hours, _, minutes = offset.lstrip("+-").partition(".")
+    return timezone(
+        sign * timedelta(hours=int(hours or 0), minutes=int(minutes or 0))
+    )
+
+
+def parse_ofx_datetime(value):
+    """
+    Parse an OFX datetime, YYYYMMDD[HHMMSS[.XXX]][[gmt offset[:tz name]]], by slicing: the
+    optional parts are recognized by their length. Without brackets the time is GMT.
+
+    :param value: e.g. "20221229120000.000[-5:EST]"
+    :return: aware datetime
+    """
+    value = value.strip()
+    tz = timezone.utc
+    bracket = value.find("[")
+    if bracket >= 0:
+        tz = parse_ofx_timezone(value[bracket + 1 : value.index("]", bracket)])
+        value = value[:bracket]
+    digits, _, fraction = value.partition(".")
+    return datetime(
+        int(digits[0:4]),
+        int(digits[4:6]),
+        int(digits[6:8]),
+        int(digits[8:10] or 0),
+        int(digits[10:12] or 0),
+        int(digits[12:14] or 0),
+        int((fraction + "000000")[:6]) if fraction else 0,
+        tzinfo=tz,
+    )
+
+
+class ValueCache:
+    def __init__(self):
+        """
+        Parsed values of one document, by raw string: the same dates and amounts repeat over
+        the records.
+        """
+        self.datetimes = {}
+        self.decimals = {}
+
+    def datetime(self, value):
+        result = self.datetimes.get(value)
+        if result is None:
+            result = parse_ofx_datetime(value)
+            self.datetimes[value] = result
+        return result
+
+    def decimal(self, value):
+        result = self.decimals.get(value)
+        if result is None:
+            result = Decimal(value.strip())
+            self.decimals[value] = result
+        return result
+
+
+class OfxRecord:
+    def __init__(self, name, aggregate, values):
+        """
+        Typed view of one transaction, position or security of the xmltodict dictionary.
+        Values are converted on first access, then memoized.
+
+        :param name: aggregate name, e.g. BUYMF
+        :param aggregate: its dictionary
+        :param values: ValueCache of the document
+        """
+        self.name = name
+        self.aggregate = aggregate
+        self.values = values
+        self.body = aggregate
+        for body_name in BODY_AGGREGATES:
+            body = aggregate.get(body_name)
+            if isinstance(body, dict):
+                self.body = body
+                break
+        self.invtran = self.body.get("INVTRAN") or {}
+        # (kind, name): converted value
+        self.cache = {}
+
+    def get(self, name):
+        """
+        :param name: field of the record (in INVTRAN, its body aggregate or itself)
+        :return: the raw string, None if missing
+        """
+        for aggregate in (self.invtran, self.body, self.aggregate):
+            value = aggregate.get(name)
+            if value is not None:
+                return value
+        return None
+
+    def _convert(self, kind, name, convert):
+        key = (kind, name)
+        if key in self.cache:
+            return self.cache[key]
+        value = self.get(name)
+        if value is not None:
+            value = convert(value)
+        self.cache[key] = value
+        return value
+
+    def datetime(self, name):
+        return self._convert("datetime", name, self.values.datetime)
+
+    def decimal(self, name):
+        return self._convert("decimal", name, self.values.decimal)
+
+    @property
+    def fitid(self):
+        return self.get("FITID")
+
+    @property
+    def memo(self):
+        return self.get("MEMO")
+
+    @property
+    def uniqueid(self):
+        secid = self.get("SECID")
+        if secid is None:
+            return None
+        return secid.get("UNIQUEID")
+
+    @property
+    def dttrade(self):
+        return self.datetime("DTTRADE")
+
+    @property
+    def dtsettle(self):
+        return self.datetime("DTSETTLE")
+
+    @property
+    def dtposted(self):
+        return self.datetime("DTPOSTED")
+
+    @property
+    def dtpriceasof(self):
+        return self.datetime("DTPRICEASOF")
+
+    @property
+    def units(self):
+        return self.decimal("UNITS")
+
+    @property
+    def unitprice(self):
+        return self.decimal("UNITPRICE")
+
+    @property
+    def total(self):
+        return self.decimal("TOTAL")
+
+    @property
+    def trnamt(self):
+        return self.decimal("TRNAMT")
+
+    @property
+    def mktval(self):
+        return self.decimal("MKTVAL")
@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import functools
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+
+DEFAULT_PORT = 8080
+
+# Number of conversions running at once (size of the process pool)
+DEFAULT_JOBS = os.cpu_count() or 1
+
+# Number of requests waiting for a conversion, more are rejected with 503
+DEFAULT_MAX_PENDING = 64
+
+DEFAULT_MAX_BODY_SIZE = 512 * 1024 * 1024
+
+READ_CHUNK_SIZE = 64 * 1024
+
+MAX_HEADER_LINES = 100
+
+
+def csv_to_ofx(filename, params):
+    """
+    Convert an invtranlist.py CSV file to OFX (runs in a worker process).
+
+    :param filename:
+    :param params: query parameters, same names as the invtranlist.py arguments
+    :return:
+    """
+    import invtranlist
+
+    if "acctid" not in params:
+        raise ValueError("acctid is required")
+    options = invtranlist.ConversionOptions(
+        acctid=params["acctid"],
+        brokerid=params.get("brokerid"),
+        trnuid=params.get("trnuid"),
+        date_string_format=params.get(
+            "date_string_format", invtranlist.DEFAULT_DATE_STRING_FORMAT
+        ),
+        fitid_strategy=params.get(
+            "fitid_strategy", invtranlist.DEFAULT_FITID_STRATEGY
+        ),
+        pretty_print=params.get("pretty_print", "") in ("1", "true"),
+    )
+    return invtranlist.convert(filename, options)
+
+
+def ofx_to_csv(filename, params):
+    """
+    Extract the transactions of an OFX file to CSV (runs in a worker process).
+
+    :param filename:
+    :param params:
+    :return:
+    """
+    import fidelity_transactions
+
+    output = io.StringIO()
+    fidelity_transactions.write_csv_rows(
+        fidelity_transactions.create_rows(filename), output
+    )
+    return output.getvalue().encode()
+
+
+def ofx_to_json(filename, params):
+    """
+    Convert an OFX file to JSON (runs in a worker process).
+
+    :param filename:
+    :param params:
+    :return:
+    """
+    from fidelity_ofx import FidelityOfx
+
+    return FidelityOfx(filename).to_json_str().encode()
+
+
+# path: (conversion, content type of the response)
+ROUTES = {
+    "/csv2ofx": (csv_to_ofx, "application/x-ofx"),
+    "/ofx2csv": (ofx_to_csv, "text/csv"),
+    "/ofx2json": (ofx_to_json, "application/json"),
+}
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a blocking (file) operation in the default thread pool of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class ConversionServer:
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        jobs=DEFAULT_JOBS,
+        max_pending=DEFAULT_MAX_PENDING,
+        max_body_size=DEFAULT_MAX_BODY_SIZE,
+    ):
+        """
+        HTTP conversion service: POST the input to one of the ROUTES, the response is the
+        converted output. Conversions run in a process pool of size jobs. At most max_pending
+        requests wait for a conversion, more are rejected with 503 (Service Unavailable).
+
+        :param host:
+        :param port:
+        :param jobs:
+        :param max_pending:
+        :param max_body_size:
+        """
+        self.host = host
+        self.port = port
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self.max_body_size = max_body_size
+        self.pending = 0
+        self.executor = None
+        self.semaphore = None
+        self.server = None
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+        # Start the workers before listening: workers forked later would inherit the client
+        # sockets open at that time, and keep them open after the response is sent
+        await asyncio.get_running_loop().run_in_executor(self.executor, os.getpid)
+        self.semaphore = asyncio.Semaphore(self.jobs)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        # With port 0, the OS picks the port
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                status, content_type, body = await self.handle_request(reader)
+            except HttpError as e:
+                status, content_type, body = e.status, "text/plain", str(e).encode()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                status, content_type = HTTPStatus.BAD_REQUEST, "text/plain"
+                body = HTTPStatus.BAD_REQUEST.phrase.encode()
+            except Exception:
+                logger.exception("Cannot handle request")
+                status, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, "text/plain"
+                body = HTTPStatus.INTERNAL_SERVER_ERROR.phrase.encode()
+
+            try:
+                writer.write(
+                    (
+                        "HTTP/1.1 %d %s\r\n"
+                        "Content-Type: %s\r\n"
+                        "Content-Length: %d\r\n"
+                        "Connection: close\r\n"
+                        "\r\n" % (status.value, status.phrase, content_type, len(body))
+                    ).encode()
+                )
+                writer.write(body)
+                await writer.drain()
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HttpError(HTTPStatus.BAD_REQUEST)
+        method, target, version = parts
+        headers = await self.read_headers(reader)
+
+        url = urlsplit(target)
+        if url.path not in ROUTES:
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        if method != "POST":
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+        if "content-length" not in headers:
+            raise HttpError(HTTPStatus.LENGTH_REQUIRED)
+        value = headers["content-length"]
+        if not (value.isascii() and value.isdigit()):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        length = int(value)
+        if length > self.max_body_size:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if self.pending >= self.max_pending:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending requests")
+
+        [conversion, content_type] = ROUTES[url.path]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.pending = self.pending + 1
+        try:
+            filename = await self.read_body(reader, length)
+            try:
+                body = await self.run(conversion, filename, params)
+            finally:
+                await run_blocking(os.remove, filename)
+        finally:
+            self.pending = self.pending - 1
+        return [HTTPStatus.OK, content_type, body]
+
+    async def read_headers(self, reader):
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                return headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    async def read_body(self, reader, length):
+        """
+        Stream the request body to a temporary file, chunk by chunk. The body is never read
+        faster than it is written out, which pushes back on the client. The file is written
+        in a thread, not to block the event loop on a slow disk.
+        """
+        file = await run_blocking(tempfile.NamedTemporaryFile, delete=False)
+        try:
+            remaining = length
+            while remaining > 0:
+                chunk = await reader.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                await run_blocking(file.write, chunk)
+                remaining = remaining - len(chunk)
+            await run_blocking(file.close)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+        return file.name
+
+    async def run(self, conversion, filename, params):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    self.executor, conversion, filename, params
+                )
+            except (ValueError, KeyError) as e:
+                raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+            except Exception as e:
+                raise HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Host to listen on")
+    parser.add_argument(
+        "--port", "-p", type=int, default=DEFAULT_PORT, help="Port to listen on"
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of conversions running at once",
+    )
+    parser.add_argument(
+        "--max_pending",
+        type=int,
+        default=DEFAULT_MAX_PENDING,
+        help="Number of requests waiting for a conversion before rejecting more",
+    )
+    parser.add_argument(
+        "--max_body_size",
+        type=int,
+        default=DEFAULT_MAX_BODY_SIZE,
+        help="Largest accepted request body, in bytes",
+    )
+    args = parser.parse_args()
+
+    conversion_server = ConversionServer(
+        host=args.host,
+        port=args.port,
+        jobs=args.jobs,
+        max_pending=args.max_pending,
+        max_body_size=args.max_body_size,
+    )
+    print("# Listening on http://%s:%d" % (args.host, args.port))
+    try:
+        asyncio.run(conversion_server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,218 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+DEFAULT_HELD_IN_ACCT = "CASH"
+
+KIND_STOCK = "STOCK"
+KIND_MF = "MF"
+
+# txn_type: kind of security it implies
+TXN_TYPE_KINDS = {
+    "BUYSTOCK": KIND_STOCK,
+    "SELLSTOCK": KIND_STOCK,
+    "BUYMF": KIND_MF,
+    "SELLMF": KIND_MF,
+}
+
+
+class Position:
+    __slots__ = ("units", "unitprice", "dtpriceasof", "kind", "uniqueidtype")
+
+    def __init__(self, units, unitprice, dtpriceasof, kind, uniqueidtype):
+        """
+        Running position of one security.
+
+        :param units: Decimal, sum of the units of the transactions
+        :param unitprice: Decimal, unit price of the latest transaction with one (None if
+            there is none yet)
+        :param dtpriceasof: trade date of that transaction
+        :param kind: KIND_STOCK or KIND_MF
+        :param uniqueidtype:
+        """
+        self.units = units
+        self.unitprice = unitprice
+        self.dtpriceasof = dtpriceasof
+        self.kind = kind
+        self.uniqueidtype = uniqueidtype
+
+
+class PositionAccumulator:
+    def __init__(self):
+        """
+        Holdings computed from the transactions as they are created, see
+        create_transactions(). Saved with save() and reloaded with load(), a run only needs
+        the transactions since the previous run: transactions up to the latest trade date of
+        the previous runs (the watermark) are skipped, except the ones of that very day that
+        were not seen yet (by fitid).
+        """
+        # symbol: Position
+        self.positions = {}
+        self.watermark = None
+        self.watermark_fitids = set()
+        # Latest trade date of this run, and the fitids of that day
+        self.dtend = None
+        self.dtend_fitids = set()
+
+    def add(self, txn):
+        """
+        Add an InvestmentTransaction.
+
+        :param txn:
+        :return: False if the transaction was already added by a previous run
+        """
+        trade_date = txn.trade_date
+        if self.watermark is not None and (
+            trade_date < self.watermark
+            or (trade_date == self.watermark and txn.fitid in self.watermark_fitids)
+        ):
+            return False
+        if self.dtend is None or trade_date > self.dtend:
+            self.dtend = trade_date
+            self.dtend_fitids = {txn.fitid}
+        elif trade_date == self.dtend:
+            self.dtend_fitids.add(txn.fitid)
+
+        position = self.positions.get(txn.symbol)
+        if position is None:
+            position = Position(Decimal(0), None, None, KIND_STOCK, txn.uniqueidtype)
+            self.positions[txn.symbol] = position
+        kind = TXN_TYPE_KINDS.get(txn.txn_type)
+        if kind is None and txn.symbol_type in (KIND_STOCK, KIND_MF):
+            kind = txn.symbol_type
+        if kind is not None:
+            position.kind = kind
+        if txn.units is not None:
+            position.units = position.units + txn.units
+        if txn.unitprice is not None and (
+            position.dtpriceasof is None or trade_date >= position.dtpriceasof
+        ):
+            position.unitprice = txn.unitprice
+            position.dtpriceasof = trade_date
+        return True
+
+    def held(self):
+        """
+        :return: list of (symbol, Position) with units and a price, by symbol
+        """
+        return [
+            (symbol, position)
+            for symbol, position in sorted(self.positions.items())
+            if position.units and position.unitprice is not None
+        ]
+
+    def create_invposlist(self, securities):
+        """
+        Create the INVPOSLIST (POSSTOCK and POSMF) of the held positions.
+
+        :param securities: SecurityTable
+        :return:
+        """
+        # invtranlist imports this module: imported when called
+        from invtranlist import ofx_models
+
+        models = ofx_models()
+        positions = []
+        for symbol, position in self.held():
+            invpos = models.INVPOS(
+                secid=securities.secid(symbol, position.uniqueidtype),
+                heldinacct=DEFAULT_HELD_IN_ACCT,
+                postype="LONG" if position.units > 0 else "SHORT",
+                units=position.units,
+                unitprice=position.unitprice,
+                mktval=position.units * position.unitprice,
+                dtpriceasof=position.dtpriceasof,
+            )
+            if position.kind == KIND_MF:
+                positions.append(models.POSMF(invpos=invpos))
+            else:
+                positions.append(models.POSSTOCK(invpos=invpos))
+        return models.INVPOSLIST(*positions)
+
+    def create_secinfo(self, secinfo, securities):
+        """
+        The SECINFO of the held positions missing from secinfo (securities without
+        transactions in this run).
+
+        :param secinfo: SECINFO of the transactions
+        :param securities: SecurityTable
+        :return:
+        """
+        known = {(info.uniqueid, info.uniqueidtype) for info in secinfo}
+        missing = []
+        for symbol, position in self.held():
+            if (symbol, position.uniqueidtype) in known:
+                continue
+            if position.kind == KIND_MF:
+                missing.append(securities.mfinfo(symbol, position.uniqueidtype))
+            else:
+                missing.append(securities.stockinfo(symbol, position.uniqueidtype))
+        return missing
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :param filename: JSON file written by save(), a new accumulator if it does not exist
+        :return:
+        """
+        import json
+
+        accumulator = cls()
+        if not os.path.exists(filename):
+            return accumulator
+        with open(filename, "r") as f:
+            state = json.load(f)
+        if state["watermark"] is not None:
+            accumulator.watermark = datetime.fromisoformat(state["watermark"])
+        accumulator.watermark_fitids = set(state["watermark_fitids"])
+        for symbol, values in state["positions"].items():
+            unitprice = values["unitprice"]
+            dtpriceasof = values["dtpriceasof"]
+            accumulator.positions[symbol] = Position(
+                Decimal(values["units"]),
+                None if unitprice is None else Decimal(unitprice),
+                None if dtpriceasof is None else datetime.fromisoformat(dtpriceasof),
+                values["kind"],
+                values["uniqueidtype"],
+            )
+        return accumulator
+
+    def save(self, filename):
+        """
+        Write the positions, and the watermark for the next run, as JSON.
+
+        :param filename:
+        """
+        import json
+
+        watermark = self.watermark
+        watermark_fitids = self.watermark_fitids
+        if self.dtend is not None:
+            if watermark is None or self.dtend > watermark:
+                watermark = self.dtend
+                watermark_fitids = self.dtend_fitids
+            elif self.dtend == watermark:
+                watermark_fitids = watermark_fitids | self.dtend_fitids
+
+        state = {
+            "watermark": None if watermark is None else watermark.isoformat(),
+            "watermark_fitids": sorted(watermark_fitids),
+            "positions": {
+                symbol: {
+                    "units": str(position.units),
+                    "unitprice": None
+                    if position.unitprice is None
+                    else str(position.unitprice),
+                    "dtpriceasof": None
+                    if position.dtpriceasof is None
+                    else position.dtpriceasof.isoformat(),
+                    "kind": position.kind,
+                    "uniqueidtype": position.uniqueidtype,
+                }
+                for symbol, position in sorted(self.positions.items())
+            },
+        }
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_filename, filename)
@@ -1,56 +1,23 @@
 import argparse
 import json
 import pprint
-import re
+import tempfile
 import xml.dom.minidom
-from io import StringIO
 
 import xmltodict
 
-
-def cleanup(filename):
-    with open(filename) as f:
-        ofx_string = f.read()
-    closing_tags = [t.upper() for t in re.findall(r"(?i)</([a-z0-9_\.]+)>", ofx_string)]
-    # for closing_tag in closing_tags:
-    #     print(closing_tag)
-    tags = 0
-    header = StringIO()
-    xml_body = StringIO()
-    tokens = re.split(r"(?i)(</?[a-z0-9_\.]+>)", ofx_string)
-    last_open_tag = None
-    for token in tokens:
-        # print(token)
-        is_closing_tag = token.startswith("</")
-        is_processing_tag = token.startswith("<?")
-        is_cdata = token.startswith("<!")
-        is_tag = token.startswith("<") and not is_cdata
-        is_open_tag = is_tag and not is_closing_tag and not is_processing_tag
-        if is_tag:
-            tags = tags + 1
-            if last_open_tag is not None:
-                if tags > 0:
-                    xml_body.write("</%s>" % last_open_tag)
-                else:
-                    header.write("</%s>" % last_open_tag)
-                # print("</%s>" % last_open_tag, end="")
-                last_open_tag = None
-        if is_open_tag:
-            tag_name = re.findall(r"(?i)<([a-z0-9_\.]+)>", token)[0]
-            if tag_name.upper() not in closing_tags:
-                last_open_tag = tag_name
-
-        if tags > 0:
-            xml_body.write(token)
-        else:
-            header.write(token)
-            # print(token, end="")
-
-    return [header, xml_body]
+# cleanup() is re-exported, it used to live here
+from ofx_cleanup import OFX_VERSION_2, cleanup, cleanup_file, detect_ofx_version
+from profiling import add_arguments as add_profiling_arguments, profile_run
 
 
 def prettyprint(xml_string):
-    return xml.dom.minidom.parseString(xml_string).toprettyxml()
+    """
+    :param xml_string: XML string, or binary file
+    """
+    if isinstance(xml_string, str):
+        return xml.dom.minidom.parseString(xml_string).toprettyxml()
+    return xml.dom.minidom.parse(xml_string).toprettyxml()
 
 
 # Press the green button in the gutter to run the script.
@@ -65,25 +32,42 @@ def tocsv(xml_string):
     return ""
 
 
+def main(args):
+    """
+    Pretty print an OFX file as XML, or convert it to JSON, by output file extension.
+
+    :param args:
+    """
+    if detect_ofx_version(args.input) == OFX_VERSION_2:
+        # Already XML, parsed from the file as is
+        xml_body = open(args.input, "rb")
+    else:
+        # The input is memory-mapped and its XML conversion written to a temporary file,
+        # which is parsed from there
+        xml_body = tempfile.TemporaryFile()
+        cleanup_file(args.input, xml_body)
+        xml_body.seek(0)
+
+    with xml_body:
+        output = None
+        if args.output.endswith(".xml"):
+            output = prettyprint(xml_body)
+        elif args.output.endswith(".json"):
+            output = tojson(xml_body)
+        elif args.output.endswith(".csv"):
+            output = tocsv(xml_body)
+        else:
+            output = prettyprint(xml_body)
+
+    print(output, file=open(args.output, "w"))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", type=str, required=True)
     parser.add_argument("--output", type=str, required=True)
+    add_profiling_arguments(parser)
     args = parser.parse_args()
 
-    [header, xml_body] = cleanup(args.input)
-
-    xml_body.seek(0)
-    xml_string = xml_body.read()
-
-    output = None
-    if args.output.endswith(".xml"):
-        output = prettyprint(xml_string)
-    elif args.output.endswith(".json"):
-        output = tojson(xml_string)
-    elif args.output.endswith(".csv"):
-        output = tocsv(xml_string)
-    else:
-        output = prettyprint(xml_string)
-
-    print(output, file=open(args.output, "w"))
+    with profile_run(args):
+        main(args)
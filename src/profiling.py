@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Allocation sites and functions listed in the report
+DEFAULT_TOP = 25
+
+
+def get_input_size(filename):
+    """
+    :param filename: input file or directory, may be None
+    :return: size in bytes (of all the files of a directory), None if unknown
+    """
+    if filename is None:
+        return None
+    if os.path.isfile(filename):
+        return os.path.getsize(filename)
+    if os.path.isdir(filename):
+        with os.scandir(filename) as entries:
+            return sum(entry.stat().st_size for entry in entries if entry.is_file())
+    return None
+
+
+def write_report(file, args, elapsed, profiler, snapshot, peak):
+    """
+    Write the text report of a run: the input and its size, then the top functions (by
+    cumulative time) and the top allocation sites.
+    """
+    import pstats
+
+    input_filename = getattr(args, "input", None)
+    input_size = get_input_size(input_filename)
+    print("# command=%s" % " ".join(sys.argv), file=file)
+    print("# input=%s" % input_filename, file=file)
+    print(
+        "# input_size=%s"
+        % ("unknown" if input_size is None else "%d bytes" % input_size),
+        file=file,
+    )
+    print("# elapsed=%.3fs" % elapsed, file=file)
+
+    if profiler is not None:
+        print("", file=file)
+        stats = pstats.Stats(profiler, stream=file)
+        stats.sort_stats("cumulative").print_stats(DEFAULT_TOP)
+
+    if snapshot is not None:
+        print("# peak_traced_memory=%d bytes" % peak, file=file)
+        print("# top %d allocation sites" % args.trace_mem, file=file)
+        for statistic in snapshot.statistics("lineno")[: args.trace_mem]:
+            print(statistic, file=file)
+
+
+@contextmanager
+def profile_run(args):
+    """
+    Profile the code run in the context, as requested by the --profile_out and --trace_mem
+    arguments (see add_arguments()), nothing otherwise.
+
+    With --profile_out, the cProfile stats are written to that file (for pstats or
+    snakeviz) and a text report to <profile_out>.txt. Without it, the report of --trace_mem
+    is printed.
+
+    :param args: parsed arguments
+    """
+    profile_out = getattr(args, "profile_out", None)
+    trace_mem = getattr(args, "trace_mem", None)
+    if profile_out is None and trace_mem is None:
+        yield
+        return
+
+    profiler = None
+    if profile_out is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if trace_mem is not None:
+        import tracemalloc
+
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = None
+        peak = 0
+        if trace_mem is not None:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if profile_out is None:
+            write_report(sys.stdout, args, elapsed, profiler, snapshot, peak)
+        else:
+            profiler.dump_stats(profile_out)
+            report_filename = profile_out + ".txt"
+            with open(report_filename, "w") as f:
+                write_report(f, args, elapsed, profiler, snapshot, peak)
+            print("# Wrote profile to file=%s, report=%s" % (profile_out, report_filename))
+
+
+def add_arguments(parser):
+    """Add the --profile_out and --trace_mem arguments to parser."""
+    parser.add_argument(
+        "--profile_out",
+        "--profile-out",
+        default=None,
+        help="Write cProfile stats of the run to this file, and a report to <file>.txt",
+    )
+    parser.add_argument(
+        "--trace_mem",
+        "--trace-mem",
+        type=int,
+        nargs="?",
+        const=DEFAULT_TOP,
+        default=None,
+        help="Trace memory allocations, report the top N allocation sites (default %d)"
+        % DEFAULT_TOP,
+    )
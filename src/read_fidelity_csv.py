@@ -1,13 +1,71 @@
 import argparse
 import configparser
 import csv
+import io
+import logging
 import os
 import sys
+from contextlib import nullcontext
+from itertools import chain
+from operator import itemgetter
+from typing import NamedTuple
+
+from cli_config import config_to_args
+from diagnostics import (
+    RunStats,
+    add_arguments as add_logging_arguments,
+    configure_logging,
+)
+from profiling import add_arguments as add_profiling_arguments, profile_run
+from row_filter import RowFilter, add_arguments as add_filter_arguments
+from up_to_date import (
+    Manifest,
+    add_arguments as add_incremental_arguments,
+    args_settings,
+)
 
-from invtranlist import config_to_args
+logger = logging.getLogger(__name__)
 
 DEFAULT_MAPPER_SYMBOL_TYPE = "UNKNOWN"
 
+# Run Date, 01/03/2023
+FIDELITY_DATE_STRING_FORMAT = "%m/%d/%Y"
+
+# Columns of the header row of a Fidelity history CSV, used to find it
+FIDELITY_HEADER_COLUMNS = {"Run Date", "Action", "Symbol", "Quantity", "Amount ($)"}
+
+# Characters read from the start of a file to find the header row
+HEADER_SCAN_SIZE = 8 * 1024
+
+
+class FidelityRow(NamedTuple):
+    """
+    The columns of a Fidelity history row that are converted, stripped. The other columns
+    (commission, fees, accrued interest, ...) are not kept, unless requested as extra columns.
+    """
+
+    run_date: str
+    action: str
+    symbol: str
+    security_type: str
+    quantity: str
+    price: str
+    amount: str
+    # Values of the extra columns of FidelityCsv, in that order
+    extra: tuple = ()
+
+
+# Header of each FidelityRow field, in order
+FIDELITY_ROW_COLUMNS = [
+    "Run Date",
+    "Action",
+    "Symbol",
+    "Security Type",
+    "Quantity",
+    "Price ($)",
+    "Amount ($)",
+]
+
 DEFAULT_CONFIG_SECTION = "read_fidelity_csv"
 
 DEFAULT_CONFIG_FILENAME = os.environ.get(
@@ -15,6 +73,64 @@ DEFAULT_CONFIG_FILENAME = os.environ.get(
 )
 
 
+def normalize_row(row):
+    """:return: the stripped cells of a CSV row, without a leading byte order mark"""
+    return [cell.strip().lstrip("\ufeff").strip() for cell in row]
+
+
+def is_header(row):
+    """:return: True if row is the header row of a Fidelity history CSV"""
+    return FIDELITY_HEADER_COLUMNS.issubset(normalize_row(row))
+
+
+def is_disclaimer(row):
+    """
+    :return: True if row starts the block after the transactions: a blank row, or the
+        one-cell rows of the disclaimer and download date
+    """
+    return len(row) <= 1
+
+
+def find_header(csvreader, header_lineno=None, metadata=None, max_line_num=None):
+    """
+    Read the rows up to the header row.
+
+    :param csvreader: csv.reader, at the first row
+    :param header_lineno: row number of the header row, if None the first row with the
+        FIDELITY_HEADER_COLUMNS
+    :param metadata: optional list, the non-empty rows before the header are added to it
+    :param max_line_num: if header_lineno is None, give up past this line
+    :return: [headers, header row number], [None, None] if not found
+    """
+    for lineno, row in enumerate(csvreader, start=1):
+        if header_lineno is None:
+            if max_line_num is not None and csvreader.line_num > max_line_num:
+                break
+            found = is_header(row)
+        else:
+            found = lineno == header_lineno
+        if found:
+            return [normalize_row(row), lineno]
+        if metadata is not None:
+            cells = normalize_row(row)
+            if any(cells):
+                metadata.append(cells)
+    return [None, None]
+
+
+def column_indexes(headers, columns):
+    """
+    :param headers: header row
+    :param columns: headers of the columns to read
+    :return: index of each column
+    :raises ValueError: if a column is missing
+    """
+    missing = [column for column in columns if column not in headers]
+    if missing:
+        raise ValueError("Missing columns=%s, headers=%s" % (missing, headers))
+    return [headers.index(column) for column in columns]
+
+
 class FidelityMapper:
     def __init__(self, filename=None):
         self.filename = filename
@@ -22,8 +138,6 @@ class FidelityMapper:
         self.parse(self.filename)
 
     def parse(self, filename):
-        print("# Parsing mapper filename=%s" % (filename))
-
         if filename:
             with open(filename, mode="r") as file:
                 dict_reader = csv.DictReader(file)
@@ -57,18 +171,33 @@ class FidelityMapper:
 
 
 class FidelityCsv:
-    def __init__(self, filename, mapper, header_lineno=6):
+    def __init__(
+        self, filename, mapper, header_lineno=None, row_filter=None, extra_columns=()
+    ):
+        """
+        :param filename: Fidelity history CSV filename, or an open text file
+        :param mapper: FidelityMapper
+        :param header_lineno: Row number of the header row, detected if None (see
+            find_header())
+        :param row_filter: optional RowFilter, with FIDELITY_DATE_STRING_FORMAT
+        :param extra_columns: headers of other columns to keep, in FidelityRow.extra
+        """
         self.filename = filename
         self.mapper = mapper
         self.header_lineno = header_lineno
-        [headers, rows_dict] = self.parse_fidelity_history_for_account()
+        # Optional RowFilter (with FIDELITY_DATE_STRING_FORMAT) on "Run Date" and "Symbol"
+        self.row_filter = row_filter
+        self.extra_columns = list(extra_columns)
+        # The non-empty rows before the header: account name and number, download date
+        self.metadata = []
+        [headers, rows] = self.parse_fidelity_history_for_account()
         self.headers = headers
-        self.rows = rows_dict
+        # FidelityRow
+        self.rows = rows
 
     def get_action(self, row):
-        value = row["Action"]
-        description = row["Security Description"]
-        security = row["Security Type"]
+        value = row.action
+        security = row.security_type
         sec_type = self.mapper.get_symbol_type(security)
 
         if "BOUGHT" in value:
@@ -98,48 +227,148 @@ class FidelityCsv:
         return "NONE"
 
     def parse_fidelity_history_for_account(self):
-        rows_dict = []
-        with open(self.filename, mode="r") as file:
-            csvreader = csv.reader(file)
-            lines = 0
-            # header_lineno = 6
-            headers = []
-            ended = False
+        """
+        Read the file once: the metadata rows, the header row, then the transaction rows up
+        to the disclaimer block (see is_disclaimer()), which is not parsed.
+
+        :return: [headers, FidelityRow list]
+        :raises ValueError: if header_lineno is None and no header row is found in the first
+            HEADER_SCAN_SIZE characters
+        """
+        rows = []
+        if hasattr(self.filename, "read"):
+            # Already an open file
+            file_context = nullcontext(self.filename)
+        else:
+            file_context = open(self.filename, mode="r")
+        with file_context as file:
+            # The header is looked for in the first few KB only (completed to a whole line),
+            # the rest of the file is read by the same csv reader
+            head = file.read(HEADER_SCAN_SIZE)
+            if not head.endswith("\n"):
+                head = head + file.readline()
+            # Split on "\n" only, as the file is (str.splitlines() also splits on "\x0c",
+            # "\x85", "\u2028", ...)
+            head_lines = head.count("\n") + (0 if head.endswith("\n") or not head else 1)
+            csvreader = csv.reader(chain(io.StringIO(head), file))
+            [headers, header_lineno] = find_header(
+                csvreader, self.header_lineno, self.metadata, head_lines
+            )
+            if headers is None:
+                if self.header_lineno is None:
+                    raise ValueError(
+                        "No Fidelity header row (%s) in the first %d characters of file=%s"
+                        % (
+                            ", ".join(sorted(FIDELITY_HEADER_COLUMNS)),
+                            HEADER_SCAN_SIZE,
+                            self.filename,
+                        )
+                    )
+                return [[], rows]
+            if self.header_lineno is None:
+                logger.debug("Found header at row=%d", header_lineno)
+                self.header_lineno = header_lineno
+            elif not is_header(headers):
+                # A wrong --header_lineno would silently mis-parse the rows
+                logger.warning(
+                    "Row %d of file=%s is not a Fidelity header row, headers=%s",
+                    self.header_lineno,
+                    self.filename,
+                    headers,
+                )
+
+            # The columns are looked up once, a row is decoded by index
+            indexes = column_indexes(headers, FIDELITY_ROW_COLUMNS + self.extra_columns)
+            get_columns = itemgetter(*indexes[: len(FIDELITY_ROW_COLUMNS)])
+            extra_indexes = indexes[len(FIDELITY_ROW_COLUMNS) :]
+            # Shorter rows (without the trailing empty cells) are padded to this
+            width = max(indexes) + 1
+            date_index = indexes[0]
+            symbol_index = indexes[2]
+            row_filter = self.row_filter
             for row in csvreader:
-                lines += 1
-                if lines < self.header_lineno:
-                    continue
-                if lines == self.header_lineno:
-                    headers = row
-                else:
-                    if len(row) == 0:
-                        ended = True
-
-                    if not ended:
-                        cols = min(len(headers), len(row))
-                        # print(cols)
-                        row_dict = {}
-                        for i in range(0, cols):
-                            key = headers[i]
-                            value = row[i]
-                            if value is not None:
-                                value = value.strip()
-                            # print(key, value)
-                            row_dict[key] = value
-                        rows_dict.append(row_dict)
-        return [headers, rows_dict]
+                if is_disclaimer(row):
+                    break
+
+                if len(row) < width:
+                    row = row + [""] * (width - len(row))
+                if row_filter is not None:
+                    match row_filter.check(row[date_index], row[symbol_index]):
+                        case "skip":
+                            continue
+                        case "stop":
+                            break
+
+                columns = [value.strip() for value in get_columns(row)]
+                if extra_indexes:
+                    columns.append(tuple(row[index].strip() for index in extra_indexes))
+                rows.append(FidelityRow(*columns))
+        return [headers, rows]
 
 
 def main(args):
+    manifest = None
+    if args.incremental:
+        input_filenames = [args.input]
+        if args.mapper is not None:
+            input_filenames.append(args.mapper)
+        manifest = Manifest(args.output, input_filenames, args_settings(args))
+        if manifest.is_up_to_date():
+            logger.info("Up to date, file=%s", args.output)
+            return
+
+    stats = RunStats()
+    logger.debug("Parsing mapper filename=%s", args.mapper)
     fidelity_mapper = FidelityMapper(args.mapper)
-    print("# mapper.rows.len=%s" % (len(fidelity_mapper.rows)))
+    logger.debug("mapper.rows.len=%s", len(fidelity_mapper.rows))
+
+    logger.info("Reading input from file=%s", args.input)
+    row_filter = RowFilter.from_args(args, FIDELITY_DATE_STRING_FORMAT)
+    with stats.timer("read"):
+        fidelity_csv = FidelityCsv(
+            args.input, fidelity_mapper, args.header_lineno, row_filter
+        )
+    stats.count("rows", len(fidelity_csv.rows))
+
+    with stats.timer("write"):
+        write_output_file(fidelity_csv, args.output)
+    if manifest is not None:
+        manifest.save()
+    logger.info("Done, %s", stats)
+
+
+def convert(source, mapper=None, header_lineno=None, output=None, row_filter=None):
+    """
+    Convert a Fidelity history CSV to the invtranlist.py CSV input, in process: no config file,
+    no printing, no global state.
+
+    :param source: Fidelity history CSV filename, or an open text file
+    :param mapper: FidelityMapper, or mapper filename
+    :param header_lineno: Line number of the header row, detected if None
+    :param output: optional text stream to write the CSV output to
+    :param row_filter: optional RowFilter, with FIDELITY_DATE_STRING_FORMAT
+    :return: the CSV output (bytes), or output if given
+    """
+    if not isinstance(mapper, FidelityMapper):
+        mapper = FidelityMapper(mapper)
+    fidelity_csv = FidelityCsv(source, mapper, header_lineno, row_filter)
+    if output is not None:
+        write_output_rows(fidelity_csv, output)
+        return output
+
+    buffer = io.StringIO()
+    write_output_rows(fidelity_csv, buffer)
+    return buffer.getvalue().encode()
 
-    fidelity_csv = FidelityCsv(args.input, fidelity_mapper, args.header_lineno)
 
-    write_output_file(fidelity_csv, args.output)
+def write_output_file(fidelity_csv, filename):
+    logger.info("Writing to filename=%s", filename)
 
+    with open(filename, "w") as csvfile:
+        write_output_rows(fidelity_csv, csvfile)
 
-def write_output_file(fidelity_csv, filename):
+
+def write_output_rows(fidelity_csv, csvfile):
     # txn_type,trade_date,symbol,units,unitprice,total,memo,symbol_type
     headers = [
         "txn_type",
@@ -152,36 +381,33 @@ def write_output_file(fidelity_csv, filename):
         "symbol_type",
     ]
 
-    print("# Writing to filename=%s" % (filename))
-
-    with open(filename, "w") as csvfile:
-        # creating a csv writer object
-        csvwriter = csv.writer(csvfile)
-
-        # writing the headers
-        csvwriter.writerow(headers)
-
-        for row in fidelity_csv.rows:
-            txn_type = fidelity_csv.get_action(row)
-            # Run Date, 01/03/2023
-            trade_date = row["Run Date"]
-            symbol = row["Symbol"]
-            units = row["Quantity"]
-            unitprice = row["Price ($)"]
-            total = row["Amount ($)"]
-            memo = row["Action"]
-            symbol_type = fidelity_csv.mapper.get_symbol_type(symbol)
-            new_row = [
-                txn_type,
-                trade_date,
-                symbol,
-                units,
-                unitprice,
-                total,
-                memo,
-                symbol_type,
-            ]
-            csvwriter.writerow(new_row)
+    # creating a csv writer object
+    csvwriter = csv.writer(csvfile)
+
+    # writing the headers
+    csvwriter.writerow(headers)
+
+    for row in fidelity_csv.rows:
+        txn_type = fidelity_csv.get_action(row)
+        # Run Date, 01/03/2023
+        trade_date = row.run_date
+        symbol = row.symbol
+        units = row.quantity
+        unitprice = row.price
+        total = row.amount
+        memo = row.action
+        symbol_type = fidelity_csv.mapper.get_symbol_type(symbol)
+        new_row = [
+            txn_type,
+            trade_date,
+            symbol,
+            units,
+            unitprice,
+            total,
+            memo,
+            symbol_type,
+        ]
+        csvwriter.writerow(new_row)
 
 
 if __name__ == "__main__":
@@ -193,21 +419,28 @@ if __name__ == "__main__":
         "--header_lineno",
         "-l",
         type=int,
-        required=True,
-        help="Line number of the header row",
+        default=None,
+        help="Line number of the header row (default: detected)",
     )
+    add_filter_arguments(parser)
+    add_incremental_arguments(parser)
+    add_profiling_arguments(parser)
+    add_logging_arguments(parser)
     config = configparser.ConfigParser()
     config_filename = DEFAULT_CONFIG_FILENAME
     if os.access(config_filename, os.R_OK):
-        print("# Reading config file=%s" % config_filename)
         config.read(config_filename)
         config_args = config_to_args(config, DEFAULT_CONFIG_SECTION)
-        print("# sys.argv=%s" % sys.argv[1:])
         config_args = config_args + sys.argv[1:]
-        print("# config_args=%s" % config_args)
         args = parser.parse_args(args=config_args)
+        configure_logging(args)
+        logger.info("Read config file=%s", config_filename)
+        logger.debug("sys.argv=%s", sys.argv[1:])
+        logger.debug("config_args=%s", config_args)
     else:
-        print("# sys.argv=%s" % sys.argv)
         args = parser.parse_args()
+        configure_logging(args)
+        logger.debug("sys.argv=%s", sys.argv)
 
-    main(args)
+    with profile_run(args):
+        main(args)
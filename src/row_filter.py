@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+ACCEPT = "accept"
+SKIP = "skip"
+# The row and all the rows after it are out of range (the input is sorted)
+STOP = "stop"
+
+ORDER_UNSORTED = "unsorted"
+ORDER_ASCENDING = "ascending"
+ORDER_DESCENDING = "descending"
+ORDERS = [ORDER_UNSORTED, ORDER_ASCENDING, ORDER_DESCENDING]
+
+
+def parse_symbols(value):
+    """--symbols value: comma separated symbols."""
+    return {symbol.strip() for symbol in value.split(",") if symbol.strip()}
+
+
+class RowFilter:
+    def __init__(
+        self,
+        date_string_format,
+        since=None,
+        until=None,
+        symbols=None,
+        order=ORDER_UNSORTED,
+    ):
+        """
+        Select rows by trade date and symbol, looking only at the raw strings of these two
+        columns, so rows that are filtered out are never converted.
+
+        :param date_string_format: format of the trade dates
+        :param since: first trade date (a date) to keep, no limit if None
+        :param until: last trade date (a date) to keep, no limit if None
+        :param symbols: symbols to keep, all if None
+        :param order: order of the rows by trade date (see ORDERS). If sorted, reading stops
+            at the first row past the date range
+        """
+        self.date_string_format = date_string_format
+        self.since = since
+        self.until = until
+        self.symbols = symbols
+        self.order = order
+        # trade date string: date, dates repeat a lot
+        self.dates = {}
+
+    @classmethod
+    def from_args(cls, args, date_string_format):
+        """
+        :return: a RowFilter, None if no filter is given
+        """
+        if args.since is None and args.until is None and args.symbols is None:
+            return None
+        return cls(
+            date_string_format,
+            since=args.since,
+            until=args.until,
+            symbols=args.symbols,
+            order=args.input_order,
+        )
+
+    def parse_date(self, trade_date):
+        value = self.dates.get(trade_date)
+        if value is None:
+            value = datetime.strptime(trade_date.strip(), self.date_string_format).date()
+            self.dates[trade_date] = value
+        return value
+
+    def check(self, trade_date, symbol):
+        """
+        :param trade_date: trade date string, as read
+        :param symbol: symbol string, as read
+        :return: ACCEPT, SKIP or STOP
+        """
+        if self.since is not None or self.until is not None:
+            value = self.parse_date(trade_date)
+            if self.since is not None and value < self.since:
+                return STOP if self.order == ORDER_DESCENDING else SKIP
+            if self.until is not None and value > self.until:
+                return STOP if self.order == ORDER_ASCENDING else SKIP
+        if self.symbols is not None and symbol.strip() not in self.symbols:
+            return SKIP
+        return ACCEPT
+
+
+def add_arguments(parser):
+    """Add the --since, --until, --symbols and --input_order arguments to parser."""
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        default=None,
+        help="Keep transactions from this trade date (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=None,
+        help="Keep transactions up to this trade date (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--symbols",
+        type=parse_symbols,
+        default=None,
+        help="Keep transactions of these symbols (comma separated)",
+    )
+    parser.add_argument(
+        "--input_order",
+        default=ORDER_UNSORTED,
+        choices=ORDERS,
+        help="Order of the input rows by trade date, if sorted reading stops past the range",
+    )
@@ -0,0 +1,205 @@
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from invtranlist import (
+    DEFAULT_BROKER_ID,
+    FITID_STRATEGY_SOURCE,
+    convert_to_datetime,
+    create_data_csv_rows_from_file,
+    create_fitid,
+    create_response,
+    create_transactions,
+)
+
+logger = logging.getLogger(__name__)
+
+SPLIT_BY_MONTH = "month"
+SPLIT_BY_ACCOUNT = "account"
+SPLIT_BY_NONE = "none"
+SPLIT_BYS = [SPLIT_BY_MONTH, SPLIT_BY_ACCOUNT, SPLIT_BY_NONE]
+
+
+def assign_fitids(rows, fitid_strategy):
+    """
+    Create the fitid of each row over the whole input, so a transaction gets the same fitid
+    whatever partition it lands in (and as without splitting).
+
+    :param rows: list of TransactionRow
+    :param fitid_strategy:
+    :return: list of TransactionRow with their fitid set
+    """
+    fitids = set()
+    return [
+        row._replace(fitid=create_fitid(row, row_number, fitids, fitid_strategy))
+        for row_number, row in enumerate(rows, start=1)
+    ]
+
+
+def partition_rows(
+    rows,
+    split_by,
+    max_transactions,
+    date_string_format,
+    acctid,
+    brokerid=DEFAULT_BROKER_ID,
+):
+    """
+    Group rows by calendar month of the trade date, or by account, then cut each group in
+    parts of at most max_transactions rows. An account is a (brokerid, acctid): the same
+    acctid at two brokers is two accounts.
+
+    :param rows: list of TransactionRow
+    :param split_by: see SPLIT_BYS
+    :param max_transactions: no limit if None
+    :param date_string_format:
+    :param acctid: account of the rows without one
+    :param brokerid: broker of the rows without one
+    :return: list of [name, (brokerid, acctid), rows]
+    """
+    groups = {}
+    months = {}
+    for row in rows:
+        account = (row.brokerid or brokerid, row.acctid or acctid)
+        match split_by:
+            case "month":
+                name = months.get(row.trade_date)
+                if name is None:
+                    trade_date = convert_to_datetime(row.trade_date, date_string_format)
+                    name = "%04d-%02d" % (trade_date.year, trade_date.month)
+                    months[row.trade_date] = name
+                # A month of one account
+                key = (name, account)
+            case "account":
+                key = (account_name(account, brokerid), account)
+            case _:
+                key = ("", account)
+        groups.setdefault(key, []).append(row)
+
+    partitions = []
+    for (name, account), group in sorted(groups.items()):
+        if split_by == SPLIT_BY_MONTH and account != (brokerid, acctid):
+            name = name + "-" + account_name(account, brokerid)
+        if max_transactions is None or len(group) <= max_transactions:
+            partitions.append([name, account, group])
+            continue
+        iterator = iter(group)
+        part = 1
+        while True:
+            part_rows = list(islice(iterator, max_transactions))
+            if not part_rows:
+                break
+            part_name = "%s-%d" % (name, part) if name else str(part)
+            partitions.append([part_name, account, part_rows])
+            part = part + 1
+    return partitions
+
+
+def account_name(account, brokerid):
+    """
+    :param account: (brokerid, acctid)
+    :param brokerid: broker of the run, not repeated in the name
+    :return: acctid, or <brokerid>-<acctid> at another broker
+    """
+    [account_brokerid, acctid] = account
+    if account_brokerid == brokerid:
+        return acctid
+    return account_brokerid + "-" + acctid
+
+
+def convert_partition(rows, options):
+    """
+    Create the OFX output of one partition (runs in a worker process). Its DTSTART/DTEND and
+    SECLIST only cover its own transactions.
+
+    :param rows: list of TransactionRow, with their fitid set
+    :param options: ConversionOptions of the partition
+    :return:
+    """
+    options = options.for_rows(rows)
+    [transactions, secinfo, dtstart, dtend] = create_transactions(
+        rows, options.date_string_format, FITID_STRATEGY_SOURCE
+    )
+    return create_response(transactions, secinfo, dtstart, dtend, options)
+
+
+def create_partition_filename(output_filename, input_filename, name):
+    """
+    <output_dir>/<input stem>-<name>.ofx if output_filename is a directory, otherwise
+    <output_filename without extension>-<name>.ofx
+    """
+    if os.path.isdir(output_filename):
+        prefix = os.path.join(
+            os.path.abspath(output_filename), Path(os.path.abspath(input_filename)).stem
+        )
+    else:
+        prefix = os.path.splitext(output_filename)[0]
+    if not name:
+        return prefix + ".ofx"
+    return prefix + "-" + name + ".ofx"
+
+
+def write_partitions(
+    input_filename,
+    output_filename,
+    options,
+    split_by=SPLIT_BY_MONTH,
+    max_transactions=None,
+    jobs=None,
+):
+    """
+    Convert input_filename to one OFX file per partition (see partition_rows()). The
+    partitions are converted concurrently, in a process pool of jobs workers.
+
+    :param input_filename:
+    :param output_filename: directory or filename template (see create_partition_filename())
+    :param options: ConversionOptions
+    :param split_by: see SPLIT_BYS
+    :param max_transactions: most transactions per file, no limit if None
+    :param jobs: number of worker processes, os.cpu_count() if None
+    :return: list of output filenames
+    """
+    rows = assign_fitids(
+        create_data_csv_rows_from_file(input_filename, options.row_filter),
+        options.fitid_strategy,
+    )
+    partitions = partition_rows(
+        rows,
+        split_by,
+        max_transactions,
+        options.date_string_format,
+        options.acctid,
+        options.brokerid or DEFAULT_BROKER_ID,
+    )
+
+    partition_options = []
+    filenames = []
+    for name, (brokerid, acctid), _ in partitions:
+        partition_option = copy.copy(options)
+        partition_option.brokerid = brokerid
+        partition_option.acctid = acctid
+        partition_options.append(partition_option)
+        filenames.append(create_partition_filename(output_filename, input_filename, name))
+
+    partition_rows_list = [part_rows for _, _, part_rows in partitions]
+    if len(partitions) <= 1 or jobs == 1:
+        responses = map(convert_partition, partition_rows_list, partition_options)
+        write_responses(filenames, responses)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            responses = executor.map(
+                convert_partition, partition_rows_list, partition_options
+            )
+            write_responses(filenames, responses)
+    logger.info("Wrote %d files", len(filenames))
+    return filenames
+
+
+def write_responses(filenames, responses):
+    for filename, response in zip(filenames, responses):
+        with open(filename, "w") as f:
+            logger.debug("Writing output to file=%s", filename)
+            print(response, file=f)
@@ -0,0 +1,211 @@
+import os
+
+MANIFEST_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Arguments that do not change the output: they are not part of the settings of a manifest
+IGNORED_ARGUMENTS = {
+    "input",
+    "output",
+    "incremental",
+    "verbose",
+    "quiet",
+    "profile_out",
+    "trace_mem",
+    "jobs",
+    "watch",
+    "poll_interval",
+    "settle_time",
+}
+
+
+def file_hash(filename):
+    """SHA-256 of the content of a file, read in chunks."""
+    import hashlib
+
+    dhash = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            dhash.update(chunk)
+    return dhash.hexdigest()
+
+
+def file_signature(filename):
+    """(size, mtime) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def manifest_filename(output_filename):
+    """
+    :param output_filename: e.g. out/abc.ofx
+    :return: the sidecar manifest next to it, e.g. out/.abc.ofx.manifest.json
+    """
+    directory, name = os.path.split(os.path.abspath(output_filename))
+    return os.path.join(directory, "." + name + ".manifest.json")
+
+
+def args_settings(args):
+    """
+    :param args: parsed arguments
+    :return: the arguments that shape the output, as a JSON-able dict
+    """
+    return {
+        name: value if value is None else str(value)
+        for name, value in sorted(vars(args).items())
+        if name not in IGNORED_ARGUMENTS
+    }
+
+
+def scan_file(filename, recorded=None):
+    """
+    :param filename:
+    :param recorded: optional entry of the file recorded before: its content is not read
+        again if its size and mtime did not change
+    :return: entry {"size", "mtime_ns", "sha256"} of the file, None if it does not exist
+    """
+    signature = file_signature(filename)
+    if signature is None:
+        return None
+    [size, mtime_ns] = signature
+    if (
+        recorded is not None
+        and recorded.get("size") == size
+        and recorded.get("mtime_ns") == mtime_ns
+    ):
+        sha256 = recorded.get("sha256")
+    else:
+        sha256 = file_hash(filename)
+    return {"size": size, "mtime_ns": mtime_ns, "sha256": sha256}
+
+
+def same_content(entry, recorded):
+    if entry is None or recorded is None:
+        return entry is None and recorded is None
+    return entry["sha256"] == recorded.get("sha256")
+
+
+class Manifest:
+    def __init__(self, output_filename, input_filenames, settings):
+        """
+        Make-like up-to-date check of an output: the size, mtime and content hash of its
+        inputs, and its settings, are recorded in a sidecar JSON manifest (see
+        manifest_filename()). The output is up to date if they did not change and the output
+        was not touched since.
+
+        An input with the recorded size and mtime is assumed unchanged, without reading it.
+        Otherwise its content hash decides, so a touched but identical input does not
+        trigger a conversion.
+
+        Files the conversion reads and writes back (positions files) are state_filenames:
+        they are recorded as they are after the conversion, set before save().
+
+        :param output_filename:
+        :param input_filenames: files the output is made from
+        :param settings: JSON-able dict of the options that shape the output, see
+            args_settings()
+        """
+        self.filename = manifest_filename(output_filename)
+        self.output_filename = output_filename
+        self.input_filenames = [os.path.abspath(filename) for filename in input_filenames]
+        self.settings = settings
+        self.state_filenames = []
+        # input filename: entry (see scan_file()), as of the check
+        self.inputs = None
+
+    def load(self):
+        """:return: the recorded manifest, None if missing or unreadable"""
+        import json
+
+        try:
+            with open(self.filename, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def scan_inputs(self, recorded_inputs):
+        """
+        Take the current state of the inputs, hashing only those whose size or mtime is not
+        the recorded one.
+
+        :param recorded_inputs: input filename: entry, of the recorded manifest
+        """
+        self.inputs = {
+            filename: scan_file(filename, recorded_inputs.get(filename))
+            for filename in self.input_filenames
+        }
+
+    def is_up_to_date(self):
+        """
+        :return: True if the output does not need to be written again. A missing input is
+            never up to date: the conversion reports it
+        """
+        manifest = self.load()
+        recorded_inputs = {} if manifest is None else manifest.get("inputs") or {}
+        self.scan_inputs(recorded_inputs)
+        if manifest is None or manifest.get("settings") != self.settings:
+            return False
+        if None in self.inputs.values():
+            return False
+        output = manifest.get("output")
+        if output is None or tuple(output) != file_signature(self.output_filename):
+            return False
+        if set(recorded_inputs) != set(self.inputs):
+            return False
+        for filename, entry in self.inputs.items():
+            if not same_content(entry, recorded_inputs[filename]):
+                return False
+        for filename, recorded in (manifest.get("state") or {}).items():
+            if not same_content(scan_file(filename, recorded), recorded):
+                return False
+        if any(recorded_inputs[filename] != entry for filename, entry in self.inputs.items()):
+            # Touched, same content: record the new mtimes, next check will not hash them
+            self.save(manifest.get("state"))
+        return True
+
+    def save(self, state=None):
+        """
+        Record the inputs (as of is_up_to_date()), the state files and the output, once
+        written.
+
+        :param state: entries of the state files, scanned now if None
+        """
+        import json
+
+        if self.inputs is None:
+            self.scan_inputs({})
+        if state is None:
+            state = {
+                os.path.abspath(filename): scan_file(filename)
+                for filename in self.state_filenames
+            }
+        output = file_signature(self.output_filename)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "settings": self.settings,
+            "inputs": self.inputs,
+            "state": state,
+            "output": None if output is None else list(output),
+        }
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_filename, self.filename)
+
+
+def add_arguments(parser):
+    """Add the --incremental argument to parser."""
+    parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="Skip the conversion if the inputs and options did not change since the output "
+        "was written (recorded in a .<output>.manifest.json file next to it)",
+    )
@@ -0,0 +1,377 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from up_to_date import file_hash, file_signature
+
+logger = logging.getLogger(__name__)
+
+# Seconds a file must stay unchanged (same size and mtime) before it is converted, so
+# partially written files (browser downloads, copies in progress) are not picked up
+DEFAULT_SETTLE_TIME = 2.0
+
+# Seconds between directory scans when inotify is not available
+DEFAULT_POLL_INTERVAL = 5.0
+
+DEFAULT_STATE_FILENAME = ".watch_folder_state.json"
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_READ_SIZE = 64 * 1024
+
+
+def csv_to_ofx(input_filename, output_dir, args):
+    """
+    Convert an invtranlist.py CSV file to <output_dir>/<stem>.ofx.
+
+    :param input_filename:
+    :param output_dir:
+    :param args: invtranlist.py arguments
+    :return: output filename
+    """
+    import invtranlist
+
+    output_filename = os.path.join(output_dir, Path(input_filename).stem + ".ofx")
+    response = invtranlist.convert(
+        input_filename, invtranlist.ConversionOptions.from_args(args)
+    )
+    write_atomically(output_filename, response)
+    return output_filename
+
+
+def qfx_to_csv(input_filename, output_dir, args):
+    """
+    Extract the transactions of a QFX (OFX) file to <output_dir>/<stem>.csv.
+
+    :param input_filename:
+    :param output_dir:
+    :param args:
+    :return: output filename
+    """
+    import io
+
+    import fidelity_transactions
+
+    output_filename = os.path.join(output_dir, Path(input_filename).stem + ".csv")
+    output = io.StringIO()
+    fidelity_transactions.write_csv_rows(
+        fidelity_transactions.create_rows(input_filename), output
+    )
+    write_atomically(output_filename, output.getvalue().encode())
+    return output_filename
+
+
+# file extension: conversion
+CONVERSIONS = {
+    ".csv": csv_to_ofx,
+    ".qfx": qfx_to_csv,
+}
+
+
+def write_atomically(filename, data):
+    """
+    Write data (bytes) to a temporary file next to filename, then rename it, so readers never
+    see a partial file.
+    """
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filename, filename)
+
+
+def is_watched(name):
+    return os.path.splitext(name)[1].lower() in CONVERSIONS
+
+
+class ProcessedFiles:
+    def __init__(self, filename):
+        """
+        The files already converted, by path, with the content hash they were converted with
+        and their output, persisted as JSON in filename. A file is converted again if its
+        content is not the one converted last (changed, or reverted to an earlier one), or if
+        its output is gone.
+
+        :param filename:
+        """
+        self.filename = filename
+        # input filename: {"sha256", "output"}
+        self.files = {}
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                self.files = json.load(f)
+
+    def is_processed(self, input_filename, content_hash):
+        entry = self.files.get(os.path.abspath(input_filename))
+        if entry is None or entry["sha256"] != content_hash:
+            return False
+        output_filename = entry["output"]
+        return output_filename is None or os.path.exists(output_filename)
+
+    def add(self, input_filename, content_hash, output_filename):
+        """
+        :param input_filename:
+        :param content_hash:
+        :param output_filename: None if the file is not to be converted (an output)
+        """
+        self.files[os.path.abspath(input_filename)] = {
+            "sha256": content_hash,
+            "output": output_filename,
+        }
+        write_atomically(
+            self.filename, json.dumps(self.files, indent=2, sort_keys=True).encode()
+        )
+
+
+class Debouncer:
+    def __init__(self, settle_time=DEFAULT_SETTLE_TIME):
+        """
+        Track changed files until they have been unchanged for settle_time seconds.
+
+        :param settle_time:
+        """
+        self.settle_time = settle_time
+        # filename: [signature, time the signature was last seen changing]
+        self.pending = {}
+
+    def touch(self, filename, now):
+        signature = file_signature(filename)
+        entry = self.pending.get(filename)
+        if entry is None or entry[0] != signature:
+            self.pending[filename] = [signature, now]
+
+    def ready(self, now):
+        """
+        :return: files unchanged for settle_time seconds, they are no longer tracked
+        """
+        ready = []
+        for filename, entry in list(self.pending.items()):
+            signature = file_signature(filename)
+            if signature is None:
+                # Deleted (or renamed) before it settled
+                del self.pending[filename]
+            elif signature != entry[0]:
+                self.pending[filename] = [signature, now]
+            elif now - entry[1] >= self.settle_time:
+                del self.pending[filename]
+                ready.append(filename)
+        return ready
+
+    def timeout(self, now):
+        """
+        :return: seconds until the next pending file may be ready, None if nothing is pending
+        """
+        if not self.pending:
+            return None
+        earliest = min(entry[1] for entry in self.pending.values())
+        return max(0.0, earliest + self.settle_time - now)
+
+
+class InotifyWatcher:
+    def __init__(self, directory):
+        """
+        Report files created, written or moved into directory, using Linux inotify.
+
+        :param directory:
+        :raises OSError: if inotify is not available
+        """
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or libc_name is None:
+            raise OSError("inotify is not available")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.directory = directory
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds (forever if None) for changes.
+
+        :return: changed filenames
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, INOTIFY_READ_SIZE)
+        filenames = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset = offset + INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset = offset + length
+            if name and is_watched(name):
+                filenames.append(os.path.join(self.directory, name))
+        return filenames
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, directory, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Report changed files by comparing the (size, mtime) of the directory entries every
+        poll_interval seconds. Files are only stat'ed, never read.
+
+        :param directory:
+        :param poll_interval:
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.signatures = self.scan()
+
+    def scan(self):
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if is_watched(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def wait(self, timeout):
+        if timeout is None or timeout > self.poll_interval:
+            timeout = self.poll_interval
+        time.sleep(timeout)
+        signatures = self.scan()
+        changed = [
+            filename
+            for filename, signature in signatures.items()
+            if self.signatures.get(filename) != signature
+        ]
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(directory, poll_interval=DEFAULT_POLL_INTERVAL):
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError):
+        logger.info("inotify is not available, polling every %ss", poll_interval)
+        return PollingWatcher(directory, poll_interval)
+
+
+class FolderConverter:
+    def __init__(
+        self,
+        input_dir,
+        output_dir,
+        args,
+        state_filename=None,
+        settle_time=DEFAULT_SETTLE_TIME,
+    ):
+        """
+        Convert the CSV and QFX files of input_dir to output_dir, each file once per
+        content.
+
+        :param input_dir:
+        :param output_dir:
+        :param args: invtranlist.py arguments, passed to the conversions
+        :param state_filename: where the processed files are recorded,
+            <output_dir>/.watch_folder_state.json if None
+        :param settle_time:
+        """
+        if state_filename is None:
+            state_filename = os.path.join(output_dir, DEFAULT_STATE_FILENAME)
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.args = args
+        self.processed = ProcessedFiles(state_filename)
+        self.debouncer = Debouncer(settle_time)
+
+    def add_existing(self, now):
+        """Queue the files already in input_dir (converted if not processed before)."""
+        for name in sorted(os.listdir(self.input_dir)):
+            if is_watched(name):
+                self.debouncer.touch(os.path.join(self.input_dir, name), now)
+
+    def convert(self, filename):
+        """
+        Convert filename, unless it was already converted with this content.
+
+        :param filename:
+        :return: output filename, None if skipped
+        """
+        content_hash = file_hash(filename)
+        if self.processed.is_processed(filename, content_hash):
+            return None
+        conversion = CONVERSIONS[os.path.splitext(filename)[1].lower()]
+        logger.info("Converting file=%s", filename)
+        output_filename = conversion(filename, self.output_dir, self.args)
+        logger.info("Writing output to file=%s", output_filename)
+        self.processed.add(filename, content_hash, output_filename)
+        # The output may land in a watched directory, never convert it back
+        self.processed.add(output_filename, file_hash(output_filename), None)
+        return output_filename
+
+    def convert_ready(self, now):
+        converted = []
+        for filename in self.debouncer.ready(now):
+            try:
+                output_filename = self.convert(filename)
+            except Exception as e:
+                # Keep watching, the file is retried when it changes
+                logger.error("Cannot convert file=%s, %s", filename, e)
+                continue
+            if output_filename is not None:
+                converted.append(output_filename)
+        return converted
+
+    def run(self, watcher, stop=None):
+        """
+        Convert files as they change until stop() returns true (forever if stop is None).
+
+        :param watcher: InotifyWatcher or PollingWatcher of input_dir
+        :param stop:
+        """
+        self.add_existing(time.monotonic())
+        while stop is None or not stop():
+            timeout = self.debouncer.timeout(time.monotonic())
+            for filename in watcher.wait(timeout):
+                self.debouncer.touch(filename, time.monotonic())
+            self.convert_ready(time.monotonic())
+
+
+def watch(args):
+    """
+    Watch the input directory and convert new or changed files to the output directory,
+    until interrupted.
+
+    :param args: invtranlist.py arguments (args.input and args.output are directories)
+    """
+    if not os.path.isdir(args.input) or not os.path.isdir(args.output):
+        logger.error("--watch needs directories for input and output.")
+        return
+    logger.info("Watching directory=%s", args.input)
+    folder_converter = FolderConverter(
+        args.input, args.output, args, settle_time=args.settle_time
+    )
+    watcher = create_watcher(args.input, args.poll_interval)
+    try:
+        folder_converter.run(watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
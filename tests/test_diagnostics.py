@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from diagnostics import RunStats
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SRC_DIR = os.path.join(THIS_DIR, os.pardir, "src")
+
+
+def run_script(script, input_filename, output_filename, *args):
+    """
+    :return: the lines the script (in src) writes to stdout
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    env.pop("INVTRANLIST_CONFIG", None)
+    result = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, script)]
+        + ["-i", input_filename, "-o", output_filename, "-a", "1"]
+        + list(args),
+        env=env,
+        cwd=os.path.dirname(output_filename),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.splitlines()
+
+
+def run_invtranlist(input_filename, output_filename, *args):
+    return run_script("invtranlist.py", input_filename, output_filename, *args)
+
+
+class TestRunStats(TestCase):
+    def test_summary(self):
+        stats = RunStats()
+        stats.count("rows", 3)
+        stats.count("rows")
+        with stats.timer("read"):
+            pass
+        with stats.timer("read"):
+            pass
+        values = str(stats).split(" ")
+        self.assertEqual("rows=4", values[0])
+        self.assertTrue(values[1].startswith("read="))
+        self.assertTrue(values[2].startswith("total="))
+
+    def test_output_lines(self):
+        input_filename = os.path.join(THIS_DIR, os.pardir, "data", "example1.csv")
+        with open(input_filename) as f:
+            lines = f.read().splitlines()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_filename = os.path.join(tmp_dir, "out.ofx")
+            small = run_invtranlist(input_filename, output_filename)
+            large_filename = os.path.join(tmp_dir, "large.csv")
+            with open(large_filename, "w") as f:
+                f.write("\n".join([lines[0]] + lines[1:] * 100))
+            large = run_invtranlist(large_filename, output_filename)
+            quiet = run_invtranlist(large_filename, output_filename, "--quiet")
+        # The same few lines, whatever the input size
+        self.assertEqual(len(small), len(large))
+        self.assertLessEqual(len(large), 4)
+        self.assertIn("rows=400 ", large[-1])
+        self.assertEqual([], quiet)
+
+    def test_ofx_output_lines(self):
+        # ofxtools logs every element it converts, at INFO level
+        input_filename = os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_filename = os.path.join(tmp_dir, "out.ofx")
+            lines = run_script("merge_statements.py", input_filename, output_filename)
+        self.assertLessEqual(len(lines), 4)
+        self.assertFalse(any("Converting" in line for line in lines))
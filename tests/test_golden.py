@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+import invtranlist
+from invtranlist import ConversionOptions, convert
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GOLDEN_DIR = os.path.join(THIS_DIR, os.pardir, "data", "golden")
+
+GOLDEN_INPUT = os.path.join(GOLDEN_DIR, "all_types.csv")
+
+# Fixed values of what is otherwise random or the current time
+GOLDEN_TIME = datetime(2023, 1, 31, 21, 26, 5, tzinfo=timezone.utc)
+GOLDEN_TRNUID = "1002"
+
+# golden output file: ConversionOptions arguments
+GOLDEN_OUTPUTS = {
+    "all_types.ofx": {},
+    "all_types_sequence.ofx": {"fitid_strategy": "sequence"},
+    "all_types_positions.ofx": {"positions": True},
+    "all_types_pretty.ofx": {"pretty_print": True},
+}
+
+# The throughput test only runs with INVTRANLIST_THROUGHPUT_TEST set: timings of a shared
+# or busy machine (CI) are too noisy to fail a build on. It converts THROUGHPUT_ROWS rows
+# THROUGHPUT_RUNS times and keeps the fastest run. It accepts MIN_THROUGHPUT_RATIO of the
+# rows per second of the baseline committed with the golden outputs (measured the same way,
+# on the machine that wrote them), or INVTRANLIST_MIN_ROWS_PER_SECOND if set.
+THROUGHPUT_ROWS = 2000
+THROUGHPUT_RUNS = 5
+THROUGHPUT_BASELINE = os.path.join(GOLDEN_DIR, "throughput.json")
+MIN_THROUGHPUT_RATIO = 0.5
+
+
+def create_golden_output(name):
+    """
+    Convert the golden input with the options of name. Trade dates are in the local
+    timezone: the conversion runs in UTC so the output is the same on every machine.
+
+    :param name: see GOLDEN_OUTPUTS
+    :return: the OFX output (bytes)
+    """
+    options = ConversionOptions(
+        "999988",
+        trnuid=GOLDEN_TRNUID,
+        dtserver=GOLDEN_TIME,
+        dtasof=GOLDEN_TIME,
+        **GOLDEN_OUTPUTS[name],
+    )
+    with patch.object(invtranlist, "LOCAL_TZINFO", timezone.utc):
+        return convert(GOLDEN_INPUT, options)
+
+
+def measure_rows_per_second():
+    """
+    :return: [rows per second, seconds] of the fastest of THROUGHPUT_RUNS conversions of
+        THROUGHPUT_ROWS rows
+    """
+    with open(GOLDEN_INPUT) as f:
+        lines = f.read().splitlines()
+    [header, rows] = [lines[0], lines[1:]]
+    content = "\n".join([header] + rows * (THROUGHPUT_ROWS // len(rows))).encode()
+    options = ConversionOptions("999988", trnuid=GOLDEN_TRNUID)
+    # Once to import and warm up
+    convert(content, options)
+    elapsed = None
+    for _ in range(THROUGHPUT_RUNS):
+        start = time.perf_counter()
+        convert(content, options)
+        run_elapsed = time.perf_counter() - start
+        if elapsed is None or run_elapsed < elapsed:
+            elapsed = run_elapsed
+    return [THROUGHPUT_ROWS / elapsed, elapsed]
+
+
+def min_rows_per_second():
+    if "INVTRANLIST_MIN_ROWS_PER_SECOND" in os.environ:
+        return float(os.environ["INVTRANLIST_MIN_ROWS_PER_SECOND"])
+    with open(THROUGHPUT_BASELINE) as f:
+        baseline = json.load(f)
+    return baseline["rows_per_second"] * MIN_THROUGHPUT_RATIO
+
+
+def write_golden_outputs():
+    """
+    Rewrite the golden outputs, after an intended change of the output, and the throughput
+    baseline.
+    """
+    for name in GOLDEN_OUTPUTS:
+        with open(os.path.join(GOLDEN_DIR, name), "wb") as f:
+            f.write(create_golden_output(name))
+    [rows_per_second, _] = measure_rows_per_second()
+    with open(THROUGHPUT_BASELINE, "w") as f:
+        json.dump({"rows_per_second": round(rows_per_second)}, f)
+        f.write("\n")
+
+
+class TestGolden(TestCase):
+    def test_golden_outputs(self):
+        for name in GOLDEN_OUTPUTS:
+            with self.subTest(name=name):
+                with open(os.path.join(GOLDEN_DIR, name), "rb") as f:
+                    expected = f.read()
+                self.assertEqual(expected, create_golden_output(name))
+
+    def test_all_types(self):
+        with open(os.path.join(GOLDEN_DIR, "all_types.ofx"), "rb") as f:
+            golden = f.read()
+        for txn_type in ["BUYSTOCK", "SELLSTOCK", "BUYMF", "SELLMF", "REINVEST", "INCOME"]:
+            self.assertIn(b"<%s>" % txn_type.encode(), golden)
+
+
+@skipUnless(
+    os.environ.get("INVTRANLIST_THROUGHPUT_TEST"), "INVTRANLIST_THROUGHPUT_TEST not set"
+)
+class TestThroughput(TestCase):
+    def test_rows_per_second(self):
+        [rows_per_second, elapsed] = measure_rows_per_second()
+        self.assertGreater(
+            rows_per_second,
+            min_rows_per_second(),
+            "%.0f rows/s, %d rows in %.3fs" % (rows_per_second, THROUGHPUT_ROWS, elapsed),
+        )
+
+
+if __name__ == "__main__":
+    # PYTHONPATH=src python tests/test_golden.py
+    write_golden_outputs()
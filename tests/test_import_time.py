@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SRC_DIR = os.path.join(THIS_DIR, os.pardir, "src")
+
+# Import time budget of each CLI module, in microseconds. Importing ofxtools alone takes
+# more than that.
+IMPORT_TIME_BUDGET = 100000
+
+# Modules the CLI modules must not import until a conversion runs
+HEAVY_MODULES = ["ofxtools", "xml.dom.minidom", "xml.etree.ElementTree"]
+
+
+def import_times(module_name):
+    """
+    Import module_name in a new interpreter with -X importtime.
+
+    :param module_name:
+    :return: dict of imported module name: cumulative import time in microseconds
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module_name],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        [_, cumulative, name] = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(TestCase):
+    def check_import(self, module_name):
+        times = import_times(module_name)
+        for heavy_module in HEAVY_MODULES:
+            self.assertNotIn(heavy_module, times)
+        self.assertLess(times[module_name], IMPORT_TIME_BUDGET)
+
+    def test_invtranlist(self):
+        self.check_import("invtranlist")
+
+    def test_read_fidelity_csv(self):
+        self.check_import("read_fidelity_csv")
@@ -0,0 +1,285 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import TestCase
+from unittest.mock import patch
+
+from ofxtools import OFXTree
+
+import invtranlist
+from invtranlist import (
+    ConversionOptions,
+    InvestmentTransaction,
+    SecurityTable,
+    TransactionRow,
+    convert,
+    create_data_csv_rows_from_file,
+    create_transactions,
+    dict_hash,
+    iter_data_csv_rows,
+    ofx_models,
+    partition_accounts,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestTransactionRow(TestCase):
+    my_data_path = None
+    rows = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.my_data_path = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        cls.rows = create_data_csv_rows_from_file(cls.my_data_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.my_data_path = None
+        cls.rows = None
+
+    def test_rows(self):
+        self.assertEqual(4, len(self.rows))
+        row = self.rows[0]
+        self.assertIsInstance(row, TransactionRow)
+        self.assertEqual("BUYSTOCK", row.txn_type)
+        self.assertEqual("TSLA", row.symbol)
+        self.assertEqual("Buy Tesla stock", row.memo)
+        self.assertEqual("STOCK", row.symbol_type)
+
+    def test_row_hash(self):
+        cols = {
+            "txn_type": "BUYSTOCK",
+            "trade_date": "2022/08/25",
+            "symbol": "TSLA",
+            "units": "100.00",
+            "unitprice": "50.00",
+            "total": "-5000.00",
+            "memo": "Buy Tesla stock",
+        }
+        self.assertEqual(dict_hash(cols), self.rows[0].row_hash)
+
+    def test_interned(self):
+        rows = create_data_csv_rows_from_file(self.my_data_path)
+        self.assertIs(self.rows[0].symbol, rows[0].symbol)
+        self.assertIs(self.rows[0].txn_type, rows[0].txn_type)
+
+    def test_slots(self):
+        txn = InvestmentTransaction(None, "TSLA", 1, 1, 1, fitid="1")
+        self.assertFalse(hasattr(txn, "__dict__"))
+
+    def test_create_transactions(self):
+        [transactions, secinfo, dtstart, dtend] = create_transactions(
+            self.rows, "%Y/%m/%d"
+        )
+        self.assertEqual(4, len(transactions))
+        self.assertEqual(4, len(secinfo))
+        self.assertEqual(self.rows[0].row_hash, transactions[0].invbuy.invtran.fitid)
+        self.assertTrue(dtstart < dtend)
+
+
+class TestFitid(TestCase):
+    my_data_path = None
+    rows = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.my_data_path = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        cls.rows = create_data_csv_rows_from_file(cls.my_data_path)
+
+    def get_fitids(self, rows, strategy):
+        [transactions, secinfo, dtstart, dtend] = create_transactions(
+            rows, "%Y/%m/%d", strategy
+        )
+        return [transaction.fitid for transaction in transactions]
+
+    def test_hash(self):
+        self.assertEqual(
+            [row.row_hash for row in self.rows], self.get_fitids(self.rows, "hash")
+        )
+
+    def test_sequence(self):
+        self.assertEqual(["1", "2", "3", "4"], self.get_fitids(self.rows, "sequence"))
+
+    def test_source(self):
+        rows = [self.rows[0]._replace(fitid="ABC"), self.rows[1]]
+        self.assertEqual(
+            ["ABC", self.rows[1].row_hash], self.get_fitids(rows, "source")
+        )
+
+    def test_collision(self):
+        rows = [self.rows[0], self.rows[0]]
+        fitid = self.rows[0].row_hash
+        self.assertEqual([fitid, fitid + "_2"], self.get_fitids(rows, "hash"))
+
+    def test_from_columns(self):
+        txns = InvestmentTransaction.from_columns(
+            [None, None], ["TSLA", "AAPL"], [1, 2], [3, 4], [-3, -8]
+        )
+        self.assertEqual(["1", "2"], [txn.fitid for txn in txns])
+        self.assertEqual(["TSLA", "AAPL"], [txn.symbol for txn in txns])
+        self.assertEqual("BUYSTOCK", txns[1].txn_type)
+        self.assertEqual(-8, txns[1].total)
+
+
+class TestSecurityTable(TestCase):
+    def test_shared(self):
+        securities = SecurityTable()
+        secid = securities.secid("TSLA")
+        self.assertIs(secid, securities.secid("TSLA"))
+        self.assertIsNot(secid, securities.secid("TSLA", "CUSIP"))
+        self.assertIs(secid, securities.stockinfo("TSLA").secinfo.secid)
+        self.assertIsInstance(secid, ofx_models().SECID)
+        # Serialized once, each parent gets its own copy
+        element = secid.to_etree()
+        self.assertEqual("SECID", element.tag)
+        with patch.object(ofx_models().SECID, "to_etree", side_effect=AssertionError):
+            self.assertIsNot(element, secid.to_etree())
+            self.assertEqual(ET.tostring(element), ET.tostring(secid.to_etree()))
+
+    def test_transactions(self):
+        my_data_path = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        rows = create_data_csv_rows_from_file(my_data_path)
+        rows = rows + [row._replace(row_hash=row.row_hash + "_1") for row in rows]
+        securities = SecurityTable()
+        [transactions, secinfo, dtstart, dtend] = create_transactions(
+            rows, "%Y/%m/%d", securities=securities
+        )
+        self.assertEqual(8, len(transactions))
+        self.assertEqual(4, len(securities.secids))
+        self.assertIs(transactions[0].secid, transactions[4].secid)
+        self.assertIs(transactions[0].secid, secinfo[0].secinfo.secid)
+
+
+class TestConvert(TestCase):
+    my_data_path = None
+    options = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.my_data_path = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        dtserver = datetime(2023, 1, 31, 21, 26, 5, tzinfo=timezone.utc)
+        cls.options = ConversionOptions(
+            "999988", trnuid="1002", dtserver=dtserver, dtasof=dtserver
+        )
+
+    def test_sources(self):
+        response = convert(self.my_data_path, self.options)
+        self.assertIn(b"<OFX>", response)
+        self.assertIn(b"<DTSERVER>20230131212605.000[+0:UTC]</DTSERVER>", response)
+        self.assertIn(b"<TRNUID>1002</TRNUID>", response)
+        with open(self.my_data_path, "rb") as f:
+            content = f.read()
+        self.assertEqual(response, convert(content, self.options))
+        self.assertEqual(response, convert(io.BytesIO(content), self.options))
+        self.assertEqual(response, convert(io.StringIO(content.decode()), self.options))
+        rows = create_data_csv_rows_from_file(self.my_data_path)
+        self.assertEqual(response, convert(rows, self.options))
+        output = io.BytesIO()
+        self.assertIs(output, convert(rows, self.options, output))
+        self.assertEqual(response, output.getvalue())
+
+    def test_threads(self):
+        expected = convert(self.my_data_path, self.options)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(
+                executor.map(
+                    lambda _: convert(self.my_data_path, self.options), range(32)
+                )
+            )
+        for response in responses:
+            self.assertEqual(expected, response)
+
+    def test_accounts(self):
+        with open(self.my_data_path, "r") as f:
+            lines = f.read().splitlines()
+        # Two accounts, the last row has none: it belongs to the account of the options
+        content = "\n".join(
+            ["acctid," + lines[0]]
+            + ["A1," + lines[1], "A2," + lines[2], "A1," + lines[3], "," + lines[4]]
+        ).encode()
+        rows = list(iter_data_csv_rows(io.StringIO(content.decode())))
+        accounts = partition_accounts(rows, self.options)
+        self.assertEqual(
+            [(None, "A1"), (None, "A2"), (None, "999988")], list(accounts)
+        )
+        for jobs in [1, 2]:
+            self.options.jobs = jobs
+            try:
+                response = convert(content, self.options)
+            finally:
+                self.options.jobs = 1
+            ofx_tree = OFXTree()
+            ofx_tree.parse(io.BytesIO(response))
+            ofx = ofx_tree.convert()
+            self.assertEqual(
+                [("A1", 2), ("A2", 1), ("999988", 1)],
+                [(stmt.acctid, len(stmt.transactions)) for stmt in ofx.statements],
+            )
+            self.assertEqual(
+                ["1002-A1", "1002-A2", "1002-999988"],
+                [trnrs.trnuid for trnrs in ofx.invstmtmsgsrsv1],
+            )
+            self.assertEqual(4, len(ofx.securities))
+
+    def test_single_account(self):
+        with open(self.my_data_path, "r") as f:
+            lines = f.read().splitlines()
+        # The account of the columns, not the one of the options
+        content = "\n".join(
+            ["brokerid,acctid," + lines[0]]
+            + ["BRK-A,ACCT-A," + line for line in lines[1:]]
+        ).encode()
+        ofx_tree = OFXTree()
+        ofx_tree.parse(io.BytesIO(convert(content, self.options)))
+        ofx = ofx_tree.convert()
+        [stmt] = ofx.statements
+        self.assertEqual("BRK-A", stmt.invacctfrom.brokerid)
+        self.assertEqual("ACCT-A", stmt.invacctfrom.acctid)
+        self.assertEqual(len(lines) - 1, len(stmt.transactions))
+        self.assertEqual("1002", ofx.invstmtmsgsrsv1[0].trnuid)
+
+    def test_streaming(self):
+        # Without account columns the rows are not grouped, they are converted as read
+        expected = convert(self.my_data_path, self.options)
+        with patch.object(invtranlist, "partition_accounts", side_effect=AssertionError):
+            self.assertEqual(expected, convert(self.my_data_path, self.options))
+            with open(self.my_data_path, "rb") as f:
+                self.assertEqual(expected, convert(f, self.options))
+
+    def test_deterministic(self):
+        def parse(response):
+            ofx_tree = OFXTree()
+            ofx_tree.parse(io.BytesIO(response))
+            return ofx_tree.convert()
+
+        options = ConversionOptions("999988", deterministic=True)
+        response = convert(self.my_data_path, options)
+        self.assertEqual(response, convert(self.my_data_path, options))
+        ofx = parse(response)
+        # The latest trade date
+        dttrades = [
+            transaction.invtran.dttrade for transaction in ofx.statements[0].transactions
+        ]
+        self.assertEqual(max(dttrades), ofx.signonmsgsrsv1.sonrs.dtserver)
+
+        # Another input, another TRNUID
+        with open(self.my_data_path, "r") as f:
+            lines = f.read().splitlines()
+        other = parse(convert("\n".join(lines[:-1]).encode(), options))
+        self.assertNotEqual(
+            ofx.invstmtmsgsrsv1[0].trnuid, other.invstmtmsgsrsv1[0].trnuid
+        )
+
+        # One TRNUID per account
+        content = "\n".join(
+            ["acctid," + lines[0]] + ["A%d,%s" % (i % 2, lines[i]) for i in range(1, 5)]
+        ).encode()
+        trnuids = [trnrs.trnuid for trnrs in parse(convert(content, options)).invstmtmsgsrsv1]
+        self.assertEqual(2, len(set(trnuids)))
+        self.assertEqual(
+            trnuids,
+            [trnrs.trnuid for trnrs in parse(convert(content, options)).invstmtmsgsrsv1],
+        )
@@ -0,0 +1,80 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+from ofxtools import OFXTree
+
+from invtranlist import ConversionOptions
+from merge_statements import (
+    DEDUP_CONTENT,
+    DEDUP_FITID,
+    DedupWindow,
+    open_statements,
+    write_merged,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def merge(names, dedup):
+    filenames = [os.path.join(THIS_DIR, os.pardir, "data", name) for name in names]
+    statements = open_statements(filenames, "%Y/%m/%d", "hash")
+    output = io.BytesIO()
+    [count, duplicates] = write_merged(
+        statements, output, ConversionOptions(acctid="1", trnuid="1"), dedup
+    )
+    ofx_tree = OFXTree()
+    ofx_tree.parse(io.BytesIO(output.getvalue()))
+    return [count, duplicates, ofx_tree.convert()]
+
+
+class TestMergeStatements(TestCase):
+    def test_merge_fitid(self):
+        [count, duplicates, ofx] = merge(["example1.csv", "example1.csv"], DEDUP_FITID)
+        self.assertEqual(4, count)
+        self.assertEqual(4, duplicates)
+        transactions = ofx.statements[0].transactions
+        self.assertEqual(4, len(transactions))
+        # Merged by trade date
+        dates = [transaction.dttrade for transaction in transactions]
+        self.assertEqual(sorted(dates), dates)
+        self.assertEqual(dates[0], transactions.dtstart)
+        self.assertEqual(dates[-1], transactions.dtend)
+        self.assertEqual(4, len(ofx.securities))
+
+    def test_merge_content(self):
+        # Without memo the FITIDs differ, the content is the same
+        names = ["example1.csv", "example1_no_memo.csv"]
+        self.assertEqual(0, merge(names, DEDUP_FITID)[1])
+        self.assertEqual(4, merge(names, DEDUP_CONTENT)[1])
+
+    def test_merge_content_ofx(self):
+        # The same trades, with CUSIPs and other FITIDs in the download
+        names = ["example1.csv", "example1.qfx"]
+        self.assertEqual(0, merge(names, DEDUP_FITID)[1])
+        [count, duplicates, ofx] = merge(names, DEDUP_CONTENT)
+        self.assertEqual(4, count)
+        self.assertEqual(4, duplicates)
+        self.assertEqual(
+            ["TICKER"] * 4,
+            [transaction.secid.uniqueidtype for transaction in ofx.statements[0].transactions],
+        )
+
+    def test_merge_ofx(self):
+        [count, duplicates, ofx] = merge(
+            ["OfxDownload.qfx", "example1.csv", "OfxDownload.qfx"], DEDUP_FITID
+        )
+        self.assertEqual(200, count)
+        self.assertEqual(196, duplicates)
+        self.assertEqual(13, len(ofx.securities))
+
+    def test_dedup_window(self):
+        window = DedupWindow(window_days=1)
+        day = datetime(2022, 5, 8, tzinfo=timezone.utc)
+        self.assertFalse(window.seen(day, "a", 0))
+        self.assertFalse(window.seen(day, "a", 0))
+        self.assertTrue(window.seen(day + timedelta(hours=12), "a", 1))
+        # Out of the window
+        self.assertFalse(window.seen(day + timedelta(days=2), "a", 1))
+        self.assertEqual(1, len(window.keys))
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from invtranlist import ensure_sign, to_decimal
+from numeric_columns import MalformedValueError, convert_numeric_columns
+
+TXN_TYPES = ["BUYSTOCK", "SELLSTOCK", "BUYMF", "SELLMF", "REINVEST", "INCOME"]
+
+
+def convert_per_row(txn_types, units, unitprices, totals):
+    results = [[], [], []]
+    for txn_type, units_value, unitprice, total in zip(
+        txn_types, units, unitprices, totals
+    ):
+        match txn_type:
+            case "BUYSTOCK" | "BUYMF":
+                units_value = ensure_sign(to_decimal(units_value))
+                total = ensure_sign(to_decimal(total), False)
+            case "SELLSTOCK" | "SELLMF":
+                units_value = ensure_sign(to_decimal(units_value), False)
+                total = ensure_sign(to_decimal(total))
+            case _:
+                units_value = to_decimal(units_value)
+                total = to_decimal(total)
+        results[0].append(units_value)
+        results[1].append(to_decimal(unitprice))
+        results[2].append(total)
+    return results
+
+
+class TestConvertNumericColumns(TestCase):
+    def convert(self, *columns, **kwargs):
+        return convert_numeric_columns(*columns, **kwargs)
+
+    def test_signs(self):
+        txn_types = TXN_TYPES * 2
+        units = ["10", "-10", "+1.5", "2", "-0.017", "", "-3", "3", "0", "-0", "", ""]
+        unitprices = ["131.15", "1", "", "2.5", "133.5", "", "1", "2", "3", "4", "", ""]
+        totals = ["50", "-50", "-1", "+1", "-2.26", "2.26", "-7", "7", "0", "0", "", "1e2"]
+        self.assertEqual(
+            convert_per_row(txn_types, units, unitprices, totals),
+            self.convert(txn_types, units, unitprices, totals),
+        )
+
+    def test_repeated_values(self):
+        txn_types = ["BUYSTOCK", "SELLSTOCK", "INCOME", "REINVEST"] * 3
+        units = ["1", "-1", "", "0.5"] * 3
+        unitprices = ["1", "1", "", "1"] * 3
+        totals = ["-50", "-50", "0", "-0"] * 3
+        self.assertEqual(
+            convert_per_row(txn_types, units, unitprices, totals),
+            self.convert(txn_types, units, unitprices, totals),
+        )
+
+    def test_values(self):
+        [units, unitprices, totals] = self.convert(
+            ["BUYSTOCK", "SELLMF", "INCOME"],
+            ["-10", "5", ""],
+            ["1.5", "2", ""],
+            ["50", "-20", "3.25"],
+        )
+        self.assertEqual([Decimal("10"), Decimal("-5"), None], units)
+        self.assertEqual([Decimal("1.5"), Decimal("2"), None], unitprices)
+        self.assertEqual([Decimal("-50"), Decimal("20"), Decimal("3.25")], totals)
+
+    def test_malformed(self):
+        with self.assertRaises(MalformedValueError) as context:
+            self.convert(
+                ["BUYSTOCK", "SELLSTOCK", "INCOME"],
+                ["1", "", "x"],
+                ["1", "abc", ""],
+                ["1", "2", "3"],
+                first_row_number=11,
+            )
+        self.assertEqual(
+            [(12, "units", ""), (12, "unitprice", "abc"), (13, "units", "x")],
+            context.exception.errors,
+        )
+
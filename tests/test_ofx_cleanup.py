@@ -0,0 +1,100 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+import xmltodict
+
+from fidelity_ofx import FidelityOfx
+from invtranlist import ConversionOptions, convert
+from ofx_cleanup import (
+    OFX_VERSION_1,
+    OFX_VERSION_2,
+    cleanup,
+    cleanup_data,
+    cleanup_file,
+    detect_ofx_version,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def cleanup_bytes(data):
+    body = io.BytesIO()
+    header = cleanup_data(data, body)
+    return [header, body.getvalue()]
+
+
+class TestOfxCleanup(TestCase):
+    def test_cleanup_data(self):
+        self.assertEqual(
+            [b"HDR\n", b"<A><B>1\n</B><C>x</C></A>"],
+            cleanup_bytes(b"HDR\n<A><B>1\n<C>x</C></A>"),
+        )
+        # Processing instructions are boundaries, comments are text
+        self.assertEqual(
+            [b"", b"<?xml v?>\n<A><B>1<?pi?></B><C>2</C></A>"],
+            cleanup_bytes(b"<?xml v?>\n<A><B>1<?pi?><C>2</C></A>"),
+        )
+        self.assertEqual(
+            b"<A><B>1<!-- c --></B><C>2</C></A>",
+            cleanup_bytes(b"<A><B>1<!-- c --><C>2</C></A>")[1],
+        )
+        # No tag at all: everything is header
+        self.assertEqual([b"HDR", b""], cleanup_bytes(b"HDR"))
+
+    def test_cleanup_file(self):
+        filename = os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        with tempfile.TemporaryFile() as body:
+            header = cleanup_file(filename, body)
+            body.seek(0)
+            ofx = xmltodict.parse(body)
+        self.assertTrue(header.startswith(b"OFXHEADER:100"))
+        response = ofx["OFX"]["INVSTMTMSGSRSV1"]["INVSTMTTRNRS"]["INVSTMTRS"]
+        self.assertEqual(57, len(response["INVTRANLIST"]["BUYMF"]))
+
+        [header_io, body_io] = cleanup(filename)
+        self.assertEqual(header.decode(), header_io.getvalue().replace("\n", "\r\n"))
+        self.assertTrue(body_io.getvalue().startswith("<OFX>"))
+
+    def test_empty_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            [header, body] = cleanup(f.name)
+        self.assertEqual("", header.getvalue())
+        self.assertEqual("", body.getvalue())
+
+    def test_fidelity_ofx(self):
+        filename = os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        fidelity_ofx = FidelityOfx(filename)
+        securities = fidelity_ofx.get_securities()
+        self.assertEqual(7, len(fidelity_ofx.get_mfinfo(securities)))
+        self.assertTrue(fidelity_ofx.xml_string.startswith("<OFX>"))
+
+    def test_detect_ofx_version(self):
+        filename = os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        self.assertEqual(OFX_VERSION_1, detect_ofx_version(filename))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "test.ofx")
+            for content, version in [
+                (b'<?xml version="1.0"?>\n<?OFX OFXHEADER="200" VERSION="202"?>', 2),
+                (b'\xef\xbb\xbf<?OFX OFXHEADER="200" VERSION="220"?>\n<OFX></OFX>', 2),
+                (b'<?OFX OFXHEADER="100" VERSION="102"?>', 1),
+                (b"", 1),
+            ]:
+                with open(filename, "wb") as f:
+                    f.write(content)
+                self.assertEqual(version, detect_ofx_version(filename))
+
+    def test_fidelity_ofx_version_2(self):
+        # The output of invtranlist is OFX 2.x, parsed without cleanup
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "example1.ofx")
+            options = ConversionOptions(acctid="1", trnuid="1")
+            with open(filename, "wb") as f:
+                convert(os.path.join(THIS_DIR, os.pardir, "data", "example1.csv"), options, f)
+            self.assertEqual(OFX_VERSION_2, detect_ofx_version(filename))
+            fidelity_ofx = FidelityOfx(filename)
+            self.assertTrue(fidelity_ofx.xml_string.startswith("<?xml"))
+            securities = fidelity_ofx.get_securities()
+            self.assertEqual(2, len(fidelity_ofx.get_stockinfo(securities)))
+            self.assertEqual(2, len(fidelity_ofx.get_mfinfo(securities)))
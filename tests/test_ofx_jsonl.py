@@ -0,0 +1,52 @@
+import io
+import json
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import ofx_jsonl
+from fidelity_ofx import FidelityOfx
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestOfxJsonl(TestCase):
+    def setUp(self):
+        self.fidelity_ofx = FidelityOfx(
+            os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        )
+
+    def read_records(self):
+        output = io.BytesIO()
+        count = self.fidelity_ofx.write_jsonl(output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(count, len(records))
+        return records
+
+    def test_write_jsonl(self):
+        records = self.read_records()
+        self.assertEqual(214, len(records))
+        # Same content as the nested JSON, record by record
+        transactions = [
+            record for record in records if record["record"] == "transaction"
+        ]
+        buymf = [record["data"] for record in transactions if record["aggregate"] == "BUYMF"]
+        invtranlist = self.fidelity_ofx.get_transactions()
+        self.assertEqual(invtranlist["BUYMF"], buymf)
+        self.assertEqual(196, len(transactions))
+
+        securities = [record for record in records if record["record"] == "security"]
+        self.assertEqual(
+            self.fidelity_ofx.get_securities()["MFINFO"],
+            [record["data"] for record in securities if record["aggregate"] == "MFINFO"],
+        )
+
+    def test_write_jsonl_without_orjson(self):
+        expected = self.read_records()
+        with patch.object(ofx_jsonl, "orjson", None):
+            self.assertEqual(expected, self.read_records())
+
+    def test_write_json(self):
+        output = io.StringIO()
+        self.fidelity_ofx.write_json(output)
+        self.assertEqual(self.fidelity_ofx.to_json_str() + "\n", output.getvalue())
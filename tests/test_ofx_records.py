@@ -0,0 +1,63 @@
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import TestCase
+
+from fidelity_ofx import FidelityOfx
+from ofx_records import parse_ofx_datetime
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EST = timezone(timedelta(hours=-5))
+
+
+class TestOfxRecords(TestCase):
+    def test_parse_ofx_datetime(self):
+        self.assertEqual(
+            datetime(2022, 12, 29, 12, tzinfo=EST),
+            parse_ofx_datetime("20221229120000.000[-5:EST]"),
+        )
+        self.assertEqual(
+            datetime(2022, 12, 29, tzinfo=timezone.utc), parse_ofx_datetime("20221229")
+        )
+        self.assertEqual(
+            datetime(2022, 12, 29, 12, 30, 5, 250000, tzinfo=timezone.utc),
+            parse_ofx_datetime("20221229123005.25"),
+        )
+        self.assertEqual(
+            datetime(2022, 12, 29, 12, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+            parse_ofx_datetime("20221229120000.000[+5.30:IST]"),
+        )
+        self.assertEqual(
+            datetime(2022, 12, 29, 12, tzinfo=timezone(-timedelta(hours=3, minutes=30))),
+            parse_ofx_datetime("20221229120000[-3.30]"),
+        )
+
+    def test_records(self):
+        fidelity_ofx = FidelityOfx(os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx"))
+        records = fidelity_ofx.transaction_records()
+        self.assertEqual(196, len(records))
+
+        record = records[0]
+        self.assertEqual("BUYDEBT", record.name)
+        self.assertEqual("961033505", record.fitid)
+        self.assertEqual("912796YA1", record.uniqueid)
+        self.assertEqual(datetime(2022, 11, 14, 16, tzinfo=EST), record.dttrade)
+        self.assertEqual(Decimal("-9894.97"), record.total)
+        self.assertIsNone(record.trnamt)
+        # Memoized
+        self.assertIs(record.total, record.total)
+
+        bank = [record for record in records if record.name == "INVBANKTRAN"][0]
+        self.assertIsNone(bank.dttrade)
+        self.assertEqual(Decimal("600.0"), bank.trnamt)
+
+        # One parse per distinct string
+        dttrades = {record.dttrade for record in records if record.dttrade is not None}
+        datetimes = fidelity_ofx.values.datetimes
+        self.assertLessEqual(len(dttrades), len(datetimes))
+        self.assertTrue(all(isinstance(value, datetime) for value in datetimes.values()))
+
+        position = fidelity_ofx.position_records()[0]
+        self.assertEqual(Decimal("569.21"), position.units)
+        self.assertEqual("921909768", position.uniqueid)
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import ofx_server
+from ofx_server import ConversionServer
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestConversionServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ConversionServer(port=0, jobs=1, max_pending=4)
+        await self.server.start()
+        with open(os.path.join(THIS_DIR, os.pardir, "data/example1.csv"), "rb") as f:
+            self.body = f.read()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def post(self, path, body, content_length=None):
+        reader, writer = await asyncio.open_connection(self.server.host, self.server.port)
+        if content_length is None:
+            content_length = str(len(body))
+        writer.write(
+            b"POST %s HTTP/1.1\r\nContent-Length: %s\r\n\r\n"
+            % (path.encode(), content_length.encode())
+        )
+        writer.write(body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout=30)
+        writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        return [int(head.split()[1]), content]
+
+    async def test_csv2ofx(self):
+        [status, content] = await self.post("/csv2ofx?acctid=1&trnuid=1", self.body)
+        self.assertEqual(200, status)
+        self.assertIn(b"<OFX>", content)
+        self.assertIn(b"<ACCTID>1</ACCTID>", content)
+
+    async def test_concurrent(self):
+        responses = await asyncio.gather(
+            *[self.post("/csv2ofx?acctid=1", self.body) for _ in range(4)]
+        )
+        self.assertEqual([200] * 4, [status for status, _ in responses])
+
+    async def test_errors(self):
+        [status, _] = await self.post("/unknown", self.body)
+        self.assertEqual(404, status)
+        [status, content] = await self.post("/csv2ofx", self.body)
+        self.assertEqual(400, status)
+        self.assertIn(b"acctid", content)
+        for content_length in ["-1", "abc", "+10", "1_0"]:
+            [status, content] = await self.post(
+                "/csv2ofx?acctid=1", self.body, content_length=content_length
+            )
+            self.assertEqual(400, status, content_length)
+            self.assertIn(b"Content-Length", content)
+
+    async def test_internal_error(self):
+        # e.g. the disk is full: the client still gets a response
+        with patch.object(ofx_server, "run_blocking", side_effect=OSError("disk full")):
+            with self.assertLogs("ofx_server", "ERROR"):
+                [status, _] = await self.post("/csv2ofx?acctid=1", self.body)
+        self.assertEqual(500, status)
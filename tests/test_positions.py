@@ -0,0 +1,77 @@
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+
+from ofxtools import OFXTree
+
+from invtranlist import (
+    ConversionOptions,
+    convert,
+    create_data_csv_rows_from_file,
+    create_transactions,
+)
+from positions import KIND_MF, KIND_STOCK, PositionAccumulator
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+NEXT_DAY_CSV = b"""txn_type,trade_date,symbol,units,unitprice,total,symbol_type
+BUYSTOCK,2022/08/26,TSLA,10.00,60.00,-600.00,STOCK
+"""
+
+
+class TestPositions(TestCase):
+    def setUp(self):
+        self.input_filename = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        self.rows = create_data_csv_rows_from_file(self.input_filename)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.positions_filename = os.path.join(self.tmp_dir, "positions.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_accumulate(self):
+        positions = PositionAccumulator()
+        create_transactions(self.rows, "%Y/%m/%d", positions=positions)
+        self.assertEqual(
+            ["AAPL", "TSLA", "VOO", "VTI"], [symbol for symbol, _ in positions.held()]
+        )
+        tsla = positions.positions["TSLA"]
+        self.assertEqual(Decimal("100.00"), tsla.units)
+        self.assertEqual(Decimal("50.00"), tsla.unitprice)
+        self.assertEqual(KIND_STOCK, tsla.kind)
+        self.assertEqual(KIND_MF, positions.positions["VTI"].kind)
+        # SELL units are negative
+        self.assertEqual(Decimal("-10.00"), positions.positions["AAPL"].units)
+
+    def test_incremental(self):
+        # Two runs on the same file: the second one adds nothing
+        for _ in range(2):
+            positions = PositionAccumulator.load(self.positions_filename)
+            create_transactions(self.rows, "%Y/%m/%d", positions=positions)
+            positions.save(self.positions_filename)
+        positions = PositionAccumulator.load(self.positions_filename)
+        self.assertEqual(Decimal("100.00"), positions.positions["TSLA"].units)
+
+        # A later run only with the new transactions
+        options = ConversionOptions(
+            acctid="1", trnuid="1", positions_filename=self.positions_filename
+        )
+        response = convert(NEXT_DAY_CSV, options)
+        positions = PositionAccumulator.load(self.positions_filename)
+        self.assertEqual(Decimal("110.00"), positions.positions["TSLA"].units)
+        self.assertEqual(Decimal("60.00"), positions.positions["TSLA"].unitprice)
+
+        ofx_tree = OFXTree()
+        ofx_tree.parse(io.BytesIO(response))
+        ofx = ofx_tree.convert()
+        statement = ofx.statements[0]
+        self.assertEqual(1, len(statement.transactions))
+        # Positions of the whole history, with their securities
+        self.assertEqual(4, len(statement.positions))
+        self.assertEqual(
+            ["AAPL", "TSLA", "VOO", "VTI"],
+            sorted(info.uniqueid for info in ofx.securities),
+        )
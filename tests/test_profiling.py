@@ -0,0 +1,63 @@
+import argparse
+import io
+import os
+import pstats
+import tempfile
+from contextlib import redirect_stdout
+from unittest import TestCase
+
+from invtranlist import create_data_csv_rows_from_file
+from profiling import add_arguments, profile_run
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestProfiling(TestCase):
+    def setUp(self):
+        self.parser = argparse.ArgumentParser()
+        self.parser.add_argument("--input")
+        add_arguments(self.parser)
+        self.input_filename = os.path.join(THIS_DIR, os.pardir, "data", "example1.csv")
+
+    def test_arguments(self):
+        args = self.parser.parse_args(["--profile-out", "a.prof", "--trace-mem"])
+        self.assertEqual("a.prof", args.profile_out)
+        self.assertEqual(25, args.trace_mem)
+        args = self.parser.parse_args(["--trace_mem", "3"])
+        self.assertIsNone(args.profile_out)
+        self.assertEqual(3, args.trace_mem)
+
+    def test_profile_out(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_out = os.path.join(tmp_dir, "run.prof")
+            args = self.parser.parse_args(
+                ["--input", self.input_filename, "--profile_out", profile_out]
+                + ["--trace_mem", "5"]
+            )
+            with redirect_stdout(io.StringIO()):
+                with profile_run(args):
+                    create_data_csv_rows_from_file(self.input_filename)
+            stats = pstats.Stats(profile_out)
+            self.assertTrue(stats.total_calls > 0)
+            with open(profile_out + ".txt") as f:
+                report = f.read()
+        size = os.path.getsize(self.input_filename)
+        self.assertIn("# input_size=%d bytes" % size, report)
+        self.assertIn("create_data_csv_rows_from_file", report)
+        self.assertIn("# top 5 allocation sites", report)
+
+    def test_trace_mem(self):
+        args = self.parser.parse_args(["--trace_mem", "2"])
+        output = io.StringIO()
+        with redirect_stdout(output):
+            with profile_run(args):
+                create_data_csv_rows_from_file(self.input_filename)
+        self.assertIn("# peak_traced_memory=", output.getvalue())
+        self.assertIn("# input_size=unknown", output.getvalue())
+
+    def test_disabled(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            with profile_run(self.parser.parse_args([])):
+                pass
+        self.assertEqual("", output.getvalue())
@@ -1,7 +1,8 @@
+import io
 import os
 from unittest import TestCase
 
-from read_fidelity_csv import FidelityMapper, FidelityCsv
+from read_fidelity_csv import FidelityMapper, FidelityCsv, FidelityRow, convert
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -31,6 +32,78 @@ class TestFidelityMapper(TestCase):
         self.assertEqual(self.fidelity_mapper.get_symbol_type("TSLA"), "STOCK")
 
 
+class TestConvert(TestCase):
+    def test_convert(self):
+        my_data_path = os.path.join(THIS_DIR, os.pardir, "data/1.csv")
+        mapper_path = os.path.join(THIS_DIR, os.pardir, "data/fidelity_mapper.csv")
+        output = convert(my_data_path, mapper_path, header_lineno=1)
+        lines = output.decode().splitlines()
+        self.assertEqual(
+            "txn_type,trade_date,symbol,units,unitprice,total,memo,symbol_type",
+            lines[0],
+        )
+        self.assertTrue(lines[1].startswith("BUYSTOCK,12/28/2022,FXAIX,0.381,131.15,-50,"))
+        with open(my_data_path) as f:
+            self.assertEqual(output, convert(f, mapper_path, header_lineno=1))
+
+    def test_detect_header(self):
+        my_data_path = os.path.join(THIS_DIR, os.pardir, "data/1.csv")
+        mapper_path = os.path.join(THIS_DIR, os.pardir, "data/fidelity_mapper.csv")
+        with open(my_data_path) as f:
+            content = f.read()
+        expected = convert(my_data_path, mapper_path, header_lineno=1)
+        self.assertEqual(expected, convert(my_data_path, mapper_path))
+
+        # Account lines before the header, disclaimer after the transactions
+        history = (
+            "\ufeff\n\nBrokerage,X12345678\n\n"
+            + content
+            + '\n"The data and information in this spreadsheet is provided to you solely"\n'
+            + '"Date downloaded 01/03/2023 8:43 pm"\n'
+        )
+        fidelity_csv = FidelityCsv(io.StringIO(history), FidelityMapper(mapper_path))
+        self.assertEqual(5, fidelity_csv.header_lineno)
+        self.assertEqual([["Brokerage", "X12345678"]], fidelity_csv.metadata)
+        self.assertEqual(14, len(fidelity_csv.rows))
+        self.assertEqual(expected, convert(io.StringIO(history), mapper_path))
+
+        with self.assertRaises(ValueError):
+            FidelityCsv(io.StringIO("a,b\n1,2\n"), FidelityMapper())
+
+        # Only "\n" ends a line, in the first few KB as in the rest of the file
+        fidelity_csv = FidelityCsv(
+            io.StringIO(content.replace("FIDELITY 500", "FIDELITY\x0c500", 1)),
+            FidelityMapper(),
+        )
+        self.assertEqual(14, len(fidelity_csv.rows))
+        self.assertIn("FIDELITY\x0c500", fidelity_csv.rows[0].action)
+
+    def test_rows(self):
+        my_data_path = os.path.join(THIS_DIR, os.pardir, "data/1.csv")
+        fidelity_csv = FidelityCsv(my_data_path, FidelityMapper())
+        row = fidelity_csv.rows[0]
+        self.assertEqual(
+            FidelityRow(
+                "12/28/2022",
+                "YOU BOUGHT PERIODIC INVESTMENT FIDELITY 500 INDEX FUND (FXAIX) (Cash)",
+                "FXAIX",
+                "Cash",
+                "0.381",
+                "131.15",
+                "-50",
+            ),
+            row,
+        )
+
+        fidelity_csv = FidelityCsv(
+            my_data_path, FidelityMapper(), extra_columns=["Commission ($)", "Settlement Date"]
+        )
+        self.assertEqual(row._replace(extra=("", "")), fidelity_csv.rows[0])
+
+        with self.assertRaises(ValueError):
+            FidelityCsv(my_data_path, FidelityMapper(), extra_columns=["Tax ($)"])
+
+
 class TestFidelityCsv(TestCase):
     my_data_path = None
     fidelity_mapper = None
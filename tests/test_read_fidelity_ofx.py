@@ -1,7 +1,10 @@
+import io
 import os
+import tempfile
 from unittest import TestCase
 
-from fidelity_ofx import FidelityOfx
+from fidelity_ofx import FidelityOfx, find_uniqueid
+from invtranlist import ConversionOptions, convert
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -42,3 +45,61 @@ class TestFidelityOfx(TestCase):
         self.assertEqual(12, len(self.fidelity_ofx.get_mfinfo(securities)))
         self.assertEqual(2, len(self.fidelity_ofx.get_stockinfo(securities)))
 
+
+
+class TestFidelityOfxIndex(TestCase):
+    def setUp(self):
+        self.fidelity_ofx = FidelityOfx(
+            os.path.join(THIS_DIR, os.pardir, "data", "OfxDownload.qfx")
+        )
+
+    def test_aggregate_as_list(self):
+        transactions = self.fidelity_ofx.get_transactions()
+        # A single element is a list of one
+        sellstock = self.fidelity_ofx.get_aggregate_as_list(transactions, "SELLSTOCK")
+        self.assertEqual(1, len(sellstock))
+        self.assertEqual(57, len(self.fidelity_ofx.get_buymf(transactions)))
+        self.assertEqual([], self.fidelity_ofx.get_aggregate_as_list(transactions, "BUYOPT"))
+
+    def test_index(self):
+        index = self.fidelity_ofx.index
+        self.assertEqual(196, sum(len(txns) for txns in index.transactions.values()))
+        self.assertEqual(9, len(index.securities))
+
+        security = self.fidelity_ofx.security_for("921909768")
+        self.assertEqual("VXUS", security["SECINFO"]["TICKER"])
+        self.assertIsNone(self.fidelity_ofx.security_for("000000000"))
+
+        # By ticker or by UNIQUEID
+        transactions = self.fidelity_ofx.transactions_for("VXUS")
+        self.assertEqual(transactions, self.fidelity_ofx.transactions_for("921909768"))
+        self.assertTrue(transactions)
+        for _, transaction in transactions:
+            self.assertEqual("921909768", find_uniqueid(transaction))
+        self.assertEqual(1, len(index.positions_for("VXUS")))
+
+    def test_accounts(self):
+        # The statements of several accounts, as written by invtranlist.convert()
+        with open(os.path.join(THIS_DIR, os.pardir, "data", "example1.csv")) as f:
+            lines = f.read().splitlines()
+        content = "\n".join(
+            ["acctid," + lines[0]] + ["A%d,%s" % (i % 2, lines[i]) for i in range(1, 5)]
+        ).encode()
+        response = convert(content, ConversionOptions("999988", trnuid="1"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "accounts.ofx")
+            with open(filename, "w") as f:
+                f.write(response.decode())
+            fidelity_ofx = FidelityOfx(filename)
+            self.assertEqual(["A1", "A0"], fidelity_ofx.index.accounts)
+            transactions = fidelity_ofx.get_transactions()
+            self.assertEqual(
+                4, sum(len(txns) for txns in fidelity_ofx.index.transactions.values())
+            )
+            self.assertEqual(1, len(fidelity_ofx.get_buystock(transactions)))
+            self.assertEqual("20220508", transactions["DTSTART"][:8])
+            self.assertEqual("20220825", transactions["DTEND"][:8])
+            self.assertEqual(1, len(fidelity_ofx.transactions_for("TSLA")))
+            with self.assertRaises(ValueError):
+                fidelity_ofx.get_investment_statement_response()
+            self.assertEqual(8, fidelity_ofx.write_jsonl(io.BytesIO()))
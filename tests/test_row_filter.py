@@ -0,0 +1,76 @@
+import io
+import os
+from datetime import date
+from unittest import TestCase
+
+from invtranlist import iter_data_csv_rows
+from read_fidelity_csv import FIDELITY_DATE_STRING_FORMAT, convert
+from row_filter import (
+    ACCEPT,
+    ORDER_ASCENDING,
+    ORDER_DESCENDING,
+    SKIP,
+    STOP,
+    RowFilter,
+    parse_symbols,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SORTED_CSV = """txn_type,trade_date,symbol,units,unitprice,total
+BUYSTOCK,2022/05/08,VOO,12.00,351.34,-4216.08
+BUYSTOCK,2022/06/11,VTI,35.00,191.19,-6691.65
+BUYSTOCK,2022/07/12,AAPL,10.00,129.93,-1299.30
+"""
+
+MALFORMED_ROW = "BUYSTOCK,not a date,TSLA,not a number,50.00,-5000.00\n"
+
+
+class TestRowFilter(TestCase):
+    def test_check(self):
+        row_filter = RowFilter(
+            "%Y/%m/%d",
+            since=date(2022, 6, 1),
+            until=date(2022, 6, 30),
+            symbols=parse_symbols("VTI, VOO"),
+        )
+        self.assertEqual(ACCEPT, row_filter.check("2022/06/11", " VTI"))
+        self.assertEqual(SKIP, row_filter.check("2022/06/11", "AAPL"))
+        self.assertEqual(SKIP, row_filter.check("2022/05/08", "VOO"))
+        self.assertEqual(SKIP, row_filter.check("2022/07/12", "VOO"))
+
+        row_filter.order = ORDER_ASCENDING
+        self.assertEqual(STOP, row_filter.check("2022/07/12", "VOO"))
+        self.assertEqual(SKIP, row_filter.check("2022/05/08", "VOO"))
+        row_filter.order = ORDER_DESCENDING
+        self.assertEqual(SKIP, row_filter.check("2022/07/12", "VOO"))
+        self.assertEqual(STOP, row_filter.check("2022/05/08", "VOO"))
+
+    def test_iter_data_csv_rows(self):
+        row_filter = RowFilter(
+            "%Y/%m/%d", since=date(2022, 6, 1), until=date(2022, 6, 30)
+        )
+        rows = list(iter_data_csv_rows(io.StringIO(SORTED_CSV), row_filter))
+        self.assertEqual(["VTI"], [row.symbol for row in rows])
+
+        # Sorted input: rows after the range (here malformed) are never read
+        row_filter.order = ORDER_ASCENDING
+        rows = list(
+            iter_data_csv_rows(io.StringIO(SORTED_CSV + MALFORMED_ROW), row_filter)
+        )
+        self.assertEqual(["VTI"], [row.symbol for row in rows])
+
+    def test_fidelity_csv(self):
+        row_filter = RowFilter(
+            FIDELITY_DATE_STRING_FORMAT,
+            since=date(2022, 12, 1),
+            order=ORDER_DESCENDING,
+        )
+        output = convert(
+            os.path.join(THIS_DIR, os.pardir, "data/1.csv"),
+            header_lineno=1,
+            row_filter=row_filter,
+        )
+        lines = output.decode().splitlines()
+        self.assertEqual(5, len(lines))
+        self.assertTrue(all("/2022" in line for line in lines[1:]))
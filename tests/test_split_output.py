@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ofxtools import OFXTree
+
+from invtranlist import (
+    ConversionOptions,
+    create_data_csv_rows_from_file,
+    create_transactions,
+)
+from split_output import (
+    SPLIT_BY_ACCOUNT,
+    SPLIT_BY_MONTH,
+    SPLIT_BY_NONE,
+    assign_fitids,
+    partition_rows,
+    write_partitions,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ACCOUNTS_CSV = """txn_type,trade_date,symbol,units,unitprice,total,brokerid,acctid
+BUYSTOCK,2022/05/08,VOO,12.00,351.34,-4216.08,,A
+BUYSTOCK,2022/06/11,VTI,35.00,191.19,-6691.65,,B
+BUYSTOCK,2022/06/12,AAPL,10.00,129.93,-1299.30,,
+BUYSTOCK,2022/06/13,MSFT,5.00,250.00,-1250.00,BRK-B,B
+"""
+
+
+class TestSplitOutput(TestCase):
+    def setUp(self):
+        self.input_filename = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+        self.rows = assign_fitids(
+            create_data_csv_rows_from_file(self.input_filename), "hash"
+        )
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_partition_rows(self):
+        partitions = partition_rows(self.rows, SPLIT_BY_MONTH, None, "%Y/%m/%d", "1")
+        self.assertEqual(
+            ["2022-05", "2022-06", "2022-07", "2022-08"],
+            [name for name, _, _ in partitions],
+        )
+        partitions = partition_rows(self.rows, SPLIT_BY_NONE, 3, "%Y/%m/%d", "1")
+        self.assertEqual(
+            [["1", 3], ["2", 1]], [[name, len(rows)] for name, _, rows in partitions]
+        )
+
+    def test_partition_accounts(self):
+        filename = os.path.join(self.output_dir, "accounts.csv")
+        with open(filename, "w") as f:
+            f.write(ACCOUNTS_CSV)
+        rows = create_data_csv_rows_from_file(filename)
+        partitions = partition_rows(rows, SPLIT_BY_ACCOUNT, None, "%Y/%m/%d", "1", "BRK")
+        # The same acctid at another broker is another account
+        self.assertEqual(
+            [
+                ["1", ("BRK", "1"), 1],
+                ["A", ("BRK", "A"), 1],
+                ["B", ("BRK", "B"), 1],
+                ["BRK-B-B", ("BRK-B", "B"), 1],
+            ],
+            [[name, account, len(rows)] for name, account, rows in partitions],
+        )
+        partitions = partition_rows(rows, SPLIT_BY_MONTH, None, "%Y/%m/%d", "1", "BRK")
+        self.assertEqual(
+            ["2022-05-A", "2022-06", "2022-06-B", "2022-06-BRK-B-B"],
+            [name for name, _, _ in partitions],
+        )
+
+    def test_write_accounts(self):
+        filename = os.path.join(self.output_dir, "accounts.csv")
+        with open(filename, "w") as f:
+            f.write(ACCOUNTS_CSV)
+        options = ConversionOptions(acctid="1", brokerid="BRK", trnuid="1")
+        filenames = write_partitions(
+            filename, self.output_dir, options, SPLIT_BY_ACCOUNT, jobs=1
+        )
+        accounts = []
+        for filename in filenames:
+            ofx_tree = OFXTree()
+            ofx_tree.parse(filename)
+            statement = ofx_tree.convert().statements[0]
+            accounts.append(
+                [
+                    os.path.basename(filename),
+                    statement.invacctfrom.brokerid,
+                    statement.invacctfrom.acctid,
+                ]
+            )
+        self.assertEqual(
+            [
+                ["accounts-1.ofx", "BRK", "1"],
+                ["accounts-A.ofx", "BRK", "A"],
+                ["accounts-B.ofx", "BRK", "B"],
+                ["accounts-BRK-B-B.ofx", "BRK-B", "B"],
+            ],
+            accounts,
+        )
+
+    def test_write_partitions(self):
+        options = ConversionOptions(acctid="1", trnuid="1")
+        filenames = write_partitions(
+            self.input_filename, self.output_dir, options, SPLIT_BY_MONTH, jobs=2
+        )
+        self.assertEqual(4, len(filenames))
+
+        # Same FITIDs as without splitting
+        [transactions, _, _, _] = create_transactions(
+            create_data_csv_rows_from_file(self.input_filename), "%Y/%m/%d"
+        )
+        fitids = set()
+        for filename in filenames:
+            ofx_tree = OFXTree()
+            ofx_tree.parse(filename)
+            ofx = ofx_tree.convert()
+            statement = ofx.statements[0]
+            self.assertEqual(1, len(statement.transactions))
+            transaction = statement.transactions[0]
+            self.assertEqual(transaction.dttrade, statement.transactions.dtstart)
+            # SECLIST trimmed to the security of the transaction
+            self.assertEqual(
+                [transaction.uniqueid], [info.uniqueid for info in ofx.securities]
+            )
+            fitids.add(transaction.fitid)
+        self.assertEqual({txn.fitid for txn in transactions}, fitids)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from argparse import Namespace
+from unittest import TestCase
+from unittest.mock import patch
+
+import up_to_date
+from up_to_date import Manifest, args_settings, manifest_filename
+
+
+class TestUpToDate(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_filename = os.path.join(self.directory, "abc.csv")
+        self.output_filename = os.path.join(self.directory, "abc.ofx")
+        self.write(self.input_filename, "a,b\n1,2\n")
+        self.settings = {"acctid": "1"}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def write(filename, content):
+        with open(filename, "w") as f:
+            f.write(content)
+
+    def convert(self, settings=None):
+        """
+        :return: True if the output was written again
+        """
+        manifest = Manifest(
+            self.output_filename, [self.input_filename], settings or self.settings
+        )
+        if manifest.is_up_to_date():
+            return False
+        self.write(self.output_filename, "<OFX>")
+        manifest.save()
+        return True
+
+    def test_manifest_filename(self):
+        self.assertEqual(
+            os.path.join(self.directory, ".abc.ofx.manifest.json"),
+            manifest_filename(self.output_filename),
+        )
+
+    def test_up_to_date(self):
+        self.assertTrue(self.convert())
+        self.assertFalse(self.convert())
+
+        # Same size and mtime: the input is not read
+        with patch.object(up_to_date, "file_hash", side_effect=AssertionError):
+            self.assertFalse(self.convert())
+
+        # Touched, same content
+        stat = os.stat(self.input_filename)
+        os.utime(self.input_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertFalse(self.convert())
+        with patch.object(up_to_date, "file_hash", side_effect=AssertionError):
+            self.assertFalse(self.convert())
+
+    def test_changes(self):
+        self.assertTrue(self.convert())
+        self.write(self.input_filename, "a,b\n1,3\n")
+        self.assertTrue(self.convert())
+
+        self.assertTrue(self.convert({"acctid": "2"}))
+        self.assertFalse(self.convert({"acctid": "2"}))
+
+        os.remove(self.output_filename)
+        self.assertTrue(self.convert({"acctid": "2"}))
+
+    def test_args_settings(self):
+        args = Namespace(
+            input="abc.csv", output="out", acctid="1", pretty_print=False, trace_mem=None
+        )
+        self.assertEqual({"acctid": "1", "pretty_print": "False"}, args_settings(args))
+
+    def test_missing_input(self):
+        self.assertTrue(self.convert())
+        os.remove(self.input_filename)
+        manifest = Manifest(self.output_filename, [self.input_filename], self.settings)
+        self.assertFalse(manifest.is_up_to_date())
+
+    def test_state(self):
+        # A positions file: read and written back by the conversion
+        state_filename = os.path.join(self.directory, "positions.json")
+
+        def convert():
+            manifest = Manifest(self.output_filename, [self.input_filename], self.settings)
+            if manifest.is_up_to_date():
+                return False
+            self.write(self.output_filename, "<OFX>")
+            with open(state_filename, "a") as f:
+                f.write("{}")
+            manifest.state_filenames = [state_filename]
+            manifest.save()
+            return True
+
+        self.assertTrue(convert())
+        self.assertFalse(convert())
+        self.write(state_filename, "[]")
+        self.assertTrue(convert())
+        self.assertFalse(convert())
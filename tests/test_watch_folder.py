@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+from argparse import Namespace
+from unittest import TestCase
+
+from watch_folder import (
+    Debouncer,
+    FolderConverter,
+    InotifyWatcher,
+    PollingWatcher,
+    ProcessedFiles,
+)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_args():
+    return Namespace(
+        acctid="1",
+        brokerid=None,
+        trnuid="1",
+        date_string_format="%Y/%m/%d",
+        fitid_strategy="hash",
+        pretty_print=False,
+        since=None,
+        until=None,
+        symbols=None,
+        input_order="unsorted",
+        positions=False,
+        positions_file=None,
+        jobs=1,
+        deterministic=False,
+    )
+
+
+class TestWatchFolder(TestCase):
+    def setUp(self):
+        self.input_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        self.csv_filename = os.path.join(THIS_DIR, os.pardir, "data/example1.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.input_dir)
+        shutil.rmtree(self.output_dir)
+
+    def test_debouncer(self):
+        filename = os.path.join(self.input_dir, "a.csv")
+        with open(filename, "w") as f:
+            f.write("partial")
+        debouncer = Debouncer(settle_time=2.0)
+        debouncer.touch(filename, 0.0)
+        self.assertEqual([], debouncer.ready(1.0))
+        self.assertEqual(1.0, debouncer.timeout(1.0))
+
+        # Still being written: the wait starts over
+        with open(filename, "a") as f:
+            f.write(" more")
+        self.assertEqual([], debouncer.ready(1.5))
+        self.assertEqual([], debouncer.ready(3.0))
+        self.assertEqual([filename], debouncer.ready(3.5))
+        self.assertIsNone(debouncer.timeout(3.5))
+
+    def test_convert_once(self):
+        filename = os.path.join(self.input_dir, "a.csv")
+        shutil.copy(self.csv_filename, filename)
+        folder_converter = FolderConverter(
+            self.input_dir, self.output_dir, create_args(), settle_time=0.0
+        )
+        folder_converter.add_existing(0.0)
+        output_filenames = folder_converter.convert_ready(0.0)
+        self.assertEqual([os.path.join(self.output_dir, "a.ofx")], output_filenames)
+        with open(output_filenames[0]) as f:
+            self.assertIn("<OFX>", f.read())
+
+        # Same file, same content: not converted again, even after a restart
+        folder_converter = FolderConverter(
+            self.input_dir, self.output_dir, create_args(), settle_time=0.0
+        )
+        folder_converter.add_existing(0.0)
+        self.assertEqual([], folder_converter.convert_ready(0.0))
+
+        # Same content, another name: gets its own output
+        shutil.copy(self.csv_filename, os.path.join(self.input_dir, "b.csv"))
+        folder_converter.debouncer.touch(os.path.join(self.input_dir, "b.csv"), 0.0)
+        self.assertEqual(
+            [os.path.join(self.output_dir, "b.ofx")], folder_converter.convert_ready(0.0)
+        )
+
+        # Changed content: converted again
+        with open(self.csv_filename) as f:
+            lines = f.readlines()
+        with open(filename, "w") as f:
+            f.writelines(lines[:2])
+        folder_converter.debouncer.touch(filename, 0.0)
+        self.assertEqual(
+            [os.path.join(self.output_dir, "a.ofx")], folder_converter.convert_ready(0.0)
+        )
+
+        # Reverted to the content converted before: converted again
+        shutil.copy(self.csv_filename, filename)
+        folder_converter.debouncer.touch(filename, 0.0)
+        self.assertEqual(
+            [os.path.join(self.output_dir, "a.ofx")], folder_converter.convert_ready(0.0)
+        )
+
+        # Output removed: converted again
+        os.remove(os.path.join(self.output_dir, "b.ofx"))
+        folder_converter = FolderConverter(
+            self.input_dir, self.output_dir, create_args(), settle_time=0.0
+        )
+        folder_converter.add_existing(0.0)
+        self.assertEqual(
+            [os.path.join(self.output_dir, "b.ofx")], folder_converter.convert_ready(0.0)
+        )
+
+        # Two inputs and their outputs
+        processed = ProcessedFiles(folder_converter.processed.filename)
+        self.assertEqual(4, len(processed.files))
+
+    def check_watcher(self, watcher):
+        filename = os.path.join(self.input_dir, "c.csv")
+        with open(filename, "w") as f:
+            f.write("x")
+        with open(os.path.join(self.input_dir, "c.txt"), "w") as f:
+            f.write("x")
+        self.assertEqual([filename], sorted(set(watcher.wait(5.0))))
+        watcher.close()
+
+    def test_polling_watcher(self):
+        self.check_watcher(PollingWatcher(self.input_dir, poll_interval=0.01))
+
+    def test_inotify_watcher(self):
+        try:
+            watcher = InotifyWatcher(self.input_dir)
+        except OSError:
+            self.skipTest("inotify is not available")
+        self.check_watcher(watcher)